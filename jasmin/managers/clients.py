@@ -11,11 +11,14 @@ from twisted.spread import pb
 import jasmin
 from jasmin.protocols.smpp.protocol import SMPPServerProtocol
 from jasmin.protocols.smpp.services import SMPPClientService
+from jasmin.protocols.smpp.stats import SMPPClientStatsCollector
+from jasmin.queues.factory import PublishNotConfirmed
+from jasmin.queues.spool import PublishSpool
 from jasmin.tools.migrations.configuration import ConfigurationMigrator
 from smpp.pdu.pdu_types import RegisteredDeliveryReceipt
 from smpp.twisted.protocol import SMPPSessionStates
 from .configs import SMPPClientSMListenerConfig
-from .content import SubmitSmContent
+from .content import SubmitSmContent, encode_pdu
 from .listeners import SMPPClientSMListener
 
 LOG_CATEGORY = "jasmin-pb-client-mgmt"
@@ -37,6 +40,8 @@ class SMPPClientManagerPB(pb.Avatar):
         self.interceptorpb_client = None
         self.RouterPB = None
         self.connectors = []
+        # Connector states cache read by submit paths, c.f. getConnectorState()
+        self.connector_states = {}
         self.declared_queues = []
         self.pickleProtocol = pickle.HIGHEST_PROTOCOL
 
@@ -61,6 +66,15 @@ class SMPPClientManagerPB(pb.Avatar):
         # Set pickleProtocol
         self.pickleProtocol = self.config.pickle_protocol
 
+        # Local spool holding submit_sm while the AMQP broker is disconnected
+        self.spool = None
+        if self.config.spool:
+            self.spool = PublishSpool(self.config.spool_path, self.config.spool_max_messages,
+                                      self.config.spool_segment_messages, self.config.spool_overflow_policy,
+                                      self.pickleProtocol)
+            self.log.info('Spooling to %s, %s messages left from previous run', self.config.spool_path,
+                          len(self.spool))
+
         self.log.info('SMPP Client manager configured and ready.')
 
     def setAvatar(self, avatar):
@@ -76,6 +90,25 @@ class SMPPClientManagerPB(pb.Avatar):
 
         self.log.info('Added amqpBroker to SMPPClientManagerPB')
 
+        if self.spool is not None:
+            self.amqpBroker.addChannelReadyListener(self.replaySpool)
+            if self.amqpBroker.connected:
+                self.replaySpool()
+
+    @defer.inlineCallbacks
+    def replaySpool(self, amqpBroker=None):
+        """Publish the spooled submit_sm in order"""
+        if self.spool is None or len(self.spool) == 0 or self.spool.replaying:
+            return
+
+        self.log.info('Replaying %s spooled SUBMIT_SM', len(self.spool))
+        try:
+            replayed = yield self.spool.replay(self.amqpBroker.publish)
+        except Exception as e:
+            self.log.error('Error replaying spooled SUBMIT_SM: %s', e)
+        else:
+            self.log.info('Replayed %s spooled SUBMIT_SM, %s left', replayed, len(self.spool))
+
     def addRedisClient(self, redisClient):
         self.redisClient = redisClient
 
@@ -100,6 +133,20 @@ class SMPPClientManagerPB(pb.Avatar):
         self.log.debug('getConnector [%s] returned None', cid)
         return None
 
+    def getSessions(self, connector):
+        """Return all the sessions (binds) of a connector, the connector itself is holding the first one"""
+        return [connector] + connector['extra_sessions']
+
+    def getConnectorSessionState(self, connector):
+        """Return the session state of a connector, a multi-session connector is in the state of its
+        first bound session or in the state of its first session if none is bound"""
+        for session in self.getSessions(connector):
+            session_state = session['service'].SMPPClientFactory.getSessionState()
+            if session_state is not None and session_state.name[:6] == 'BOUND_':
+                return session_state
+
+        return connector['service'].SMPPClientFactory.getSessionState()
+
     def getConnectorDetails(self, cid):
         c = self.getConnector(cid)
         if c is None:
@@ -108,7 +155,7 @@ class SMPPClientManagerPB(pb.Avatar):
 
         details = {}
         details['id'] = c['id']
-        details['session_state'] = c['service'].SMPPClientFactory.getSessionState().name
+        details['session_state'] = self.getConnectorSessionState(c).name
         details['service_status'] = c['service'].running
         details['start_count'] = c['service'].startCounter
         details['stop_count'] = c['service'].stopCounter
@@ -116,7 +163,114 @@ class SMPPClientManagerPB(pb.Avatar):
         self.log.debug('getConnectorDetails [%s] returned details', cid)
         return details
 
+    def getConnectorLoad(self, cid):
+        """Return the live load of a bound connector, used by LoadBalancedMTRoute:
+        - outstanding: submit_sm sent and still waiting for their submit_sm_resp
+        - queue_depth: messages waiting in submit.sm.<cid> queue, refreshed in background
+          every queue_depth_refresh seconds
+
+        None is returned for unknown or unbound connectors
+        """
+        state = self.getConnectorState(cid)
+        if state is None or state['session_state'][:6] != 'BOUND_':
+            return None
+
+        c = self.getConnector(cid)
+
+        if time.monotonic() - c['queue_depth_at'] >= self.config.queue_depth_refresh:
+            c['queue_depth_at'] = time.monotonic()
+            self.refreshQueueDepth(c)
+
+        outstanding = 0
+        for session in self.getSessions(c):
+            if session['service'].SMPPClientFactory.smpp is not None:
+                outstanding += len(session['service'].SMPPClientFactory.smpp.outTxns)
+
+        return {'outstanding': outstanding,
+                'queue_depth': c['queue_depth']}
+
+    def refreshQueueDepth(self, c):
+        if self.amqpBroker is None or not self.amqpBroker.connected:
+            return None
+
+        def update(r):
+            c['queue_depth'] = r.message_count
+
+        def error(failure):
+            self.log.warning('Cannot get submit.sm.%s queue depth: %s', c['id'], failure.getErrorMessage())
+
+        return self.amqpBroker.passive_queue_declare('submit.sm.%s' % c['id']).addCallbacks(update, error)
+
+    def getConnectorState(self, cid):
+        """Return the cached state of a connector: {'session_state': name, 'config': SMPPClientConfig}
+        or None if the connector is unknown
+
+        This is meant for the submit paths (http and smpp server apis), session_state is updated
+        on every session state change and config is the live (not copied) connector configuration
+        object, it must not be modified.
+        """
+        return self.connector_states.get(str(cid))
+
+    def connectorSessionStateChanged(self, cid, session_state):
+        if str(cid) in self.connector_states:
+            connector = self.getConnector(cid)
+            if connector is not None and len(connector['extra_sessions']) > 0:
+                session_state = self.getConnectorSessionState(connector)
+
+            self.connector_states[str(cid)]['session_state'] = session_state.name
+
+    def buildSession(self, c, session=0):
+        """Instanciate a smpp client service and its SM listener for one session (bind) of connector c"""
+
+        # Instanciate smpp client service manager
+        serviceManager = SMPPClientService(c, self.config, session)
+
+        # Instanciate a SM listener
+        smListener = SMPPClientSMListener(
+            config=SMPPClientSMListenerConfig(self.config.config_file),
+            SMPPClientFactory=serviceManager.SMPPClientFactory,
+            amqpBroker=self.amqpBroker,
+            redisClient=self.redisClient,
+            RouterPB=self.RouterPB,
+            interceptorpb_client=self.interceptorpb_client)
+
+        # Deliver_sm are sent to smListener's deliver_sm callback method
+        serviceManager.SMPPClientFactory.msgHandler = smListener.deliver_sm_event_interceptor
+        # Session state changes are reflected in connector_states
+        serviceManager.SMPPClientFactory.sessionStateHandler = self.connectorSessionStateChanged
+
+        return {
+            'service': serviceManager,
+            'consumer_tag': None,
+            'submit_sm_q': None,
+            'sm_listener': smListener}
+
+    def getConsumerTag(self, cid, session_number=0):
+        """Return the submit.sm.<cid> queue consumer tag of a connector session"""
+        if session_number == 0:
+            return 'SMPPClientFactory-%s' % cid
+
+        return 'SMPPClientFactory-%s-%s' % (cid, session_number)
+
+    def setupExtraSessions(self, connector):
+        """Align the extra sessions of a stopped connector to its configured number of sessions"""
+        sessions = getattr(connector['config'], 'sessions', 1)
+
+        while len(connector['extra_sessions']) < sessions - 1:
+            self.log.debug('Adding session %s to connector [%s]', len(connector['extra_sessions']) + 1,
+                           connector['id'])
+            session = self.buildSession(connector['config'], len(connector['extra_sessions']) + 1)
+            # Sessions are consuming from the same queue, submit_sm retrials are tracked connector-wide
+            session['sm_listener'].submit_retrials = connector['sm_listener'].submit_retrials
+            connector['extra_sessions'].append(session)
+        while len(connector['extra_sessions']) > sessions - 1:
+            self.log.debug('Removing session %s from connector [%s]', len(connector['extra_sessions']),
+                           connector['id'])
+            connector['extra_sessions'].pop()
+            SMPPClientStatsCollector().delSession(connector['id'], len(connector['extra_sessions']) + 1)
+
     def delConnector(self, cid):
+        self.connector_states.pop(str(cid), None)
         for i in range(len(self.connectors)):
             if str(self.connectors[i]['id']) == str(cid):
                 del self.connectors[i]
@@ -256,28 +410,18 @@ class SMPPClientManagerPB(pb.Avatar):
                                               exchange="messaging",
                                               routing_key=routing_key)
 
-        # Instanciate smpp client service manager
-        serviceManager = SMPPClientService(c, self.config)
-
-        # Instanciate a SM listener
-        smListener = SMPPClientSMListener(
-            config=SMPPClientSMListenerConfig(self.config.config_file),
-            SMPPClientFactory=serviceManager.SMPPClientFactory,
-            amqpBroker=self.amqpBroker,
-            redisClient=self.redisClient,
-            RouterPB=self.RouterPB,
-            interceptorpb_client=self.interceptorpb_client)
-
-        # Deliver_sm are sent to smListener's deliver_sm callback method
-        serviceManager.SMPPClientFactory.msgHandler = smListener.deliver_sm_event_interceptor
-
-        self.connectors.append({
+        # The connector holds its first session, additional sessions are set up when starting it
+        connector = self.buildSession(c)
+        connector.update({
             'id': c.id,
             'config': c,
-            'service': serviceManager,
-            'consumer_tag': None,
-            'submit_sm_q': None,
-            'sm_listener': smListener})
+            'extra_sessions': [],
+            'queue_depth': 0,
+            'queue_depth_at': 0})
+        self.connectors.append(connector)
+        self.connector_states[str(c.id)] = {
+            'session_state': connector['service'].SMPPClientFactory.getSessionState().name,
+            'config': c}
 
         self.log.info('Added a new connector: %s', c.id)
 
@@ -298,12 +442,18 @@ class SMPPClientManagerPB(pb.Avatar):
             defer.returnValue(False)
         if connector['service'].running == 1:
             self.log.debug('Stopping service for connector [%s] before removing it', cid)
-            connector['service'].stopService()
+            for session in self.getSessions(connector):
+                if session['service'].running == 1:
+                    session['service'].stopService()
 
         # Stop the queue consumer
         self.log.debug('Stopping submit_sm_q consumer in connector [%s]', cid)
         yield self.perspective_connector_stop(cid)
 
+        # Close the sessions dedicated consumer channels, if any
+        for session_number in range(len(self.getSessions(connector))):
+            yield self.amqpBroker.releaseConsumerChannel(self.getConsumerTag(cid, session_number))
+
         if self.delConnector(cid):
             self.log.info('Removed connector [%s]', cid)
             # Set persistance state to False (pending for persistance)
@@ -360,28 +510,52 @@ class SMPPClientManagerPB(pb.Avatar):
                 connector['service'].SMPPClientFactory.getSessionState())
             defer.returnValue(False)
 
-        connector['service'].startService()
+        # Every session is binding separately and consuming from the connector's queue
+        self.setupExtraSessions(connector)
+        for session_number, session in enumerate(self.getSessions(connector)):
+            started = yield self.startSession(connector, session, session_number)
+            if not started:
+                defer.returnValue(False)
+
+        self.log.info('Started connector [%s]', cid)
+
+        # Set persistance state to False (pending for persistance)
+        self.persisted = False
+
+        defer.returnValue(True)
+
+    @defer.inlineCallbacks
+    def startSession(self, connector, session, session_number=0):
+        """Start one session (bind) of a connector and its submit_sm_q consumer"""
+        cid = connector['id']
+
+        session['service'].startService()
 
         # Start the queue consumer
-        self.log.debug('Starting submit_sm_q consumer in connector [%s]', cid)
+        self.log.debug('Starting submit_sm_q consumer in connector [%s] session %s', cid, session_number)
 
         # Subscribe to submit.sm.%cid queue
         # check jasmin.queues.test.test_amqp.PublishConsumeTestCase.test_simple_publish_consume_by_topic
-        submit_sm_queue = 'submit.sm.%s' % connector['id']
-        consumerTag = 'SMPPClientFactory-%s' % (connector['id'])
+        submit_sm_queue = 'submit.sm.%s' % cid
+        consumerTag = self.getConsumerTag(cid, session_number)
 
         try:
             # Using the same consumerTag will prevent getting multiple consumers on the same queue
             # This can resolve the dark hole issue #234
 
             # Stop the queue consumer if any
-            if connector['consumer_tag'] is not None:
+            if session['consumer_tag'] is not None:
                 self.log.debug('Stopping submit_sm_q consumer in connector [%s]', cid)
-                yield self.amqpBroker.chan.basic_cancel(consumer_tag=connector['consumer_tag'])
+                yield self.amqpBroker.lookupConsumerChannel(session['consumer_tag']).basic_cancel(
+                    consumer_tag=session['consumer_tag'])
+
+            # Align prefetch limit to the connector's in-flight window, this applies when the
+            # consumer has its own channel (consumer_channels in amqp-broker)
+            chan = yield self.amqpBroker.getConsumerChannel(
+                consumerTag, getattr(connector['config'], 'window_size', 1))
 
             # Start a new consumer
-            yield self.amqpBroker.chan.basic_consume(queue=submit_sm_queue,
-                                                     no_ack=False, consumer_tag=consumerTag)
+            yield chan.basic_consume(queue=submit_sm_queue, no_ack=False, consumer_tag=consumerTag)
         except Exception as e:
             self.log.error('Error consuming from queue %s: %s', submit_sm_queue, e)
             defer.returnValue(False)
@@ -391,18 +565,13 @@ class SMPPClientManagerPB(pb.Avatar):
 
         # Set callbacks for every consumed message from submit_sm_queue queue
         d = submit_sm_q.get()
-        d.addCallback(connector['sm_listener'].submit_sm_callback).addErrback(
-            connector['sm_listener'].submit_sm_errback)
-
-        self.log.info('Started connector [%s]', cid)
+        d.addCallback(session['sm_listener'].submit_sm_callback).addErrback(
+            session['sm_listener'].submit_sm_errback)
 
-        # Set connector data
-        connector['sm_listener'].setSubmitSmQ(submit_sm_q)
-        connector['consumer_tag'] = consumerTag
-        connector['submit_sm_q'] = submit_sm_q
-
-        # Set persistance state to False (pending for persistance)
-        self.persisted = False
+        # Set session data
+        session['sm_listener'].setSubmitSmQ(submit_sm_q)
+        session['consumer_tag'] = consumerTag
+        session['submit_sm_q'] = submit_sm_q
 
         defer.returnValue(True)
 
@@ -418,15 +587,17 @@ class SMPPClientManagerPB(pb.Avatar):
             self.log.error('Trying to stop a connector with an unknown cid: %s', cid)
             defer.returnValue(False)
 
-        # Stop the queue consumer
-        if connector['consumer_tag'] is not None:
-            self.log.debug('Stopping submit_sm_q consumer in connector [%s]', cid)
-            yield self.amqpBroker.chan.basic_cancel(consumer_tag=connector['consumer_tag'])
+        # Stop the queue consumers
+        for session in self.getSessions(connector):
+            if session['consumer_tag'] is not None:
+                self.log.debug('Stopping submit_sm_q consumer %s in connector [%s]', session['consumer_tag'], cid)
+                yield self.amqpBroker.lookupConsumerChannel(session['consumer_tag']).basic_cancel(
+                    consumer_tag=session['consumer_tag'])
 
-            # Cleaning
-            self.log.debug('Cleaning objects in connector [%s]', cid)
-            connector['submit_sm_q'] = None
-            connector['consumer_tag'] = None
+                # Cleaning
+                self.log.debug('Cleaning objects in connector [%s]', cid)
+                session['submit_sm_q'] = None
+                session['consumer_tag'] = None
 
         if connector['service'].running == 0:
             self.log.error('Connector [%s] is already stopped.', cid)
@@ -437,26 +608,28 @@ class SMPPClientManagerPB(pb.Avatar):
             self.log.debug('Deleting queue [%s]', submitSmQueueName)
             yield self.amqpBroker.chan.queue_delete(queue=submitSmQueueName)
 
-        # Reject & requeue any pending message to avoid loosing messages after
-        # clearing timers
-        if len(connector['sm_listener'].rejectTimers) > 0:
-            for msgid, timer in list(connector['sm_listener'].rejectTimers.items()):
-                if timer.active():
-                    func = timer.func
-                    kw = timer.kw
-                    timer.cancel()
-                    del connector['sm_listener'].rejectTimers[msgid]
-
-                    self.log.debug('Rejecting/requeuing msgid [%s] before stopping connector', msgid)
-                    yield func(**kw)
-
-        # Stop timers in message listeners
-        self.log.debug('Clearing sm_listener timers in connector [%s]', cid)
-        connector['sm_listener'].clearAllTimers()
-        connector['sm_listener'].submit_sm_q = None
-
-        # Stop SMPP connector
-        connector['service'].stopService()
+        for session in self.getSessions(connector):
+            # Reject & requeue any pending message to avoid loosing messages after
+            # clearing timers
+            if len(session['sm_listener'].rejectTimers) > 0:
+                for msgid, timer in list(session['sm_listener'].rejectTimers.items()):
+                    if timer.active():
+                        func = timer.func
+                        kw = timer.kw
+                        timer.cancel()
+                        del session['sm_listener'].rejectTimers[msgid]
+
+                        self.log.debug('Rejecting/requeuing msgid [%s] before stopping connector', msgid)
+                        yield func(**kw)
+
+            # Stop timers in message listeners
+            self.log.debug('Clearing sm_listener timers in connector [%s]', cid)
+            session['sm_listener'].clearAllTimers()
+            session['sm_listener'].submit_sm_q = None
+
+            # Stop SMPP connector
+            if session['service'].running == 1:
+                session['service'].stopService()
 
         self.log.info('Stopped connector [%s]', cid)
 
@@ -507,7 +680,7 @@ class SMPPClientManagerPB(pb.Avatar):
             self.log.error('Trying to get session state of a connector with an unknown cid: %s', cid)
             return False
 
-        session_state = connector['service'].SMPPClientFactory.getSessionState()
+        session_state = self.getConnectorSessionState(connector)
         self.log.info('Connector [%s] session state is: %s', cid, session_state)
 
         if session_state is None:
@@ -544,6 +717,10 @@ class SMPPClientManagerPB(pb.Avatar):
 
         return pickle.dumps(connector['config'], self.pickleProtocol)
 
+    def _dlr_mapping_errback(self, failure, msgid):
+        """DLR mapping is written without waiting for it, its failure is only logged"""
+        self.log.error('Error setting DLR mapping for message id:%s: %s', msgid, failure.getErrorMessage())
+
     @defer.inlineCallbacks
     def perspective_submit_sm(self, uid, cid, SubmitSmPDU, submit_sm_bill, priority=1, validity_period=None,
                               pickled=True, dlr_url=None, dlr_level=1, dlr_method='POST', dlr_connector=None,
@@ -561,12 +738,18 @@ class SMPPClientManagerPB(pb.Avatar):
             self.log.error('Trying to enqueue a SUBMIT_SM when no broker were added')
             defer.returnValue(False)
 
-        # TODO: Future implementation, submitting a sm to a disconnected broker would be possible
-        #    through a local in memory queue
-        if self.amqpBroker.connected == False:
+        # Submitting a sm to a disconnected broker is possible through the local spool
+        if self.amqpBroker.connected == False and self.spool is None:
             self.log.error('AMQP Broker is not connected')
             defer.returnValue(False)
 
+        # Backpressure: stop accepting messages when the broker is late confirming the published ones
+        if (self.amqpBroker.config.publisher_confirms and self.amqpBroker.config.max_unconfirmed > 0 and
+                self.amqpBroker.getUnconfirmedCount() >= self.amqpBroker.config.max_unconfirmed):
+            self.log.error('AMQP Broker has %s unconfirmed messages, cannot enqueue SUBMIT_SM to %s',
+                           self.amqpBroker.getUnconfirmedCount(), cid)
+            defer.returnValue(False)
+
         # Define the destination and response queue names
         pubQueueName = "submit.sm.%s" % cid
         responseQueueName = "submit.sm.resp.%s" % cid
@@ -580,18 +763,40 @@ class SMPPClientManagerPB(pb.Avatar):
             PickledSubmitSmPDU = SubmitSmPDU
             SubmitSmPDU = pickle.loads(PickledSubmitSmPDU)
 
+        # Encode SubmitSmPDU with the configured codec, the pickled PDU is published as is otherwise
+        if self.config.submit_sm_codec == 'compact':
+            EncodedSubmitSmPDU = encode_pdu(SubmitSmPDU, 'compact', self.pickleProtocol)
+        else:
+            EncodedSubmitSmPDU = PickledSubmitSmPDU
+
         # Publishing a pickled PDU
         self.log.debug('Publishing SubmitSmPDU with routing_key=%s, priority=%s', pubQueueName, priority)
         c = SubmitSmContent(
             uid=uid,
-            body=PickledSubmitSmPDU,
+            body=EncodedSubmitSmPDU,
             replyto=responseQueueName,
             submit_sm_bill=submit_sm_bill,
             priority=priority,
             expiration=validity_period,
             source_connector='httpapi' if source_connector == 'httpapi' else 'smppsapi',
             destination_cid=cid)
-        yield self.amqpBroker.publish(exchange='messaging', routing_key=pubQueueName, content=c)
+        if self.spool is not None and (self.amqpBroker.connected == False or len(self.spool) > 0):
+            # Spool while the broker is disconnected and until the spool is replayed to keep messages in order
+            if not self.spool.append({'exchange': 'messaging', 'routing_key': pubQueueName, 'content': c}):
+                self.log.error('Spool is full (%s messages), cannot enqueue SUBMIT_SM to %s', len(self.spool), cid)
+                defer.returnValue(False)
+            self.log.debug('Spooled SubmitSmPDU [msgid:%s], spool depth: %s', c.properties['message-id'],
+                           len(self.spool))
+
+            if self.amqpBroker.connected:
+                self.replaySpool()
+        else:
+            try:
+                yield self.amqpBroker.publish(exchange='messaging', routing_key=pubQueueName, content=c)
+            except PublishNotConfirmed as e:
+                self.log.error('SUBMIT_SM [msgid:%s] was not confirmed by AMQP Broker: %s',
+                               c.properties['message-id'], e)
+                defer.returnValue(False)
 
         if source_connector == 'httpapi' and dlr_url is not None:
             # Enqueue DLR request in redis 'dlr' key if it is a httpapi request
@@ -604,7 +809,7 @@ class SMPPClientManagerPB(pb.Avatar):
                                dlr_level,
                                c.properties['message-id'],
                                connector['config'].dlr_expiry)
-                # Set values and callback expiration setting
+                # Set values and expiration setting
                 hashKey = "dlr:%s" % (c.properties['message-id'])
                 hashValues = {'sc': 'httpapi',
                               'url': dlr_url,
@@ -612,9 +817,8 @@ class SMPPClientManagerPB(pb.Avatar):
                               'method': dlr_method,
                               'connector': dlr_connector,
                               'expiry': connector['config'].dlr_expiry}
-                self.redisClient.hmset(hashKey, hashValues).addCallback(
-                    lambda response: self.redisClient.expire(
-                        hashKey, connector['config'].dlr_expiry))
+                self.redisClient.hmsetExpire(hashKey, hashValues, connector['config'].dlr_expiry).addErrback(
+                    self._dlr_mapping_errback, c.properties['message-id'])
         elif (isinstance(source_connector, SMPPServerProtocol) and
               SubmitSmPDU.params['registered_delivery'].receipt != RegisteredDeliveryReceipt.NO_SMSC_DELIVERY_RECEIPT_REQUESTED):
             # If submit_sm is successfully sent from a SMPPServerProtocol connector and DLR is
@@ -630,7 +834,7 @@ class SMPPClientManagerPB(pb.Avatar):
                     c.properties['message-id'],
                     SubmitSmPDU.params['registered_delivery'],
                     source_connector.factory.config.dlr_expiry)
-                # Set values and callback expiration setting
+                # Set values and expiration setting
                 hashKey = "dlr:%s" % (c.properties['message-id'])
                 hashValues = {'sc': 'smppsapi',
                               'system_id': source_connector.system_id,
@@ -643,8 +847,8 @@ class SMPPClientManagerPB(pb.Avatar):
                               'sub_date': datetime.datetime.now(),
                               'rd_receipt': SubmitSmPDU.params['registered_delivery'].receipt,
                               'expiry': source_connector.factory.config.dlr_expiry}
-                self.redisClient.hmset(hashKey, hashValues).addCallback(
-                    lambda response: self.redisClient.expire(
-                        hashKey, source_connector.factory.config.dlr_expiry))
+                self.redisClient.hmsetExpire(hashKey, hashValues,
+                                             source_connector.factory.config.dlr_expiry).addErrback(
+                    self._dlr_mapping_errback, c.properties['message-id'])
 
         defer.returnValue(c.properties['message-id'])
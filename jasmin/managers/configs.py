@@ -39,6 +39,19 @@ class SMPPClientPBConfig(ConfigFile):
         self.log_date_format = self._get('client-management', 'log_date_format', '%Y-%m-%d %H:%M:%S')
         self.pickle_protocol = self._getint('client-management', 'pickle_protocol', 2)
 
+        # Refresh interval (seconds) of submit.sm.<cid> queue depths used by ShortestQueueMTRoute
+        self.queue_depth_refresh = self._getfloat('client-management', 'queue_depth_refresh', 2.0)
+
+        # Codec of submit.sm.<cid> messages body: 'pickle' or 'compact' (SMPP wire encoding)
+        self.submit_sm_codec = self._get('client-management', 'submit_sm_codec', 'pickle')
+
+        # Local disk spool holding submit_sm while the AMQP broker is disconnected
+        self.spool = self._getbool('client-management', 'spool', False)
+        self.spool_path = self._get('client-management', 'spool_path', '%s/var/spool/jasmin' % ROOT_PATH)
+        self.spool_max_messages = self._getint('client-management', 'spool_max_messages', 100000)
+        self.spool_segment_messages = self._getint('client-management', 'spool_segment_messages', 1000)
+        self.spool_overflow_policy = self._get('client-management', 'spool_overflow_policy', 'reject')
+
 
 class SMPPClientSMListenerConfig(ConfigFile):
     """Config handler for 'sm-listener' section"""
@@ -70,6 +83,10 @@ class SMPPClientSMListenerConfig(ConfigFile):
         self.dlr_lookup_retry_delay = self._getint(
             'sm-listener', 'dlr_lookup_max_retries', 2)
 
+        # Bounds of the submit_sm retrials tracker
+        self.retrials_ttl = self._getint('sm-listener', 'retrials_ttl', 86400)
+        self.retrials_max_size = self._getint('sm-listener', 'retrials_max_size', 100000)
+
         self.log_level = logging.getLevelName(self._get('sm-listener', 'log_level', 'INFO'))
         self.log_file = self._get('sm-listener', 'log_file', '%s/messages.log' % LOG_PATH)
         self.log_rotate = self._get('sm-listener', 'log_rotate', 'midnight')
@@ -89,6 +106,14 @@ class DLRLookupConfig(ConfigFile):
         self.dlr_lookup_retry_delay = self._getint('dlr', 'dlr_lookup_retry_delay', 10)
         self.dlr_lookup_max_retries = self._getint('dlr', 'dlr_lookup_max_retries', 2)
 
+        # Bounds of the lookup retrials tracker
+        self.retrials_ttl = self._getint('dlr', 'retrials_ttl', 86400)
+        self.retrials_max_size = self._getint('dlr', 'retrials_max_size', 100000)
+
+        # Batched deliver_sm receipts lookup, disabled when dlr_lookup_batch_size is lower than 2
+        self.dlr_lookup_batch_size = self._getint('dlr', 'dlr_lookup_batch_size', 0)
+        self.dlr_lookup_batch_wait = self._getint('dlr', 'dlr_lookup_batch_wait', 5)
+
         self.smpp_receipt_on_success_submit_sm_resp = self._getbool('dlr', 'smpp_receipt_on_success_submit_sm_resp',
                                                                     False)
 
@@ -2,15 +2,25 @@
 Multiple classes extending of txamqp.content.Content
 """
 
+import io
+import json
 import pickle
 import datetime
+import struct
 import uuid
 from enum import Enum
 from importlib.metadata import entry_points
 
 from twisted.python import log
 from txamqp.content import Content
-from smpp.pdu.pdu_types import CommandId, CommandStatus
+from smpp.pdu.pdu_encoding import PDUEncoder
+from smpp.pdu.pdu_types import CommandId, CommandStatus, DataCoding, DataCodingScheme
+
+from jasmin.tools.tlv_encoder import install_pdu_encoder_patch, install_pdu_decoder_patch
+
+# Custom TLVs must survive the compact codec, c.f. jasmin.protocols.smpp.operations
+install_pdu_encoder_patch()
+install_pdu_decoder_patch()
 
 
 class InvalidParameterError(Exception):
@@ -28,6 +38,93 @@ for entry_point in entry_points(group='jasmin.content', name='msgid'):
     break
 
 
+class PDUCodecError(Exception):
+    """Raised when a PDU body cannot be decoded
+    """
+
+
+# Compact PDU body: magic, codec version, length of a json header map and the SMPP wire encoding
+# of the PDU and of its nextPdu parts; the header map holds what the wire encoding cannot carry.
+# Pickled bodies never start with the magic byte, both formats are accepted by decode_pdu()
+COMPACT_CODEC_MAGIC = b'\xfe'
+COMPACT_CODEC_VERSION = 1
+
+
+def encode_pdu(pdu, codec='pickle', pickleProtocol=pickle.HIGHEST_PROTOCOL):
+    """Encode pdu (and its nextPdu parts) with codec ('pickle' or 'compact')
+
+    The compact codec falls back to pickle for PDUs it cannot carry as is (untyped custom TLVs or
+    unknown params).
+    """
+    if codec != 'compact':
+        return pickle.dumps(pdu, pickleProtocol)
+
+    header = {'parts': []}
+    body = b''
+    encoder = PDUEncoder()
+    part = pdu
+    while part is not None:
+        known_params = set(part.mandatoryParams) | set(part.optionalParams)
+        if (not set(part.params).issubset(known_params)
+                or any(len(t) < 4 or t[2] is None for t in getattr(part, 'custom_tlvs', None) or [])):
+            return pickle.dumps(pdu, pickleProtocol)
+
+        # Encode a copy, params are adapted to the wire encoding
+        _part = part.__class__(seqNum=part.seqNum or 1, status=part.status, **part.params)
+        _part.custom_tlvs = getattr(part, 'custom_tlvs', None) or []
+        # s: seqNum, n: indexes of the None params, dc: int data_coding
+        params = part.mandatoryParams + part.optionalParams
+        part_header = {'n': [params.index(k) for k, v in part.params.items() if v is None]}
+        if part.seqNum is not None:
+            part_header['s'] = part.seqNum
+        if isinstance(part.params.get('data_coding'), int):
+            part_header['dc'] = part.params['data_coding']
+            _part.params['data_coding'] = DataCoding(DataCodingScheme.RAW, part.params['data_coding'])
+
+        try:
+            body += encoder.encode(_part)
+        except Exception:
+            return pickle.dumps(pdu, pickleProtocol)
+
+        header['parts'].append(part_header)
+        part = getattr(part, 'nextPdu', None)
+
+    header = json.dumps(header, separators=(',', ':')).encode()
+    return COMPACT_CODEC_MAGIC + struct.pack('!BH', COMPACT_CODEC_VERSION, len(header)) + header + body
+
+
+def decode_pdu(body):
+    """Decode a PDU body encoded with any of the encode_pdu() codecs"""
+    if body[:1] != COMPACT_CODEC_MAGIC:
+        return pickle.loads(body)
+
+    version, header_length = struct.unpack('!BH', body[1:4])
+    if version != COMPACT_CODEC_VERSION:
+        raise PDUCodecError('Unsupported compact codec version: %s' % version)
+
+    header = json.loads(body[4:4 + header_length])
+    stream = io.BytesIO(body[4 + header_length:])
+    encoder = PDUEncoder()
+    pdu = None
+    previous_part = None
+    for part_header in header['parts']:
+        part = encoder.decode(stream)
+        part.seqNum = part_header.get('s')
+        params = part.mandatoryParams + part.optionalParams
+        for i in part_header['n']:
+            part.params[params[i]] = None
+        if 'dc' in part_header:
+            part.params['data_coding'] = part_header['dc']
+
+        if previous_part is None:
+            pdu = part
+        else:
+            previous_part.nextPdu = part
+        previous_part = part
+
+    return pdu
+
+
 class PDU(Content):
     """A generic SMPP PDU Content"""
 
@@ -5,13 +5,17 @@ from logging.handlers import TimedRotatingFileHandler
 from twisted.internet import defer
 from twisted.internet import reactor
 from twisted.internet.error import AlreadyCalled, AlreadyCancelled
+from twisted.python.failure import Failure
 from txamqp.queue import Closed
 from txredisapi import ConnectionError
 from smpp.pdu.pdu_types import RegisteredDeliveryReceipt
 
 from jasmin.managers.content import DLRContentForHttpapi, DLRContentForSmpps
+from jasmin.protocols.smpp.stats import SMPPClientQualityCollector
+from jasmin.routing.stats import DLRLookupStatsCollector
 from jasmin.tools.singleton import Singleton
 from jasmin.tools import to_enum
+from jasmin.tools.ttlmap import TTLMap
 
 LOG_CATEGORY = "dlr"
 
@@ -41,7 +45,12 @@ class DLRLookup:
         self.amqpBroker = amqpBroker
         self.redisClient = redisClient
         self.requeue_timers = {}
-        self.lookup_retrials = {}
+        self.lookup_retrials = TTLMap(self.config.retrials_ttl, self.config.retrials_max_size)
+        self.stats = DLRLookupStatsCollector().get()
+
+        # Batched receipt lookups: (msgid, deferred) waiting for the next flush
+        self.pendingLookups = []
+        self.lookupsTimer = None
 
         # Set up a dedicated logger
         self.log = logging.getLogger(LOG_CATEGORY)
@@ -69,7 +78,8 @@ class DLRLookup:
         yield self.amqpBroker.chan.exchange_declare(exchange='messaging', type='topic')
         yield self.amqpBroker.named_queue_declare(queue=queueName)
         yield self.amqpBroker.chan.queue_bind(queue=queueName, exchange="messaging", routing_key=routing_key)
-        yield self.amqpBroker.chan.basic_consume(queue=queueName, no_ack=False, consumer_tag=consumerTag)
+        chan = yield self.amqpBroker.getConsumerChannel(consumerTag)
+        yield chan.basic_consume(queue=queueName, no_ack=False, consumer_tag=consumerTag)
         self.amqpBroker.client.queue(consumerTag).addCallback(self.setup_callbacks)
 
     def clearRequeueTimer(self, msgid):
@@ -92,6 +102,18 @@ class DLRLookup:
     def rejectAndRequeueMessage(self, message, delay=True):
         msgid = message.content.properties['message-id']
 
+        if delay and self.amqpBroker.config.retry_tiers:
+            self.log.debug("Requeuing Content[%s] through the %ss retry tier",
+                           msgid, self.config.dlr_lookup_retry_delay)
+            try:
+                yield self.amqpBroker.publishRetry(message, self.config.dlr_lookup_retry_delay)
+            except Exception as e:
+                self.log.error("Cannot requeue Content[%s] through retry tier, using a timer: %s", msgid, e)
+            else:
+                # Retrials are now tracked in the message headers
+                yield self.ackMessage(message)
+                defer.returnValue(None)
+
         if delay:
             self.log.debug("Requeuing Content[%s] with delay: %s seconds",
                            msgid, self.config.dlr_lookup_retry_delay)
@@ -131,7 +153,8 @@ class DLRLookup:
             self.log.error("Cannot reject message, AMQP Broker is not connected !")
             defer.returnValue(False)
 
-        yield self.amqpBroker.chan.basic_reject(delivery_tag=message.delivery_tag, requeue=requeue)
+        yield self.amqpBroker.lookupConsumerChannel(message.consumer_tag).basic_reject(
+            delivery_tag=message.delivery_tag, requeue=requeue)
 
     @defer.inlineCallbacks
     def ackMessage(self, message):
@@ -145,7 +168,7 @@ class DLRLookup:
             self.log.error("Cannot ack message, AMQP Broker is not connected !")
             defer.returnValue(False)
 
-        yield self.amqpBroker.chan.basic_ack(message.delivery_tag)
+        yield self.amqpBroker.lookupConsumerChannel(message.consumer_tag).basic_ack(message.delivery_tag)
 
     def setup_callbacks(self, q):
         if self.q is None:
@@ -159,11 +182,13 @@ class DLRLookup:
         # Again ...
         self.setup_callbacks(self.q)
 
-        # retrial tracking
+        # retrial tracking, messages requeued through retry tiers are carrying their retrials count
         if message.content.properties['message-id'] in self.lookup_retrials:
             self.lookup_retrials[message.content.properties['message-id']] += 1
         else:
-            self.lookup_retrials[message.content.properties['message-id']] = 1
+            self.lookup_retrials[message.content.properties['message-id']] = (
+                message.content.properties.get('headers') or {}).get('retrials', 0) + 1
+        self.stats.set('lookup_retrials_size', len(self.lookup_retrials))
 
         # Dispatching
         if message.routing_key == 'dlr.submit_sm_resp':
@@ -253,8 +278,7 @@ class DLRLookup:
                                    smpp_msgid, msgid, dlr_expiry)
                     hashKey = "queue-msgid:%s" % smpp_msgid
                     hashValues = {'msgid': msgid, 'connector_type': 'httpapi'}
-                    yield self.redisClient.hmset(hashKey, hashValues)
-                    yield self.redisClient.expire(hashKey, dlr_expiry)
+                    yield self.redisClient.hmsetExpire(hashKey, hashValues, dlr_expiry)
             elif dlr['sc'] == 'smppsapi':
                 self.log.debug('There is a SMPPs mapping for msgid[%s] ...', msgid)
                 system_id = dlr['system_id']
@@ -304,8 +328,7 @@ class DLRLookup:
                                        smpp_msgid, msgid, smpps_map_expiry)
                         hashKey = "queue-msgid:%s" % smpp_msgid
                         hashValues = {'msgid': msgid, 'connector_type': 'smppsapi'}
-                        yield self.redisClient.hmset(hashKey, hashValues)
-                        yield self.redisClient.expire(hashKey, smpps_map_expiry)
+                        yield self.redisClient.hmsetExpire(hashKey, hashValues, smpps_map_expiry)
         except DLRMapError as e:
             self.log.error('[msgid:%s] DLR Content: %s', msgid, e)
             yield self.rejectMessage(message)
@@ -326,6 +349,54 @@ class DLRLookup:
         else:
             yield self.ackMessage(message)
 
+    @defer.inlineCallbacks
+    def lookupDLRMap(self, msgid):
+        """Return the queue-msgid map of msgid and the dlr map it's pointing to (or None)
+
+        Lookups are batched when dlr_lookup_batch_size is 2 or more.
+        """
+        if self.config.dlr_lookup_batch_size < 2:
+            q = yield self.redisClient.hgetall("queue-msgid:%s" % msgid)
+            dlr = None
+            if 'msgid' in q:
+                dlr = yield self.redisClient.hgetall("dlr:%s" % q['msgid'])
+            defer.returnValue((q, dlr))
+
+        d = defer.Deferred()
+        self.pendingLookups.append((msgid, d))
+        if len(self.pendingLookups) >= self.config.dlr_lookup_batch_size:
+            self.flushLookups()
+        elif self.lookupsTimer is None:
+            self.lookupsTimer = reactor.callLater(self.config.dlr_lookup_batch_wait / 1000.0, self.flushLookups)
+
+        r = yield d
+        defer.returnValue(r)
+
+    @defer.inlineCallbacks
+    def flushLookups(self):
+        """Resolve the pending lookups with two pipelines: one for the queue-msgid maps and one for
+        the dlr maps they're pointing to, results are given back in the lookups order"""
+        if self.lookupsTimer is not None and self.lookupsTimer.active():
+            self.lookupsTimer.cancel()
+        self.lookupsTimer = None
+        lookups, self.pendingLookups = self.pendingLookups, []
+        self.log.debug('Looking up %s dlr maps', len(lookups))
+
+        try:
+            qs = yield self.redisClient.hgetallMany(['queue-msgid:%s' % msgid for msgid, _ in lookups])
+            dlrKeys = ['dlr:%s' % q['msgid'] for q in qs if 'msgid' in q]
+            dlrs = []
+            if len(dlrKeys) > 0:
+                dlrs = yield self.redisClient.hgetallMany(dlrKeys)
+        except Exception:
+            failure = Failure()
+            for _, d in lookups:
+                d.errback(failure)
+        else:
+            dlrs = iter(dlrs)
+            for (_, d), q in zip(lookups, qs):
+                d.callback((q, next(dlrs) if 'msgid' in q else None))
+
     @defer.inlineCallbacks
     def deliver_sm_dlr_callback(self, message):
         msgid = message.content.properties['message-id']
@@ -342,19 +413,24 @@ class DLRLookup:
         if isinstance(pdu_dlr_status, bytes):
             pdu_dlr_status = pdu_dlr_status.decode()
 
+        # Feed connector quality (used by BestQualityMTRoute) once per receipt: on its first
+        # lookup attempt, requeued receipts are already counted
+        if self.lookup_retrials.get(msgid) == 1 and pdu_dlr_status in ['DELIVRD', 'EXPIRED', 'DELETED',
+                                                                       'UNDELIV', 'REJECTD']:
+            SMPPClientQualityCollector().get(pdu_cid).dlr_received(pdu_dlr_status == 'DELIVRD')
+
         try:
             if self.redisClient is None:
                 raise RedisError('RC undefined !')
 
-            q = yield self.redisClient.hgetall("queue-msgid:%s" % msgid)
+            q, dlr = yield self.lookupDLRMap(msgid)
             if len(q) != 2 or 'msgid' not in q or 'connector_type' not in q:
                 raise DLRMapNotFound('Got a DLR for an unknown message id: %s (coded:%s)' % (pdu_dlr_id, msgid))
 
             submit_sm_queue_id = q['msgid']
             connector_type = q['connector_type']
 
-            # Get dlr and ensure it's sc (source_connector) is same as q['connector_type']
-            dlr = yield self.redisClient.hgetall("dlr:%s" % submit_sm_queue_id)
+            # Ensure dlr's sc (source_connector) is same as q['connector_type']
             if dlr is None or len(dlr) == 0:
                 raise DLRMapNotFound('Got a DLR for an unknown message id: %s (coded:%s)' % (pdu_dlr_id, msgid))
             if len(dlr) > 0 and dlr['sc'] != connector_type:
@@ -394,7 +470,8 @@ class DLRLookup:
 
                     if pdu_dlr_status in final_states:
                         self.log.debug('Removing HTTP dlr map for msgid[%s]', submit_sm_queue_id)
-                        yield self.redisClient.delete('dlr:%s' % submit_sm_queue_id)
+                        yield self.redisClient.pipelinedWrite(
+                            [('delete', 'dlr:%s' % submit_sm_queue_id)])
             elif connector_type == 'smppsapi':
                 self.log.debug('There is a SMPPs mapping for msgid[%s] ...', msgid)
                 system_id = dlr['system_id']
@@ -436,7 +513,8 @@ class DLRLookup:
 
                     if pdu_dlr_status in final_states:
                         self.log.debug('Removing SMPPs dlr map for msgid[%s]', submit_sm_queue_id)
-                        yield self.redisClient.delete('dlr:%s' % submit_sm_queue_id)
+                        yield self.redisClient.pipelinedWrite(
+                            [('delete', 'dlr:%s' % submit_sm_queue_id)])
         except DLRMapError as e:
             self.log.error('[msgid:%s] DLRMapError: %s', msgid, e)
             yield self.rejectMessage(message)
@@ -2,7 +2,8 @@
 import pickle
 import sys
 import logging
-from datetime import datetime, timedelta
+import time
+from datetime import datetime
 from logging.handlers import TimedRotatingFileHandler
 
 from dateutil import parser
@@ -15,13 +16,16 @@ from smpp.twisted.protocol import DataHandlerResponse
 from smpp.pdu.error import SMPPRequestTimoutError
 
 from jasmin.managers.configs import SMPPClientPBConfig
-from jasmin.managers.content import SubmitSmRespContent, DeliverSmContent, SubmitSmRespBillContent, DLR
+from jasmin.managers.content import (SubmitSmRespContent, DeliverSmContent, SubmitSmRespBillContent, DLR,
+                                     decode_pdu)
 from jasmin.protocols.smpp.error import *
 from jasmin.protocols.smpp.operations import SMPPOperationFactory
+from jasmin.protocols.smpp.stats import SMPPClientQualityCollector
 from jasmin.tools.tlv import format_tlvs_for_log
 from jasmin.routing.Routables import RoutableDeliverSm
 from jasmin.routing.jasminApi import Connector
 from jasmin.tools import qos
+from jasmin.tools.ttlmap import TTLMap
 
 LOG_CATEGORY = "jasmin-sm-listener"
 
@@ -41,9 +45,10 @@ class SMPPClientSMListener:
         self.RouterPB = RouterPB
         self.interceptorpb_client = interceptorpb_client
         self.submit_sm_q = None
-        self.qos_last_submit_sm_at = None
+        self.submit_sm_inflight = 0
+        self.submit_sm_paused = False
         self.rejectTimers = {}
-        self.submit_retrials = {}
+        self.submit_retrials = TTLMap(self.config.retrials_ttl, self.config.retrials_max_size)
         self.qosTimer = None
 
         # Set pickleProtocol
@@ -66,6 +71,46 @@ class SMPPClientSMListener:
     def setSubmitSmQ(self, queue):
         self.log.debug('Setting a new submit_sm_q: %s', queue)
         self.submit_sm_q = queue
+        # A new consumer is started on the new queue
+        self.submit_sm_paused = False
+
+    def consumeSubmitSm(self):
+        """Get next message from submit_sm_q"""
+        self.submit_sm_q.get().addCallback(self.submit_sm_callback).addErrback(self.submit_sm_errback)
+
+    def getThroughput(self):
+        """Return the connector's effective submit_sm throughput, when adaptive_throughput is enabled
+        it is shared by all the listeners of the connector and follows the SMSC throttling"""
+        config = self.SMPPClientFactory.config
+        if config.submit_sm_throughput > 0 and getattr(config, 'adaptive_throughput', False):
+            return qos.AIMDRateCollector().get(
+                config.id, config.adaptive_min_throughput, config.submit_sm_throughput).rate
+
+        return config.submit_sm_throughput
+
+    def adaptThroughput(self, status, sent_at=None):
+        """Cut the effective throughput on ESME_RTHROTTLED and raise it back after a run of ESME_ROK,
+        sent_at is the time the submit_sm was sent at, c.f. AIMDRate.throttled()"""
+        config = self.SMPPClientFactory.config
+        if config.submit_sm_throughput <= 0 or not getattr(config, 'adaptive_throughput', False):
+            return
+
+        rate = qos.AIMDRateCollector().get(config.id, config.adaptive_min_throughput, config.submit_sm_throughput)
+        if status == CommandStatus.ESME_RTHROTTLED:
+            previous_decrease = rate.decreased_at
+            rate.throttled(sent_at)
+            if rate.decreased_at != previous_decrease:
+                self.log.info("Throttled by SMSC, [cid:%s] throughput decreased to %s/s", config.id, rate.rate)
+            else:
+                self.log.debug("Throttled by SMSC, [cid:%s] throughput already decreased to %s/s",
+                               config.id, rate.rate)
+        elif status == CommandStatus.ESME_ROK:
+            previous_rate = rate.rate
+            rate.succeeded()
+            if rate.rate != previous_rate:
+                self.log.debug("[cid:%s] throughput increased to %s/s", config.id, rate.rate)
+
+        self.SMPPClientFactory.stats.set('effective_throughput', rate.rate)
 
     def clearRejectTimer(self, msgid):
         if msgid in self.rejectTimers:
@@ -100,6 +145,20 @@ class SMPPClientSMListener:
             else:
                 requeue_delay = self.SMPPClientFactory.config.requeue_delay
 
+            if self.amqpBroker.config.retry_tiers:
+                self.log.debug("Requeuing SubmitSmPDU[%s] through the %ss retry tier",
+                               msgid, requeue_delay)
+                try:
+                    yield self.amqpBroker.publishRetry(message, requeue_delay)
+                except Exception as e:
+                    self.log.error("Cannot requeue SubmitSmPDU[%s] through retry tier, using a timer: %s",
+                                   msgid, e)
+                else:
+                    # Retrials are now tracked in the message headers
+                    self.submit_retrials.pop(msgid, None)
+                    yield self.ackMessage(message)
+                    defer.returnValue(None)
+
             self.log.debug("Requeuing SubmitSmPDU[%s] in %s seconds",
                            msgid, requeue_delay)
 
@@ -120,11 +179,12 @@ class SMPPClientSMListener:
 
     @defer.inlineCallbacks
     def rejectMessage(self, message, requeue=0):
-        yield self.amqpBroker.chan.basic_reject(delivery_tag=message.delivery_tag, requeue=requeue)
+        yield self.amqpBroker.lookupConsumerChannel(message.consumer_tag).basic_reject(
+            delivery_tag=message.delivery_tag, requeue=requeue)
 
     @defer.inlineCallbacks
     def ackMessage(self, message):
-        yield self.amqpBroker.chan.basic_ack(message.delivery_tag)
+        yield self.amqpBroker.lookupConsumerChannel(message.consumer_tag).basic_ack(message.delivery_tag)
 
     @defer.inlineCallbacks
     def submit_sm_callback(self, message):
@@ -133,42 +193,52 @@ class SMPPClientSMListener:
         c.f. test_amqp.ConsumeTestCase for use cases
         """
         msgid = None
+        # Consume next message unless the in-flight window is full, consumption is resumed
+        # once a message leaves the window (submit_sm_resp received, timed out or rejected)
+        self.submit_sm_inflight += 1
         try:
-            msgid = message.content.properties['message-id']
-            SubmitSmPDU = pickle.loads(message.content.body)
+            if self.submit_sm_inflight < getattr(self.SMPPClientFactory.config, 'window_size', 1):
+                self.consumeSubmitSm()
+            else:
+                self.log.debug("Window is full (%s in-flight submit_sm) for [cid:%s], pausing consumption",
+                               self.submit_sm_inflight, self.SMPPClientFactory.config.id)
+                self.submit_sm_paused = True
 
-            self.submit_sm_q.get().addCallback(self.submit_sm_callback).addErrback(self.submit_sm_errback)
+            msgid = message.content.properties['message-id']
+            SubmitSmPDU = decode_pdu(message.content.body)
 
             self.log.debug("Callbacked a submit_sm with a SubmitSmPDU[%s] (?): %s", msgid, SubmitSmPDU)
 
-            # Update submit_sm retrial tracker
+            # Update submit_sm retrial tracker, messages requeued through retry tiers are carrying
+            # their retrials count
             if msgid in self.submit_retrials:
                 self.submit_retrials[msgid] += 1
             else:
-                self.submit_retrials[msgid] = 1
-
-            if self.qos_last_submit_sm_at is None:
-                self.qos_last_submit_sm_at = datetime(1970, 1, 1)
-
-            if self.SMPPClientFactory.config.submit_sm_throughput > 0:
-                # QoS throttling
-                qos_throughput_second = 1 / float(self.SMPPClientFactory.config.submit_sm_throughput)
-                qos_throughput_ysecond_td = timedelta(microseconds=qos_throughput_second * 1000000)
-                qos_delay = datetime.now() - self.qos_last_submit_sm_at
-                if qos_delay < qos_throughput_ysecond_td:
-                    qos_slow_down = float((qos_throughput_ysecond_td - qos_delay).microseconds) / 1000000
+                self.submit_retrials[msgid] = (message.content.properties.get('headers') or {}).get('retrials', 0) + 1
+            self.SMPPClientFactory.stats.set('submit_retrials_size', len(self.submit_retrials))
+
+            throughput = self.getThroughput()
+            self.SMPPClientFactory.stats.set('effective_throughput', throughput)
+            if throughput > 0:
+                # QoS throttling, pacing budget is shared by all the listeners of this connector
+                pacer = qos.PacerCollector().get(
+                    self.SMPPClientFactory.config.id,
+                    throughput,
+                    getattr(self.SMPPClientFactory.config, 'submit_sm_burst', 1))
+                qos_delay = pacer.getDelay()
+                if qos_delay > 0:
                     # We're faster than submit_sm_throughput,
-                    # slow down before taking a new message from the queue
+                    # slow down before handling the message
                     self.log.debug(
-                        "QoS: submit_sm_callback faster (%s) than throughput (%s), slowing down %ss (requeuing).",
-                        qos_delay, qos_throughput_ysecond_td, qos_slow_down)
+                        "QoS: submit_sm_callback faster than throughput (%s/s), slowing down %ss.",
+                        throughput, qos_delay)
+                    self.SMPPClientFactory.stats.inc('pacing_delay_count')
+                    self.SMPPClientFactory.stats.inc('pacing_delay_ms', int(qos_delay * 1000))
 
                     # New QoS controller (>=0.10.13):
                     # Will pause for a delay then allow handling the message normally
                     # This will avoid impacting resources by requeuing on rabbitmq
-                    yield qos.slow_down(qos_slow_down)
-
-                self.qos_last_submit_sm_at = datetime.now()
+                    yield qos.slow_down(qos_delay)
 
             # Verify if message is a SubmitSm PDU
             if isinstance(SubmitSmPDU, SubmitSM) is False:
@@ -271,10 +341,12 @@ class SMPPClientSMListener:
             # Finally: send the sms !
             self.log.debug("Sending SubmitSmPDU[%s] through SMPPClientFactory [cid:%s] after %s requeues.",
                            msgid, self.SMPPClientFactory.config.id, self.submit_retrials[msgid])
+            sent_at = time.monotonic()
             d = self.SMPPClientFactory.smpp.sendDataRequest(SubmitSmPDU)
-            d.addCallback(self.submit_sm_resp_event, message)
+            d.addCallback(self.submit_sm_resp_event, message, sent_at)
             yield d
         except SMPPRequestTimoutError:
+            SMPPClientQualityCollector().get(self.SMPPClientFactory.config.id).submit_sm_resp_received(False)
             self.log.error("SubmitSmPDU[%s] request timed out through [cid:%s], message requeued.",
                            msgid, self.SMPPClientFactory.config.id)
             self.rejectAndRequeueMessage(message)
@@ -289,14 +361,25 @@ class SMPPClientSMListener:
                               msgid, self.SMPPClientFactory.config.id, type(e), e)
             self.rejectMessage(message)
             defer.returnValue(False)
+        finally:
+            self.submit_sm_inflight -= 1
+            if self.submit_sm_paused and self.submit_sm_q is not None:
+                self.log.debug("Window is open for [cid:%s], resuming consumption", self.SMPPClientFactory.config.id)
+                self.submit_sm_paused = False
+                self.consumeSubmitSm()
 
     @defer.inlineCallbacks
-    def submit_sm_resp_event(self, r, amqpMessage):
+    def submit_sm_resp_event(self, r, amqpMessage, sent_at=None):
         msgid = amqpMessage.content.properties['message-id']
         total_bill_amount = 0.0
         will_be_retried = False
 
         try:
+            SMPPClientQualityCollector().get(self.SMPPClientFactory.config.id).submit_sm_resp_received(
+                r.response.status == CommandStatus.ESME_ROK,
+                None if sent_at is None else time.monotonic() - sent_at)
+            self.adaptThroughput(r.response.status, sent_at)
+
             if 'submit_sm_bill' in amqpMessage.content.properties['headers']:
                 submit_sm_resp_bill = pickle.loads(
                     amqpMessage.content.properties['headers']['submit_sm_bill']).getSubmitSmRespBill()
@@ -306,7 +389,7 @@ class SMPPClientSMListener:
 
             if r.response.status == CommandStatus.ESME_ROK:
                 # No more retrials !
-                del self.submit_retrials[msgid]
+                self.submit_retrials.pop(msgid, None)
 
                 # Get bill information
                 if submit_sm_resp_bill is not None and submit_sm_resp_bill.getTotalAmounts() > 0:
@@ -378,14 +461,14 @@ class SMPPClientSMListener:
                 if r.response.status.name in self.config.submit_error_retrial:
                     retrial = self.config.submit_error_retrial[r.response.status.name]
 
-                    # Still have some retries to go ?
-                    if self.submit_retrials[msgid] < retrial['count']:
+                    # Still have some retries to go ? (a message dropped from the tracker has none)
+                    if self.submit_retrials.get(msgid, retrial['count']) < retrial['count']:
                         # Requeue the message for later redelivery
                         yield self.rejectAndRequeueMessage(amqpMessage, delay=retrial['delay'])
                         will_be_retried = True
                     else:
                         # Prevent this list from over-growing
-                        del self.submit_retrials[msgid]
+                        self.submit_retrials.pop(msgid, None)
 
                 # Do not log text for privacy reasons
                 # Added in #691
@@ -483,9 +566,6 @@ class SMPPClientSMListener:
             self.log.warning('This hashKey %s already exists, will not reset it !', hashKey)
             return
 
-        # @TODO: longDeliverSm part expiry must be configurable
-        yield self.redisClient.expire(hashKey, 300)
-
         # This is the last part
         if segment_seqnum == total_segments:
             hvals = yield self.redisClient.hvals(hashKey)
@@ -772,8 +852,9 @@ class SMPPClientSMListener:
                                       'total_segments': total_segments,
                                       'msg_ref_num': msg_ref_num,
                                       'segment_seqnum': segment_seqnum}
-                        yield self.redisClient.hset(
-                            hashKey, segment_seqnum, pickle.dumps(hashValues, self.pickleProtocol)).addCallback(
+                        # @TODO: longDeliverSm part expiry must be configurable
+                        yield self.redisClient.hsetExpire(
+                            hashKey, segment_seqnum, pickle.dumps(hashValues, self.pickleProtocol), 300).addCallback(
                             self.concatDeliverSMs,
                             hashKey,
                             splitMethod,
@@ -323,7 +323,11 @@ class JCliProtocol(CmdProtocol):
               make_option('-s', '--show', type="string", metavar="ORDER",
                           help="Show MO route using it's ORDER"),
               make_option('-f', '--flush', action="store_true",
-                          help="Flush MO routing table")], '')
+                          help="Flush MO routing table"),
+              make_option('-i', '--import', type="string", metavar="FILE", dest="import_file",
+                          help="Import MO routes from a CSV or JSON file"),
+              make_option(None, '--replace', action="store_true",
+                          help="Replace the whole MO routing table when importing routes")], '')
     def do_morouter(self, arg, opts=None):
         """MO Router management"""
 
@@ -337,6 +341,8 @@ class JCliProtocol(CmdProtocol):
             self.managers['morouter'].show(arg, opts)
         elif opts.flush:
             self.managers['morouter'].flush(arg, opts)
+        elif opts.import_file:
+            self.managers['morouter'].import_routes(arg, opts)
         else:
             return self.sendData('Missing required option')
 
@@ -349,7 +355,11 @@ class JCliProtocol(CmdProtocol):
               make_option('-s', '--show', type="string", metavar="ORDER",
                           help="Show MT route using it's ORDER"),
               make_option('-f', '--flush', action="store_true",
-                          help="Flush MT routing table")], '')
+                          help="Flush MT routing table"),
+              make_option('-i', '--import', type="string", metavar="FILE", dest="import_file",
+                          help="Import MT routes from a CSV or JSON file"),
+              make_option(None, '--replace', action="store_true",
+                          help="Replace the whole MT routing table when importing routes")], '')
     def do_mtrouter(self, arg, opts=None):
         """MT Router management"""
 
@@ -363,6 +373,8 @@ class JCliProtocol(CmdProtocol):
             self.managers['mtrouter'].show(arg, opts)
         elif opts.flush:
             self.managers['mtrouter'].flush(arg, opts)
+        elif opts.import_file:
+            self.managers['mtrouter'].import_routes(arg, opts)
         else:
             return self.sendData('Missing required option')
 
@@ -1,3 +1,9 @@
+import csv
+import inspect
+import json
+import pickle
+
+
 def Session(fCallback):
     """Validate args before passing to session handler"""
 
@@ -16,6 +22,31 @@ def Session(fCallback):
     return filter_cmd_and_call
 
 
+def load_records(path):
+    """Load a list of records (dicts) from a JSON or a CSV file, used for bulk imports
+
+    JSON files must contain a list of objects, CSV files must have a header line, record values
+    are returned as stripped strings and empty values are dropped.
+    """
+    with open(path, 'r', newline='', encoding='utf-8') as fh:
+        if path.lower().endswith('.json'):
+            records = json.load(fh)
+            if not isinstance(records, list):
+                raise ValueError('JSON content must be a list of objects')
+        else:
+            records = list(csv.DictReader(fh))
+
+    _records = []
+    for record in records:
+        if not isinstance(record, dict):
+            raise ValueError('Invalid record: %s' % record)
+
+        _records.append({str(k).strip(): str(v).strip() for k, v in record.items()
+                         if k is not None and v is not None and str(v).strip() != ''})
+
+    return _records
+
+
 class Manager:
     # A prompt to display when inside an interactive session
     trxPrompt = '> '
@@ -74,3 +105,111 @@ class PersistableManager(Manager):
     def load(self, arg, opts):
         """Must be implemeted by manager to reload  current configuration to disk"""
         raise NotImplementedError
+
+
+class RouterManager(PersistableManager):
+    """Route import logics shared by the MT and MO router managers
+
+    Subclasses must set routeDirection ('MT' or 'MO'), routeClasses (route type name -> Route
+    class), routeFilters (the filter class names valid for their routes) and implement
+    _get_connector().
+    """
+    routeDirection = None
+    routeClasses = {}
+    routeFilters = []
+    # MO Routes are not rated
+    ratedRoutes = True
+
+    def _get_connector(self, typed_cid):
+        """Must be implemented by manager to return the connector of a typed connector id"""
+        raise NotImplementedError
+
+    def _route_from_record(self, record):
+        """Build an (order, Route) tuple from an imported record having the same keys as
+        the ones used in 'mtrouter/morouter --add' sessions"""
+        _type = None
+        for route in self.routeClasses:
+            if record.get('type', '').lower() == route.lower():
+                _type = route
+                break
+        if _type is None:
+            raise Exception('Unknown %s Route type:%s, available types: %s' % (
+                self.routeDirection, record.get('type'), ', '.join(self.routeClasses)))
+
+        if _type == 'DefaultRoute':
+            order = 0
+        elif not record.get('order', '').isdigit() or int(record['order']) <= 0:
+            raise Exception('Route order must be a positive integer')
+        else:
+            order = int(record['order'])
+
+        RouteClass = self.routeClasses[_type]
+        argspec = inspect.getfullargspec(RouteClass.__init__)
+        RouteClassArgs = argspec.args[1:]
+        required = RouteClassArgs[:len(RouteClassArgs) - len(argspec.defaults or ())]
+
+        route = {}
+        for key in RouteClassArgs:
+            if key not in record:
+                if key in required:
+                    raise Exception('Missing option: %s' % key)
+                continue
+
+            value = record[key]
+            if key == 'connector':
+                value = self._get_connector(value)
+            elif key == 'connectors':
+                CIDs = value.split(';')
+                if len(CIDs) == 1:
+                    raise Exception(
+                        '%s option value must contain a minimum of 2 connector IDs separated with ";".' % (key))
+                value = [self._get_connector(typed_cid) for typed_cid in CIDs]
+            elif key == 'rate':
+                if not self.ratedRoutes:
+                    continue
+                try:
+                    value = float(value)
+                except ValueError as e:
+                    raise Exception('Incorrect rate (must be float): %s' % (value)) from e
+            elif key == 'weights':
+                try:
+                    value = [int(weight) for weight in value.split(';')]
+                except ValueError as e:
+                    raise Exception(
+                        'Incorrect weights (must be integers separated with ";"): %s' % (value)) from e
+            elif key == 'filters':
+                value = []
+                for fid in record[key].split(';'):
+                    if fid not in self.protocol.managers['filter'].filters:
+                        raise Exception('Unknown fid: %s' % (fid))
+
+                    _Filter = self.protocol.managers['filter'].filters[fid]
+                    if _Filter.__class__.__name__ not in self.routeFilters:
+                        raise Exception('%s#%s is not a valid filter for %sRoute (not in %sFILTERS)' % (
+                            _Filter.__class__.__name__, fid, self.routeDirection, self.routeDirection))
+                    value.append(_Filter)
+
+            route[key] = value
+
+        return order, RouteClass(**route)
+
+    def import_routes(self, arg, opts):
+        try:
+            records = load_records(opts.import_file)
+        except Exception as e:
+            return self.protocol.sendData('Cannot read %s: %s' % (opts.import_file, str(e)))
+
+        routes = []
+        for position, record in enumerate(records, 1):
+            try:
+                routes.append(self._route_from_record(record))
+            except Exception as e:
+                return self.protocol.sendData('Error in record #%s: %s' % (position, str(e)))
+
+        bulk_add = getattr(self.pb['router'], 'perspective_%sroute_bulk_add' % self.routeDirection.lower())
+        st = bulk_add(pickle.dumps(routes, pickle.HIGHEST_PROTOCOL), opts.replace is True)
+
+        if st:
+            self.protocol.sendData('Successfully imported %s %s Routes' % (len(routes), self.routeDirection))
+        else:
+            self.protocol.sendData('Failed importing %s Routes, check log for details' % self.routeDirection)
@@ -4,7 +4,7 @@ import inspect
 import re
 
 from jasmin.protocols.cli.filtersm import MOFILTERS
-from jasmin.protocols.cli.managers import PersistableManager, Session
+from jasmin.protocols.cli.managers import RouterManager, Session
 from jasmin.routing.Routes import (DefaultRoute, StaticMORoute, RandomRoundrobinMORoute, FailoverMORoute)
 from jasmin.routing.jasminApi import SmppServerSystemIdConnector
 
@@ -229,9 +229,14 @@ class MORouteExist:
         return exist_moroute_and_call
 
 
-class MoRouterManager(PersistableManager):
+class MoRouterManager(RouterManager):
     """MO Router manager logics"""
     managerName = 'morouter'
+    routeDirection = 'MO'
+    # Route class names are imported from jasmin.routing.Routes
+    routeClasses = {route: globals()[route] for route in MOROUTES}
+    routeFilters = MOFILTERS
+    ratedRoutes = False
 
     def persist(self, arg, opts):
         if self.pb['router'].perspective_persist(opts.profile, 'moroutes'):
@@ -316,6 +321,18 @@ class MoRouterManager(PersistableManager):
                                  annoucement='Adding a new MO Route: (ok: save, ko: exit)',
                                  completitions=list(MORouteKeyMap))
 
+    def _get_connector(self, typed_cid):
+        ctype, cid = validate_typed_connector_id(typed_cid)
+        if ctype == 'http':
+            if cid not in self.protocol.managers['httpccm'].httpccs:
+                raise Exception('Unknown http cid: %s' % (cid))
+
+            return self.protocol.managers['httpccm'].httpccs[cid]
+        elif ctype == 'smpps':
+            return SmppServerSystemIdConnector(cid)
+        else:
+            raise NotImplementedError("Not implemented yet !")
+
     @MORouteExist(order_key='remove')
     def remove(self, arg, opts):
         st = self.pb['router'].perspective_moroute_remove(int(opts.remove))
@@ -4,11 +4,14 @@ import inspect
 import re
 
 from jasmin.protocols.cli.filtersm import MTFILTERS
-from jasmin.protocols.cli.managers import PersistableManager, Session
-from jasmin.routing.Routes import (DefaultRoute, StaticMTRoute, RandomRoundrobinMTRoute, FailoverMTRoute)
+from jasmin.protocols.cli.managers import RouterManager, Session
+from jasmin.routing.Routes import (DefaultRoute, StaticMTRoute, RandomRoundrobinMTRoute, FailoverMTRoute,
+                                   BestQualityMTRoute, WeightedRoundrobinMTRoute, LeastOutstandingMTRoute,
+                                   ShortestQueueMTRoute)
 from jasmin.routing.jasminApi import SmppClientConnector
 
-MTROUTES = ['DefaultRoute', 'StaticMTRoute', 'RandomRoundrobinMTRoute', 'FailoverMTRoute']
+MTROUTES = ['DefaultRoute', 'StaticMTRoute', 'RandomRoundrobinMTRoute', 'FailoverMTRoute', 'BestQualityMTRoute',
+            'WeightedRoundrobinMTRoute', 'LeastOutstandingMTRoute', 'ShortestQueueMTRoute']
 
 # A config map between console-configuration keys and Route keys.
 MTRouteKeyMap = {'order': 'order', 'type': 'type'}
@@ -172,6 +175,14 @@ def MTRouteBuild(fCallback):
                     except ValueError:
                         return self.protocol.sendData('Incorrect rate (must be float): %s' % (arg))
 
+                # Validate weights and convert them to integers
+                if cmd == 'weights':
+                    try:
+                        arg = [int(weight) for weight in arg.split(';')]
+                    except ValueError:
+                        return self.protocol.sendData(
+                            'Incorrect weights (must be integers separated with ";"): %s' % (arg))
+
                 # Validate filters
                 if cmd == 'filters':
                     FIDs = arg.split(';')
@@ -226,9 +237,13 @@ class MTRouteExist:
         return exist_mtroute_and_call
 
 
-class MtRouterManager(PersistableManager):
+class MtRouterManager(RouterManager):
     """MT Router manager logics"""
     managerName = 'mtrouter'
+    routeDirection = 'MT'
+    # Route class names are imported from jasmin.routing.Routes
+    routeClasses = {route: globals()[route] for route in MTROUTES}
+    routeFilters = MTFILTERS
 
     def persist(self, arg, opts):
         if self.pb['router'].perspective_persist(opts.profile, 'mtroutes'):
@@ -324,6 +339,16 @@ class MtRouterManager(PersistableManager):
                                  annoucement='Adding a new MT Route: (ok: save, ko: exit)',
                                  completitions=list(MTRouteKeyMap))
 
+    def _get_connector(self, typed_cid):
+        ctype, cid = validate_typed_connector_id(typed_cid)
+        if ctype == 'smppc':
+            if self.pb['smppcm'].getConnector(cid) is None:
+                raise Exception('Unknown smppc cid: %s' % (cid))
+
+            return SmppClientConnector(self.pb['smppcm'].getConnector(cid)['id'])
+        else:
+            raise NotImplementedError("Not implemented yet !")
+
     @MTRouteExist(order_key='remove')
     def remove(self, arg, opts):
         st = self.pb['router'].perspective_mtroute_remove(int(opts.remove))
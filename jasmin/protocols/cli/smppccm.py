@@ -26,14 +26,16 @@ SMPPClientConfigKeyMap = {
     'def_msg_id': 'sm_default_msg_id', 'coding': 'data_coding', 'requeue_delay': 'requeue_delay',
     'submit_throughput': 'submit_sm_throughput', 'dlr_expiry': 'dlr_expiry', 'dlr_msgid': 'dlr_msg_id_bases',
     'con_fail_retry': 'reconnectOnConnectionFailure', 'dst_npi': 'dest_addr_npi',
-    'trx_to': 'inactivityTimerSecs', 'ssl': 'useSSL', 'custom_tlvs': 'custom_tlvs'}
+    'trx_to': 'inactivityTimerSecs', 'ssl': 'useSSL', 'custom_tlvs': 'custom_tlvs',
+    'window_size': 'window_size', 'submit_burst': 'submit_sm_burst', 'adaptive_throughput': 'adaptive_throughput',
+    'adaptive_min_throughput': 'adaptive_min_throughput', 'sessions': 'sessions'}
 
 # Keys to be kept in string type, as requested in #64 and #105
 SMPPClientConfigStringKeys = [
     'host', 'systemType', 'username', 'password', 'addressRange', 'useSSL', 'source_addr', 'custom_tlvs']
 
 # When updating a key from RequireRestartKeys, the connector need restart for update to take effect
-RequireRestartKeys = ['host', 'port', 'username', 'password', 'systemType']
+RequireRestartKeys = ['host', 'port', 'username', 'password', 'systemType', 'window_size', 'sessions']
 
 
 def castOutputToBuiltInType(key, value):
@@ -143,7 +145,7 @@ def castInputToBuiltInType(key, value):
             return replace_if_present_flap_value_map[value]
         elif key == 'priority':
             return priority_flag_value_map[value]
-        elif key in ['con_fail_retry', 'con_loss_retry', 'ssl', 'logprivacy']:
+        elif key in ['con_fail_retry', 'con_loss_retry', 'ssl', 'logprivacy', 'adaptive_throughput']:
             if value == 'yes':
                 return True
             elif value == 'no':
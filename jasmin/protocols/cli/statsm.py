@@ -107,17 +107,25 @@ class StatsManager(Manager):
         sc = SMPPClientStatsCollector()
         headers = ["#Item", "Value"]
 
+        # Multi-session connectors are showing every session stats next to the aggregated ones
+        sessions = sc.getSessions(opts.smppc)
+        if len(sessions) > 1:
+            headers.extend(["Session %s" % session.session for session in sessions])
+        else:
+            sessions = []
+
         table = []
         for k, v in sc.get(opts.smppc).getStats().items():
-            if isinstance(v, dict):
-                v = json.dumps(v)
-
             row = []
             row.append('#%s' % k)
-            if k[-3:] == '_at':
-                row.append(formatDateTime(v))
-            else:
-                row.append(v)
+            for _v in [v] + [session.get(k) for session in sessions]:
+                if isinstance(_v, dict):
+                    _v = json.dumps(_v)
+
+                if k[-3:] == '_at':
+                    row.append(formatDateTime(_v))
+                else:
+                    row.append(_v)
 
             table.append(row)
 
@@ -18,6 +18,14 @@ class HTTPApiConfig(ConfigFile):
 
         self.billing_feature = self._getbool('http-api', 'billing_feature', True)
 
+        # User http_throughput token bucket size and maximum time (seconds) a request can be
+        # queued waiting for throughput, 0 to reject it with a 403 instead
+        self.throughput_burst = self._getint('http-api', 'throughput_burst', 1)
+        self.throughput_queue_timeout = self._getfloat('http-api', 'throughput_queue_timeout', 0)
+
+        # Authenticated credentials cache TTL (seconds), 0 to disable it
+        self.auth_cache_ttl = self._getfloat('http-api', 'auth_cache_ttl', 0)
+
         # Logging
         self.access_log = self._get(
             'http-api', 'access_log', '%s/http-accesslog.log' % LOG_PATH)
@@ -3,6 +3,10 @@
 
 """Jasmin SMS Gateway by Jookies LTD <jasmin@jookies.net>"""
 import binascii
+import hashlib
+import os
+import time
+
 from jasmin.protocols.http.errors import UrlArgsValidationError, AuthenticationError
 
 
@@ -14,15 +18,77 @@ def hex2bin(hex_content):
     except Exception as e:
         raise UrlArgsValidationError("Invalid hex-content data: '%s'" % hex_content)
 
-def authenticate_user(username, password, routerpb, stats, log):
+
+class CredentialCache:
+    """A short-TTL cache of successfully authenticated (username, password) credentials
+
+    Entries are keyed on a keyed hash of the credentials (clear passwords are never kept), they
+    expire after ttl seconds and are all dropped as soon as RouterPB users or groups are updated
+    (user disabled/removed/replaced, group disabled ...), c.f. RouterPB.credentials_revision.
+    """
+
+    def __init__(self, ttl, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.secret = os.urandom(32)
+        self.entries = {}
+        self.revision = None
+
+    def _key(self, username, password):
+        return hashlib.blake2b(b'%s\x00%s' % (username.encode(), password.encode()),
+                               key=self.secret, digest_size=16).digest()
+
+    def _check_revision(self, revision):
+        if revision != self.revision:
+            self.entries.clear()
+            self.revision = revision
+
+    def get(self, username, password, revision):
+        """Return the cached user or None"""
+        self._check_revision(revision)
+
+        key = self._key(username, password)
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+
+        user, expires_at = entry
+        if expires_at < time.monotonic():
+            del self.entries[key]
+            return None
+
+        return user
+
+    def set(self, username, password, revision, user):
+        self._check_revision(revision)
+
+        if len(self.entries) >= self.max_entries:
+            now = time.monotonic()
+            for key in [k for k, (_, expires_at) in self.entries.items() if expires_at < now]:
+                del self.entries[key]
+            if len(self.entries) >= self.max_entries:
+                self.entries.clear()
+
+        self.entries[self._key(username, password)] = (user, time.monotonic() + self.ttl)
+
+
+def authenticate_user(username, password, routerpb, stats, log, credential_cache=None):
     if isinstance(username, bytes):
         username = username.decode()
     if isinstance(password, bytes):
         password = password.decode()
 
+    if credential_cache is not None:
+        user = credential_cache.get(username, password, routerpb.credentials_revision)
+        if user is not None:
+            return user
+
     user = routerpb.authenticateUser(
         username=username,
         password=password)
+    if user is not None and credential_cache is not None:
+        credential_cache.set(username, password, routerpb.credentials_revision, user)
+
     if user is None:
         stats.inc('auth_error_count')
 
@@ -12,12 +12,13 @@ from jasmin.protocols.http.endpoints import authenticate_user
 class Balance(Resource):
     isleaf = True
 
-    def __init__(self, RouterPB, stats, log):
+    def __init__(self, RouterPB, stats, log, credential_cache=None):
         Resource.__init__(self)
 
         self.RouterPB = RouterPB
         self.stats = stats
         self.log = log
+        self.credential_cache = credential_cache
 
     def render_GET(self, request):
         """
@@ -49,7 +50,8 @@ class Balance(Resource):
                 request.args[b'password'][0],
                 self.RouterPB,
                 self.stats,
-                self.log
+                self.log,
+                self.credential_cache
             )
 
             # Update CnxStatus
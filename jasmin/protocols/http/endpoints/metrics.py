@@ -2,6 +2,7 @@ from twisted.web.resource import Resource
 
 from jasmin.protocols.http.stats import HttpAPIStatsCollector
 from jasmin.protocols.smpp.stats import SMPPClientStatsCollector, SMPPServerStatsCollector
+from jasmin.routing.stats import DLRLookupStatsCollector, ThrowerStatsCollector
 
 PROM_METRICS_HTTPAPI = {
     'request_count':            {'type': b'counter', 'help': b'Http request count.'},
@@ -27,6 +28,27 @@ PROM_METRICS_SMPPC = {
     'throttling_error_count':   {'type': b'counter', 'help': b'Throttling errors count.'},
     'interceptor_error_count':  {'type': b'counter', 'help': b'Interception errors count.'},
     'other_submit_error_count': {'type': b'counter', 'help': b'Other errors count.'},
+    'pacing_delay_count':       {'type': b'counter', 'help': b'SubmitSm delayed by throughput pacing count.'},
+    'pacing_delay_ms':          {'type': b'counter', 'help': b'Cumulated throughput pacing delay in milliseconds.'},
+    'effective_throughput':     {'type': b'gauge', 'help': b'Current submit_sm throughput (messages per second).'},
+    'submit_retrials_size':     {'type': b'gauge', 'help': b'Number of submit_sm tracked for retrials.'},
+}
+PROM_METRICS_SPOOL = {
+    'depth':                    {'type': b'gauge', 'help': b'Number of spooled SubmitSm waiting for the AMQP broker.'},
+    'spooled_count':            {'type': b'counter', 'help': b'Cumulated number of spooled SubmitSm.'},
+    'replayed_count':           {'type': b'counter', 'help': b'Cumulated number of replayed SubmitSm.'},
+    'overflow_count':           {'type': b'counter', 'help': b'SubmitSm hitting a full spool count.'},
+}
+PROM_METRICS_DLRLOOKUP = {
+    'lookup_retrials_size':     {'type': b'gauge', 'help': b'Number of dlr lookups tracked for retrials.'},
+}
+PROM_METRICS_THROWER = {
+    'throwing_retrials_size':   {'type': b'gauge', 'help': b'Number of messages tracked for throwing retrials.'},
+}
+PROM_METRICS_ROUTE_CACHE = {
+    'hits':                     {'type': b'counter', 'help': b'Route decisions served from the cache count.'},
+    'misses':                   {'type': b'counter', 'help': b'Route decisions missing from the cache count.'},
+    'entries':                  {'type': b'gauge', 'help': b'Number of cached route decisions.'},
 }
 PROM_METRICS_SMPPS_API = {
     'connected_count':          {'type': b'counter', 'help': b'Number of connected sessions.'},
@@ -54,9 +76,10 @@ PROM_METRICS_SMPPS_API = {
 class Metrics(Resource):
     isleaf = True
 
-    def __init__(self, SMPPClientManagerPB, log):
+    def __init__(self, RouterPB, SMPPClientManagerPB, log):
         Resource.__init__(self)
 
+        self.RouterPB = RouterPB
         self.SMPPClientManagerPB = SMPPClientManagerPB
         self.log = log
 
@@ -101,6 +124,76 @@ class Metrics(Resource):
                     ('smppc_%s{cid="%s"} %s' % (metric, _cid, _s.get(metric))).encode(),
                 ])
 
+        # Fill smppcs sessions stats, for multi-session connectors only
+        _sessions = {}
+        for _connector in _connectors:
+            _ss = SMPPClientStatsCollector().getSessions(_connector['id'])
+            if len(_ss) > 1:
+                _sessions[_connector['id']] = _ss
+        for metric, descriptor in PROM_METRICS_SMPPC.items():
+            if len(_sessions) > 0:
+                response.extend([
+                    b'# TYPE smppc_session_%s %s' % (metric.encode(), descriptor['type']),
+                    b'# HELP smppc_session_%s %s' % (metric.encode(), descriptor['help']),
+                ])
+
+            for _cid, _ss in _sessions.items():
+                for _s in _ss:
+                    response.extend([
+                        ('smppc_session_%s{cid="%s",session="%s"} %s' % (
+                            metric, _cid, _s.session, _s.get(metric))).encode(),
+                    ])
+
+        # Fill spool stats
+        _spool = self.SMPPClientManagerPB.spool
+        if _spool is not None:
+            _s = _spool.getStats()
+            for metric, descriptor in PROM_METRICS_SPOOL.items():
+                response.extend([
+                    b'# TYPE spool_%s %s' % (metric.encode(), descriptor['type']),
+                    b'# HELP spool_%s %s' % (metric.encode(), descriptor['help']),
+                    ('spool_%s %s' % (metric, _s.get(metric))).encode(),
+                ])
+
+        # Fill route decision cache stats, for the routing tables having the cache enabled
+        _tables = [(_table, _s) for _table, _s in sorted(self.RouterPB.perspective_route_cache_stats().items())
+                   if _s is not None]
+        for metric, descriptor in PROM_METRICS_ROUTE_CACHE.items():
+            if len(_tables) > 0:
+                response.extend([
+                    b'# TYPE route_cache_%s %s' % (metric.encode(), descriptor['type']),
+                    b'# HELP route_cache_%s %s' % (metric.encode(), descriptor['help']),
+                ])
+
+            for _table, _s in _tables:
+                response.extend([
+                    ('route_cache_%s{table="%s"} %s' % (metric, _table, _s[metric])).encode(),
+                ])
+
+        # Fill dlrlookup stats, when running in this process
+        if len(DLRLookupStatsCollector().lookups) > 0:
+            _s = DLRLookupStatsCollector().get()
+            for metric, descriptor in PROM_METRICS_DLRLOOKUP.items():
+                response.extend([
+                    b'# TYPE dlrlookup_%s %s' % (metric.encode(), descriptor['type']),
+                    b'# HELP dlrlookup_%s %s' % (metric.encode(), descriptor['help']),
+                    ('dlrlookup_%s %s' % (metric, _s.get(metric))).encode(),
+                ])
+
+        # Fill throwers stats, for the ones running in this process
+        _throwers = ThrowerStatsCollector().throwers
+        for metric, descriptor in PROM_METRICS_THROWER.items():
+            if len(_throwers) > 0:
+                response.extend([
+                    b'# TYPE thrower_%s %s' % (metric.encode(), descriptor['type']),
+                    b'# HELP thrower_%s %s' % (metric.encode(), descriptor['help']),
+                ])
+
+            for _name, _s in _throwers.items():
+                response.extend([
+                    ('thrower_%s{thrower="%s"} %s' % (metric, _name, _s.get(metric))).encode(),
+                ])
+
         # Fill smpps stats
         _s = SMPPServerStatsCollector().get('smpps_01').getStats()
         for metric, descriptor in PROM_METRICS_SMPPS_API.items():
@@ -19,13 +19,14 @@ from jasmin.protocols.http.endpoints import hex2bin, authenticate_user
 class Rate(Resource):
     isleaf = True
 
-    def __init__(self, HTTPApiConfig, RouterPB, stats, log, interceptorpb_client):
+    def __init__(self, HTTPApiConfig, RouterPB, stats, log, interceptorpb_client, credential_cache=None):
         Resource.__init__(self)
 
         self.RouterPB = RouterPB
         self.stats = stats
         self.log = log
         self.interceptorpb_client = interceptorpb_client
+        self.credential_cache = credential_cache
 
         # opFactory is initiated with a dummy SMPPClientConfig used for building SubmitSm only
         self.opFactory = SMPPOperationFactory(long_content_max_parts=HTTPApiConfig.long_content_max_parts,
@@ -56,7 +57,8 @@ class Rate(Resource):
                 request.args[b'password'][0],
                 self.RouterPB,
                 self.stats,
-                self.log
+                self.log,
+                self.credential_cache
             )
 
             # Update CnxStatus
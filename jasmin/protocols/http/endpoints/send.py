@@ -11,8 +11,10 @@ from smpp.pdu.smpp_time import parse
 from smpp.pdu.pdu_types import RegisteredDeliveryReceipt, RegisteredDelivery
 
 from jasmin.routing.Routables import RoutableSubmitSm
+from jasmin.routing.Routes import LoadBalancedMTRoute, BestQualityMTRoute
 from jasmin.protocols.smpp.configs import SMPPClientConfig
 from jasmin.protocols.smpp.operations import SMPPOperationFactory
+from jasmin.tools import qos
 from jasmin.tools.tlv import format_tlvs_for_log
 from jasmin.tools.tlv_encoder import normalize_custom_tlvs
 from jasmin.protocols.http.errors import UrlArgsValidationError
@@ -66,7 +68,8 @@ def update_submit_sm_pdu(routable, config, config_update_params=None):
 class Send(Resource):
     isleaf = True
 
-    def __init__(self, HTTPApiConfig, RouterPB, SMPPClientManagerPB, stats, log, interceptorpb_client):
+    def __init__(self, HTTPApiConfig, RouterPB, SMPPClientManagerPB, stats, log, interceptorpb_client,
+                 credential_cache=None):
         Resource.__init__(self)
 
         self.SMPPClientManagerPB = SMPPClientManagerPB
@@ -74,6 +77,7 @@ class Send(Resource):
         self.stats = stats
         self.log = log
         self.interceptorpb_client = interceptorpb_client
+        self.credential_cache = credential_cache
         self.config = HTTPApiConfig
 
         # opFactory is initiated with a dummy SMPPClientConfig used for building SubmitSm only
@@ -105,7 +109,8 @@ class Send(Resource):
                 updated_request.args[b'password'][0],
                 self.RouterPB,
                 self.stats,
-                self.log
+                self.log,
+                self.credential_cache
             )
 
             # Update CnxStatus
@@ -226,14 +231,21 @@ class Send(Resource):
 
             # Get connector from selected route
             self.log.debug("RouterPB selected %s route for this SubmitSmPDU", route)
-            routedConnector = route.getConnector()
+            if isinstance(route, LoadBalancedMTRoute):
+                # Pick the connector having the lowest live load
+                routedConnector = route.getConnector(self.SMPPClientManagerPB.getConnectorLoad)
+            elif isinstance(route, BestQualityMTRoute):
+                # Pick the best quality connector among the bound ones
+                routedConnector = route.getConnector(self.SMPPClientManagerPB.getConnectorState)
+            else:
+                routedConnector = route.getConnector()
             # Is it a failover route ? then check for a bound connector, otherwise don't route
             # The failover route requires at least one connector to be up, no message enqueuing will
             # occur otherwise.
             if repr(route) == 'FailoverMTRoute':
                 self.log.debug('Selected route is a failover, will ensure connector is bound:')
                 while True:
-                    c = self.SMPPClientManagerPB.perspective_connector_details(routedConnector.cid)
+                    c = self.SMPPClientManagerPB.getConnectorState(routedConnector.cid)
                     if c:
                         self.log.debug('Connector [%s] is: %s', routedConnector.cid, c['session_state'])
                     else:
@@ -254,10 +266,9 @@ class Send(Resource):
                 raise ConnectorNotFoundError("Failover route has no bound connectors")
 
             # Re-update SubmitSmPDU with parameters from the route's connector
-            connector_config = self.SMPPClientManagerPB.perspective_connector_config(routedConnector.cid)
-            if connector_config:
-                connector_config = pickle.loads(connector_config)
-                routable = update_submit_sm_pdu(routable=routable, config=connector_config)
+            connector_state = self.SMPPClientManagerPB.getConnectorState(routedConnector.cid)
+            if connector_state:
+                routable = update_submit_sm_pdu(routable=routable, config=connector_state['config'])
 
             # Set a placeholder for any parameter update to be applied on the pdu(s)
             param_updates = {}
@@ -292,20 +303,24 @@ class Send(Resource):
                                                 config_update_params=list(param_updates))
 
             # QoS throttling
-            if (user.mt_credential.getQuota('http_throughput') and user.mt_credential.getQuota('http_throughput') >= 0) and user.getCnxStatus().httpapi[
-                'qos_last_submit_sm_at'] != 0:
-                qos_throughput_second = 1 / float(user.mt_credential.getQuota('http_throughput'))
-                qos_throughput_ysecond_td = timedelta(microseconds=qos_throughput_second * 1000000)
-                qos_delay = datetime.now() - user.getCnxStatus().httpapi['qos_last_submit_sm_at']
-                if qos_delay < qos_throughput_ysecond_td:
+            http_throughput = user.mt_credential.getQuota('http_throughput')
+            if http_throughput:
+                qos_delay = qos.reserve_user_throughput(user, 'httpapi', http_throughput,
+                                                        self.config.throughput_burst,
+                                                        self.config.throughput_queue_timeout)
+                if qos_delay is None:
                     self.stats.inc('throughput_error_count')
                     self.log.error(
-                        "QoS: submit_sm_event is faster (%s) than fixed throughput (%s), user:%s, rejecting message.",
-                        qos_delay,
-                        qos_throughput_ysecond_td,
+                        "QoS: submit_sm_event is faster than throughput (%s/s, burst:%s), user:%s, rejecting message.",
+                        http_throughput,
+                        self.config.throughput_burst,
                         user)
 
                     raise ThroughputExceededError("User throughput exceeded")
+                elif qos_delay > 0:
+                    self.log.debug("QoS: submit_sm_event is faster than throughput (%s/s) for user %s, queuing for %ss.",
+                                   http_throughput, user, qos_delay)
+                    yield qos.slow_down(qos_delay)
             user.getCnxStatus().httpapi['qos_last_submit_sm_at'] = datetime.now()
 
             # Get number of PDUs to be sent (for billing purpose)
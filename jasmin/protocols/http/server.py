@@ -12,6 +12,7 @@ from jasmin.protocols.http.endpoints.rate import Rate
 from jasmin.protocols.http.endpoints.ping import Ping
 from jasmin.protocols.http.endpoints.balance import Balance
 from jasmin.protocols.http.endpoints.metrics import Metrics
+from jasmin.protocols.http.endpoints import CredentialCache
 from jasmin.protocols.http.stats import HttpAPIStatsCollector
 
 LOG_CATEGORY = "jasmin-http-api"
@@ -43,17 +44,25 @@ class HTTPApi(Resource):
             log.propagate = False
 
         self.log = log
+
+        # Authenticated credentials cache shared by /send, /rate and /balance
+        if config.auth_cache_ttl > 0:
+            credential_cache = CredentialCache(config.auth_cache_ttl)
+        else:
+            credential_cache = None
+
         # Set http url routings
         log.debug("Setting http url routing for /send")
-        self.putChild(b'send', Send(config, RouterPB, SMPPClientManagerPB, stats, log, interceptor))
+        self.putChild(b'send', Send(config, RouterPB, SMPPClientManagerPB, stats, log, interceptor,
+                                    credential_cache))
         log.debug("Setting http url routing for /rate")
-        self.putChild(b'rate', Rate(config, RouterPB, stats, log, interceptor))
+        self.putChild(b'rate', Rate(config, RouterPB, stats, log, interceptor, credential_cache))
         log.debug("Setting http url routing for /balance")
-        self.putChild(b'balance', Balance(RouterPB, stats, log))
+        self.putChild(b'balance', Balance(RouterPB, stats, log, credential_cache))
         log.debug("Setting http url routing for /ping")
         self.putChild(b'ping', Ping(log))
         log.debug("Setting http url routing for /metrics")
-        self.putChild(b'metrics', Metrics(SMPPClientManagerPB, log))
+        self.putChild(b'metrics', Metrics(RouterPB, SMPPClientManagerPB, log))
 
     def getChild(self, name, request):
         self.log.debug("Getting child with name %s", name)
@@ -2,7 +2,6 @@
 HTTP request validators
 """
 
-import re
 from jasmin.protocols.http.errors import UrlArgsValidationError, CredentialValidationError
 from jasmin.protocols.validation import AbstractCredentialValidator
 
@@ -118,15 +117,11 @@ class HttpAPICredentialValidator(AbstractCredentialValidator):
                 'Authorization failed for user [%s] (Cannot check rate).' % self.user)
 
     def _get_binary_r(self, key, credential=None):
-        "Return a compile re object with a binary pattern"
+        "Return a compiled re object with a binary pattern, None if filter is matching everything"
         if credential is None:
             credential = self.user.mt_credential
 
-        r = credential.getValueFilter(key)
-        if isinstance(r.pattern, str):
-            r = re.compile(r.pattern.encode())
-
-        return r
+        return credential.getBinaryValueFilter(key)
 
     def _checkSendFilters(self):
         """MT Filters check"""
@@ -134,7 +129,7 @@ class HttpAPICredentialValidator(AbstractCredentialValidator):
         # Filtering destination_address
         _value = self.request.args[b'to'][0]
         _r = self._get_binary_r('destination_address')
-        if _r is None or (_r.pattern != b'.*' and not _r.match(_value)):
+        if _r is not None and not _r.match(_value):
             raise CredentialValidationError(
                 'Value filter failed for user [%s] (destination_address filter mismatch).' % self.user)
 
@@ -142,7 +137,7 @@ class HttpAPICredentialValidator(AbstractCredentialValidator):
         if b'from' in self.request.args:
             _value = self.request.args[b'from'][0]
             _r = self._get_binary_r('source_address')
-            if _r is None or (_r.pattern != b'.*' and not _r.match(_value)):
+            if _r is not None and not _r.match(_value):
                 raise CredentialValidationError(
                     'Value filter failed for user [%s] (source_address filter mismatch).' % self.user)
 
@@ -150,7 +145,7 @@ class HttpAPICredentialValidator(AbstractCredentialValidator):
         if b'priority' in self.request.args:
             _value = self.request.args[b'priority'][0]
             _r = self._get_binary_r('priority')
-            if _r is None or (_r.pattern != b'^[0-3]$' and not _r.match(_value)):
+            if _r is not None and not _r.match(_value):
                 raise CredentialValidationError(
                     'Value filter failed for user [%s] (priority filter mismatch).' % self.user)
 
@@ -158,14 +153,14 @@ class HttpAPICredentialValidator(AbstractCredentialValidator):
         if b'validity-period' in self.request.args:
             _value = self.request.args[b'validity-period'][0]
             _r = self._get_binary_r('validity_period')
-            if not isinstance(_value, int) and (_r is None or (_r.pattern != b'.*' and not _r.match(_value))):
+            if not isinstance(_value, int) and _r is not None and not _r.match(_value):
                 raise CredentialValidationError(
                     'Value filter failed for user [%s] (validity_period filter mismatch).' % self.user)
 
         if b'content' in self.request.args:
             _value = self.request.args[b'content'][0]
             _r = self._get_binary_r('content')
-            if _r is None or (_r.pattern != b'.*' and not _r.match(_value)):
+            if _r is not None and not _r.match(_value):
                 raise CredentialValidationError(
                     'Value filter failed for user [%s] (content filter mismatch).' % self.user)
 
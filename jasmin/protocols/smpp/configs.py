@@ -184,6 +184,36 @@ class SMPPClientConfig:
         if (not isinstance(self.submit_sm_throughput, int)
             and not isinstance(self.submit_sm_throughput, float)):
             raise TypeMismatch('submit_sm_throughput must be an integer or float')
+        # Number of submit_sm that can be sent without pacing after an idle period
+        self.submit_sm_burst = kwargs.get('submit_sm_burst', 1)
+        if not isinstance(self.submit_sm_burst, int) or isinstance(self.submit_sm_burst, bool):
+            raise TypeMismatch('submit_sm_burst must be an integer')
+        if self.submit_sm_burst < 1:
+            raise UnknownValue('Invalid submit_sm_burst: %s' % self.submit_sm_burst)
+        # Adaptive throughput: the effective submit_sm rate is cut on ESME_RTHROTTLED and raised back
+        # after a run of ESME_ROK, between adaptive_min_throughput and submit_sm_throughput
+        self.adaptive_throughput = kwargs.get('adaptive_throughput', False)
+        if not isinstance(self.adaptive_throughput, bool):
+            raise TypeMismatch('adaptive_throughput must be a boolean')
+        self.adaptive_min_throughput = kwargs.get('adaptive_min_throughput', 1)
+        if (not isinstance(self.adaptive_min_throughput, int)
+            and not isinstance(self.adaptive_min_throughput, float)
+            or isinstance(self.adaptive_min_throughput, bool)):
+            raise TypeMismatch('adaptive_min_throughput must be an integer or float')
+        if self.adaptive_min_throughput <= 0:
+            raise UnknownValue('Invalid adaptive_min_throughput: %s' % self.adaptive_min_throughput)
+        # Maximum number of in-flight (not yet responded) submit_sm
+        self.window_size = kwargs.get('window_size', 1)
+        if not isinstance(self.window_size, int) or isinstance(self.window_size, bool):
+            raise TypeMismatch('window_size must be an integer')
+        if self.window_size < 1:
+            raise UnknownValue('Invalid window_size: %s' % self.window_size)
+        # Number of sessions (binds) opened by the connector, all sharing the same submit_sm queue
+        self.sessions = kwargs.get('sessions', 1)
+        if not isinstance(self.sessions, int) or isinstance(self.sessions, bool):
+            raise TypeMismatch('sessions must be an integer')
+        if self.sessions < 1:
+            raise UnknownValue('Invalid sessions: %s' % self.sessions)
 
         # DLR Message id bases from submit_sm_resp to deliver_sm, possible values:
         # [0] (default) : submit_sm_resp and deliver_sm messages IDs are on the same base.
@@ -246,6 +276,11 @@ class SMPPServerConfig(ConfigFile):
 
         self.billing_feature = self._getbool('smpp-server', 'billing_feature', True)
 
+        # User smpps_throughput token bucket size and maximum time (seconds) a submit_sm can be
+        # queued waiting for throughput, 0 to reject it with ESME_RTHROTTLED instead
+        self.throughput_burst = self._getint('smpp-server', 'throughput_burst', 1)
+        self.throughput_queue_timeout = self._getfloat('smpp-server', 'throughput_queue_timeout', 0)
+
         # Logging
         self.log_level = logging.getLevelName(self._get('smpp-server', 'log_level', 'INFO'))
         self.log_file = self._get(
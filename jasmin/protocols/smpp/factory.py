@@ -4,7 +4,7 @@ import sys
 import logging
 import re
 from enum import Enum
-from datetime import datetime, timedelta
+from datetime import datetime
 from logging.handlers import TimedRotatingFileHandler
 
 from OpenSSL import SSL
@@ -12,6 +12,8 @@ from twisted.internet import defer, reactor, ssl
 from twisted.internet.protocol import ClientFactory
 
 from jasmin.routing.Routables import RoutableSubmitSm
+from jasmin.routing.Routes import LoadBalancedMTRoute, BestQualityMTRoute
+from jasmin.tools import qos
 from jasmin.tools.tlv import format_tlvs_for_log
 from smpp.twisted.protocol import DataHandlerResponse, SMPPSessionStates
 from smpp.twisted.server import SMPPBindManager as _SMPPBindManager
@@ -44,14 +46,16 @@ class SmppClientIsNotConnected(Exception):
 class SMPPClientFactory(ClientFactory):
     protocol = SMPPClientProtocol
 
-    def __init__(self, config, msgHandler=None):
+    def __init__(self, config, msgHandler=None, session=0):
         self.reconnectTimer = None
         self.smpp = None
         self.connectionRetry = True
         self.config = config
+        # Session (bind) number, a connector may open many sessions, c.f. SMPPClientConfig.sessions
+        self.session = session
 
         # Setup statistics collector
-        self.stats = SMPPClientStatsCollector().get(cid=self.config.id)
+        self.stats = SMPPClientStatsCollector().get(cid=self.config.id, session=session)
         self.stats.set('created_at', datetime.now())
 
         # Set up a dedicated logger
@@ -73,6 +77,9 @@ class SMPPClientFactory(ClientFactory):
         else:
             self.msgHandler = msgHandler
 
+        # Called with (cid, session_state) on every session state change
+        self.sessionStateHandler = None
+
     def buildProtocol(self, addr):
         """Provision protocol
         """
@@ -197,6 +204,10 @@ class SMPPClientFactory(ClientFactory):
         else:
             raise SMPPClientError("Invalid bind operation: %s" % self.config.bindOperation)
 
+    def sessionStateChanged(self, sessionState):
+        if self.sessionStateHandler is not None:
+            self.sessionStateHandler(self.config.id, sessionState)
+
     def getSessionState(self):
         if self.smpp is None:
             return SMPPSessionStates.NONE
@@ -396,14 +407,21 @@ class SMPPServerFactory(_SMPPServerFactory):
 
             # Get connector from selected route
             self.log.debug("RouterPB selected %s route for this SubmitSmPDU", route)
-            routedConnector = route.getConnector()
+            if isinstance(route, LoadBalancedMTRoute) and self.SMPPClientManagerPB is not None:
+                # Pick the connector having the lowest live load
+                routedConnector = route.getConnector(self.SMPPClientManagerPB.getConnectorLoad)
+            elif isinstance(route, BestQualityMTRoute) and self.SMPPClientManagerPB is not None:
+                # Pick the best quality connector among the bound ones
+                routedConnector = route.getConnector(self.SMPPClientManagerPB.getConnectorState)
+            else:
+                routedConnector = route.getConnector()
             # Is it a failover route ? then check for a bound connector, otherwise don't route
             # The failover route requires at least one connector to be up, no message enqueuing will
             # occur otherwise.
             if repr(route) == 'FailoverMTRoute':
                 self.log.debug('Selected route is a failover, will ensure connector is bound:')
                 while True:
-                    c = self.SMPPClientManagerPB.perspective_connector_details(routedConnector.cid)
+                    c = self.SMPPClientManagerPB.getConnectorState(routedConnector.cid)
                     if c:
                         self.log.debug('Connector [%s] is: %s', routedConnector.cid, c['session_state'])
                     else:
@@ -423,20 +441,30 @@ class SMPPServerFactory(_SMPPServerFactory):
                                routable.pdu)
                 raise SubmitSmRoutingError()
 
-            # QoS throttling
-            if (routable.user.mt_credential.getQuota('smpps_throughput') and routable.user.mt_credential.getQuota('smpps_throughput') >= 0
-                and routable.user.getCnxStatus().smpps['qos_last_submit_sm_at'] != 0):
-                qos_throughput_second = 1 / float(routable.user.mt_credential.getQuota('smpps_throughput'))
-                qos_throughput_ysecond_td = timedelta(microseconds=qos_throughput_second * 1000000)
-                qos_delay = datetime.now() - routable.user.getCnxStatus().smpps['qos_last_submit_sm_at']
-                if qos_delay < qos_throughput_ysecond_td:
+            # QoS throttling (skipped when this submit_sm was already queued waiting for throughput)
+            smpps_throughput = routable.user.mt_credential.getQuota('smpps_throughput')
+            if smpps_throughput and not kw.get('qos_queued', False):
+                qos_delay = qos.reserve_user_throughput(routable.user, 'smpps', smpps_throughput,
+                                                        self.config.throughput_burst,
+                                                        self.config.throughput_queue_timeout)
+                if qos_delay is None:
                     self.log.error(
-                        "QoS: submit_sm_event is faster (%s) than fixed throughput (%s) for user (%s), rejecting message.",
-                        qos_delay,
-                        qos_throughput_ysecond_td,
+                        "QoS: submit_sm_event is faster than throughput (%s/s, burst:%s) for user (%s), rejecting message.",
+                        smpps_throughput,
+                        self.config.throughput_burst,
                         routable.user)
 
                     raise SubmitSmThroughputExceededError()
+                elif qos_delay > 0:
+                    self.log.debug(
+                        "QoS: submit_sm_event is faster than throughput (%s/s) for user (%s), queuing for %ss.",
+                        smpps_throughput, routable.user, qos_delay)
+
+                    # submit_sm_resp is sent once the message is routed again after qos_delay
+                    d = qos.slow_down(qos_delay)
+                    d.addCallback(lambda _: self.submit_sm_post_interception(
+                        routable=routable, system_id=system_id, proto=proto, qos_queued=True))
+                    return d
             routable.user.getCnxStatus().smpps['qos_last_submit_sm_at'] = datetime.now()
 
             # Pre-sending submit_sm: Billing processing
@@ -54,6 +54,18 @@ class SMPPClientProtocol(twistedSMPPClientProtocol):
         else:
             getattr(self, "onPDU_%s" % pdu.commandId.name)(pdu)
 
+    @property
+    def sessionState(self):
+        return self._sessionState
+
+    @sessionState.setter
+    def sessionState(self, sessionState):
+        self._sessionState = sessionState
+
+        # Signal session state changes to the factory (not set yet when the protocol is instanciated)
+        if getattr(self, 'factory', None) is not None:
+            self.factory.sessionStateChanged(sessionState)
+
     def connectionMade(self):
         twistedSMPPClientProtocol.connectionMade(self)
         self.factory.stats.set('connected_at', datetime.now())
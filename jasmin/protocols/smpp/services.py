@@ -9,12 +9,12 @@ LOG_CATEGORY = "jasmin-service-smpp"
 
 
 class SMPPClientService(service.Service):
-    def __init__(self, SMPPClientConfig, config):
+    def __init__(self, SMPPClientConfig, config, session=0):
         self.startCounter = 0
         self.stopCounter = 0
         self.config = config
         self.SMPPClientConfig = SMPPClientConfig
-        self.SMPPClientFactory = SMPPClientFactory(SMPPClientConfig)
+        self.SMPPClientFactory = SMPPClientFactory(SMPPClientConfig, session=session)
         self.SMPPClientServiceConfig = SMPPClientServiceConfig(self.config.getConfigFile())
 
         # Set up a dedicated logger
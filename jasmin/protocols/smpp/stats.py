@@ -1,5 +1,5 @@
 from jasmin.tools.singleton import Singleton
-from jasmin.tools.stats import Stats
+from jasmin.tools.stats import Stats, DecayingMean
 
 
 class ConnectorStatistics(Stats):
@@ -38,12 +38,44 @@ class ClientConnectorStatistics(ConnectorStatistics):
             "throttling_error_count": 0,
             "other_submit_error_count": 0,
             "interceptor_error_count": 0,
-            "interceptor_count": 0}
+            "interceptor_count": 0,
+            "pacing_delay_count": 0,
+            "pacing_delay_ms": 0,
+            "effective_throughput": 0,
+            "submit_retrials_size": 0}
 
     def getStats(self):
         return self._stats
 
 
+class ClientSessionStatistics(ClientConnectorStatistics):
+    """One client connector session (bind) statistics holder
+
+    Every update is reported to the connector statistics, these are aggregating all the sessions.
+    """
+    # Keys reported to the connector statistics by its first session only
+    first_session_keys = ['created_at']
+
+    def __init__(self, cid, session, connector_stats):
+        self.session = session
+        self.connector_stats = connector_stats
+
+        ClientConnectorStatistics.__init__(self, cid)
+
+    def set(self, key, value):
+        ClientConnectorStatistics.set(self, key, value)
+        if self.session == 0 or key not in self.first_session_keys:
+            self.connector_stats.set(key, value)
+
+    def inc(self, key, inc=1):
+        ClientConnectorStatistics.inc(self, key, inc)
+        self.connector_stats.inc(key, inc)
+
+    def dec(self, key, inc=1):
+        ClientConnectorStatistics.dec(self, key, inc)
+        self.connector_stats.dec(key, inc)
+
+
 class ServerConnectorStatistics(ConnectorStatistics):
     """One server connector statistics holder"""
 
@@ -77,16 +109,96 @@ class ServerConnectorStatistics(ConnectorStatistics):
         return self._stats
 
 
+class ClientConnectorQuality:
+    """One client connector delivery quality holder
+
+    Keeps time-decayed means of submit_sm_resp statuses, submit_sm_resp latencies and final
+    delivery receipt statuses, these are combined into a score used by BestQualityMTRoute.
+    A sample's weight is halved every half_life seconds: stale samples fade out and the means go
+    back to their neutral priors, which are also used for a connector without any sample.
+    """
+    half_life = 300
+
+    # Neutral priors, each weighing one sample
+    success_prior = 0.5
+    delivered_prior = 0.5
+    latency_prior = 1.0
+
+    def __init__(self, cid):
+        self.cid = cid
+
+        self.submit_sm_resp = DecayingMean(self.half_life, self.success_prior)
+        self.latency = DecayingMean(self.half_life, self.latency_prior)
+        self.dlr = DecayingMean(self.half_life, self.delivered_prior)
+
+    def submit_sm_resp_received(self, success, latency=None):
+        """Feed a submit_sm_resp (or a submit_sm timeout when success is False and latency is None)"""
+        self.submit_sm_resp.add(1 if success else 0)
+        if latency is not None:
+            self.latency.add(latency)
+
+    def dlr_received(self, delivered):
+        """Feed a final delivery receipt"""
+        self.dlr.add(1 if delivered else 0)
+
+    def getScore(self):
+        """Return a score in ]0, 1], higher is better
+
+        score = submit_sm_resp success ratio * delivered ratio / (1 + mean latency in seconds), a
+        connector without any (or with only stale) samples gets the priors' score (0.125): lower
+        than a healthy connector's, higher than a failing one's.
+        """
+        return (self.submit_sm_resp.mean() * self.dlr.mean() /
+                (1.0 + self.latency.mean()))
+
+    def getStats(self):
+        return {
+            'submit_sm_resp_samples': round(self.submit_sm_resp.samples(), 2),
+            'submit_sm_resp_success_ratio': self.submit_sm_resp.mean(),
+            'submit_sm_resp_latency': self.latency.mean(),
+            'dlr_samples': round(self.dlr.samples(), 2),
+            'dlr_delivered_ratio': self.dlr.mean(),
+            'score': self.getScore()}
+
+
+class SMPPClientQualityCollector(metaclass=Singleton):
+    """SMPP Clients delivery quality collection holder"""
+    connectors = {}
+
+    def get(self, cid):
+        """Return a connector's quality object or instanciate a new one"""
+        if cid not in self.connectors:
+            self.connectors[cid] = ClientConnectorQuality(cid)
+
+        return self.connectors[cid]
+
+
 class SMPPClientStatsCollector(metaclass=Singleton):
     """SMPP Clients statistics collection holder"""
     connectors = {}
+    sessions = {}
 
-    def get(self, cid):
-        """Return a connector's stats object or instanciate a new one"""
+    def get(self, cid, session=None):
+        """Return a connector's stats object or instanciate a new one, the stats object of
+        one of its sessions is returned when session is given"""
         if cid not in self.connectors:
             self.connectors[cid] = ClientConnectorStatistics(cid)
 
-        return self.connectors[cid]
+        if session is None:
+            return self.connectors[cid]
+
+        sessions = self.sessions.setdefault(cid, {})
+        if session not in sessions:
+            sessions[session] = ClientSessionStatistics(cid, session, self.connectors[cid])
+
+        return sessions[session]
+
+    def getSessions(self, cid):
+        """Return a connector's sessions stats objects ordered by session number"""
+        return [stats for _, stats in sorted(self.sessions.get(cid, {}).items())]
+
+    def delSession(self, cid, session):
+        self.sessions.get(cid, {}).pop(session, None)
 
 
 class SMPPServerStatsCollector(metaclass=Singleton):
@@ -1,7 +1,6 @@
 """
 SMPP validators
 """
-import re
 from enum import Enum
 from jasmin.protocols.validation import AbstractCredentialValidator
 from jasmin.protocols.smpp.error import *
@@ -38,15 +37,11 @@ class SmppsCredentialValidator(AbstractCredentialValidator):
                 'Authorization failed for username [%s] (Setting priority is not authorized).' % self.user)
 
     def _get_binary_r(self, key, credential=None):
-        "Return a compile re object with a binary pattern"
+        "Return a compiled re object with a binary pattern, None if filter is matching everything"
         if credential is None:
             credential = self.user.mt_credential
 
-        r = credential.getValueFilter(key)
-        if isinstance(r.pattern, str):
-            r = re.compile(r.pattern.encode())
-
-        return r
+        return credential.getBinaryValueFilter(key)
 
     def _checkSendFilters(self):
         """MT Filters check"""
@@ -54,7 +49,7 @@ class SmppsCredentialValidator(AbstractCredentialValidator):
         # Filtering destination_address
         _value = self.submit_sm.params['destination_addr']
         _r = self._get_binary_r('destination_address')
-        if _r is None or (_r.pattern != b'.*' and not _r.match(_value)):
+        if _r is not None and not _r.match(_value):
             raise FilterError(
                 'Value filter failed for username [%s] (destination_address filter mismatch).' % self.user,
                 'destination_address')
@@ -62,7 +57,7 @@ class SmppsCredentialValidator(AbstractCredentialValidator):
         # Filtering source_address
         _value = self.submit_sm.params['source_addr']
         _r = self._get_binary_r('source_address')
-        if _r is None or (_r.pattern != b'.*' and not _r.match(_value)):
+        if _r is not None and not _r.match(_value):
             raise FilterError(
                 'Value filter failed for username [%s] (source_address filter mismatch).' % self.user,
                 'source_address')
@@ -70,7 +65,7 @@ class SmppsCredentialValidator(AbstractCredentialValidator):
         # Filtering priority_flag
         _value = ('%s' % priority_flag_name_map[self.submit_sm.params['priority_flag'].name]).encode()
         _r = self._get_binary_r('priority')
-        if _r is None or (_r.pattern != b'^[0-3]$' and not _r.match(_value)):
+        if _r is not None and not _r.match(_value):
             raise FilterError(
                 'Value filter failed for username [%s] (priority filter mismatch).' % self.user,
                 'priority')
@@ -78,7 +73,7 @@ class SmppsCredentialValidator(AbstractCredentialValidator):
         # Filtering content
         _value = self.submit_sm.params['short_message']
         _r = self._get_binary_r('content')
-        if _r is None or (_r.pattern != b'.*' and not _r.match(_value)):
+        if _r is not None and not _r.match(_value):
             raise FilterError(
                 'Value filter failed for username [%s] (content filter mismatch).' % self.user,
                 'content')
@@ -35,6 +35,18 @@ class AmqpConfig(ConfigFile):
         self.spec = self._get('amqp-broker', 'spec', '%s/amqp0-9-1.xml' % RESOURCE_PATH)
         self.heartbeat = self._getint('amqp-broker', 'heartbeat', 0)
 
+        # Publisher confirms
+        self.publisher_confirms = self._getbool('amqp-broker', 'publisher_confirms', False)
+        self.max_unconfirmed = self._getint('amqp-broker', 'max_unconfirmed', 10000)
+
+        # Channel pool
+        self.publish_channels = self._getint('amqp-broker', 'publish_channels', 0)
+        self.consumer_channels = self._getbool('amqp-broker', 'consumer_channels', False)
+        self.consumer_prefetch_count = self._getint('amqp-broker', 'consumer_prefetch_count', 0)
+
+        # Delayed requeuing through broker side retry tiers instead of in-process timers
+        self.retry_tiers = self._getbool('amqp-broker', 'retry_tiers', False)
+
         # Logging
         self.log_level = logging.getLevelName(self._get('amqp-broker', 'log_level', 'INFO'))
         self.log_file = self._get('amqp-broker', 'log_file', '%s/amqp-client.log' % LOG_PATH)
@@ -1,15 +1,32 @@
 # pylint: disable=E0203
 import sys
 import logging
+from collections import OrderedDict
 from logging.handlers import TimedRotatingFileHandler
 from twisted.internet.protocol import ClientFactory
 from twisted.internet import defer, reactor
 from txamqp.client import TwistedDelegate
+from txamqp.content import Content
 from jasmin.queues.protocol import AmqpProtocol
 
 LOG_CATEGORY = "jasmin-amqp-factory"
 
 
+class PublishNotConfirmed(Exception):
+    """Raised when the broker nacked a published message or when the channel was lost before
+    getting the message confirmed"""
+
+
+class AmqpDelegate(TwistedDelegate):
+    """Forward publisher confirms (basic.ack and basic.nack from the broker) to the factory"""
+
+    def basic_ack(self, ch, msg):
+        self.client.factory.publishConfirmed(msg.delivery_tag, msg.multiple, True, ch.id)
+
+    def basic_nack(self, ch, msg):
+        self.client.factory.publishConfirmed(msg.delivery_tag, msg.multiple, False, ch.id)
+
+
 class AmqpFactory(ClientFactory):
     protocol = AmqpProtocol
 
@@ -20,13 +37,31 @@ class AmqpFactory(ClientFactory):
         self.config = config
         self.channelReady = None
 
-        self.delegate = TwistedDelegate()
+        self.delegate = AmqpDelegate()
+
+        # Channel pool: channels dedicated to publishing (used in turn by publish()) and
+        # channels dedicated to consumers, keyed by consumer tag
+        self.chan = None
+        self.nextChannelId = 2
+        self.publishChans = []
+        self.publishTurn = 0
+        self.consumerChans = {}
+        self.passiveChan = None
+
+        # Publisher confirms, per channel id: delivery tag of the last published message and the
+        # deferreds of the messages waiting for a confirmation, ordered by delivery tag
+        self.publishSeq = {}
+        self.unconfirmed = {}
 
         self.amqp = None  # The protocol instance.
         self.client = None  # Alias for protocol instance
 
         self.queues = []
 
+        # Callables called with the factory every time the channel gets ready (on connection
+        # and reconnections)
+        self.channelReadyListeners = []
+
         # Set up a dedicated logger
         self.log = logging.getLogger(LOG_CATEGORY)
         if len(self.log.handlers) != 1:
@@ -107,6 +142,7 @@ class AmqpFactory(ClientFactory):
         self.connected = False
 
         self.client = None
+        self.failUnconfirmed(reason)
 
         if self.config.reconnectOnConnectionLoss and self.connectionRetry:
             self.log.info("Reconnecting after %d seconds ...", self.config.reconnectOnConnectionLossDelay)
@@ -167,19 +203,126 @@ class AmqpFactory(ClientFactory):
 
         self.chan = chan
         self.queues = []
+        self.failUnconfirmed('Channel changed')
+
+        # Pooled channels belong to the previous connection
+        self.nextChannelId = 2
+        self.publishChans = []
+        self.publishTurn = 0
+        self.consumerChans = {}
+        self.passiveChan = None
 
         d = self.chan.channel_open()
         d.addCallback(self._channel_open)
         d.addErrback(self._channel_open_failed)
 
+    @defer.inlineCallbacks
     def _channel_open(self, arg):
         """Called when the channel is open."""
         self.log.info("The channel is open")
 
+        if self.config.publisher_confirms and not self.specHasConfirms():
+            self.log.error("Publisher confirms are disabled: the AMQP spec file (%s) has no confirm class, "
+                           "it must be upgraded to the one shipped with Jasmin", self.config.spec)
+            self.config.publisher_confirms = False
+
+        try:
+            if self.config.publisher_confirms:
+                yield self.chan.confirm_select()
+                self.log.info("The channel is in confirm mode")
+
+            # Open the dedicated publish channels, publishing is done on the main channel otherwise
+            for _ in range(self.config.publish_channels):
+                chan = yield self.openChannel()
+                if self.config.publisher_confirms:
+                    yield chan.confirm_select()
+                self.publishChans.append(chan)
+            if len(self.publishChans) > 0:
+                self.log.info("Opened %s publish channels", len(self.publishChans))
+        except Exception as e:
+            self.log.error("Channel setup failed: %s", e)
+            return
+
         # Flag that the connection is open.
         self.connected = True
+        for listener in self.channelReadyListeners:
+            listener(self)
         self.channelReady.callback(self)
 
+    def specHasConfirms(self):
+        """Return True if the loaded AMQP spec has the confirm class (confirm.select) and basic.nack,
+        these RabbitMQ extensions are missing from older spec files"""
+        spec = self.client.spec
+        return 'confirm' in spec.classes.byname and 'nack' in spec.classes.byname['basic'].methods.byname
+
+    def addChannelReadyListener(self, listener):
+        """Call listener(factory) every time the channel gets ready"""
+        self.channelReadyListeners.append(listener)
+
+    @defer.inlineCallbacks
+    def openChannel(self):
+        """Open a new channel on the current connection"""
+        channelId = self.nextChannelId
+        self.nextChannelId += 1
+
+        chan = yield self.client.channel(channelId)
+        yield chan.channel_open()
+        self.log.debug("Opened channel #%s", channelId)
+
+        defer.returnValue(chan)
+
+    @defer.inlineCallbacks
+    def getConsumerChannel(self, consumer_tag, prefetch_count=None):
+        """Return the channel to consume with consumer_tag
+
+        When consumer_channels is enabled, every consumer gets its own channel (kept for further
+        consumes with the same consumer_tag) and its own prefetch limit: prefetch_count or the
+        configured default, the main channel is returned otherwise: it is shared by all consumers,
+        its prefetch limit is left unchanged and prefetch_count is not enforced.
+        """
+        if not self.config.consumer_channels:
+            if prefetch_count is not None:
+                self.log.info("Prefetch limit %s of consumer %s is not enforced: consumer_channels is "
+                              "disabled", prefetch_count, consumer_tag)
+            defer.returnValue(self.chan)
+
+        if consumer_tag not in self.consumerChans or self.consumerChans[consumer_tag].closed:
+            self.consumerChans[consumer_tag] = yield self.openChannel()
+            self.log.info("Opened a dedicated channel for consumer %s", consumer_tag)
+
+        if prefetch_count is None:
+            prefetch_count = self.config.consumer_prefetch_count
+        chan = self.consumerChans[consumer_tag]
+        yield chan.basic_qos(prefetch_count=prefetch_count)
+
+        defer.returnValue(chan)
+
+    def lookupConsumerChannel(self, consumer_tag):
+        """Return the channel consumer_tag is consuming on, messages delivered to a consumer
+        must be acked/rejected through its channel"""
+        return self.consumerChans.get(consumer_tag, self.chan)
+
+    @defer.inlineCallbacks
+    def releaseConsumerChannel(self, consumer_tag):
+        """Close consumer_tag's dedicated channel if any, unacked messages are requeued by the broker"""
+        chan = self.consumerChans.pop(consumer_tag, None)
+        if chan is not None and self.connected:
+            yield chan.channel_close()
+            self.log.info("Closed the dedicated channel of consumer %s", consumer_tag)
+
+    @defer.inlineCallbacks
+    def passive_queue_declare(self, queue):
+        """Passively declare queue (i.e. get its message and consumer counts) on a dedicated channel
+
+        The broker closes the channel when the queue does not exist (404 NOT_FOUND), this does not
+        affect the other channels: the dedicated channel is reopened on next call.
+        """
+        if self.passiveChan is None or self.passiveChan.closed:
+            self.passiveChan = yield self.openChannel()
+
+        r = yield self.passiveChan.queue_declare(queue=queue, passive=True)
+        defer.returnValue(r)
+
     def _channel_open_failed(self, error):
         self.log.error("Channel open failed: %s", error)
 
@@ -221,13 +364,101 @@ class AmqpFactory(ClientFactory):
     def publish(self, **args):
         """This is a wrapper to channel's publish method
         it is intended for connection checking before publishing
+
+        When publisher confirms are enabled, the returned deferred will fire with the message
+        delivery tag once the broker confirmed it or errback with PublishNotConfirmed.
         """
 
         if not self.connected:
             self.log.error("AMQP Client is not connected, cannot publish: %s", args)
             return None
 
-        return self.chan.basic_publish(**args)
+        if len(self.publishChans) > 0:
+            chan = self.publishChans[self.publishTurn % len(self.publishChans)]
+            self.publishTurn += 1
+        else:
+            chan = self.chan
+
+        if not self.config.publisher_confirms:
+            return chan.basic_publish(**args)
+
+        # Delivery tags are sequentially given by the broker to messages published on the channel
+        self.publishSeq[chan.id] = self.publishSeq.get(chan.id, 0) + 1
+        confirmed = defer.Deferred()
+        self.unconfirmed.setdefault(chan.id, OrderedDict())[self.publishSeq[chan.id]] = confirmed
+
+        d = chan.basic_publish(**args)
+        d.addCallback(lambda _: confirmed)
+        return d
+
+    @defer.inlineCallbacks
+    def publishRetry(self, message, delay, retrial=True, exchange='messaging'):
+        """Publish a copy of a consumed message to its retry tier
+
+        Retry tiers are per-delay and per-routing key TTL queues dead-lettering their messages
+        back to exchange with the message's original routing key after delay seconds, this replaces
+        an in-process timer holding the message unacked; the number of retrials is carried in the
+        'retrials' header and is not incremented when retrial is False.
+        The consumed message must be acked by the caller.
+        """
+        tierQueue = 'retry.%ss.%s.%s' % (delay, exchange, message.routing_key)
+        yield self.named_queue_declare(queue=tierQueue, arguments={
+            'x-message-ttl': int(delay * 1000),
+            'x-dead-letter-exchange': exchange,
+            'x-dead-letter-routing-key': message.routing_key})
+
+        properties = dict(message.content.properties)
+        properties['headers'] = dict(properties.get('headers') or {})
+        properties['headers']['retrials'] = properties['headers'].get('retrials', 0) + (1 if retrial else 0)
+
+        d = self.publish(exchange='', routing_key=tierQueue,
+                         content=Content(message.content.body, properties=properties))
+        if d is None:
+            raise Exception('AMQP Client is not connected, cannot publish to %s' % tierQueue)
+        yield d
+
+    def publishConfirmed(self, delivery_tag, multiple, acked, channel_id=1):
+        """Called when the broker acked (or nacked) the message having delivery_tag on channel_id,
+        all the messages up to and including delivery_tag are confirmed when multiple is set
+        """
+        unconfirmed = self.unconfirmed.get(channel_id, {})
+        if multiple:
+            tags = []
+            for tag in unconfirmed:
+                if tag > delivery_tag:
+                    break
+                tags.append(tag)
+        elif delivery_tag in unconfirmed:
+            tags = [delivery_tag]
+        else:
+            tags = []
+
+        if not acked:
+            self.log.error("Broker nacked %s published message(s) up to delivery tag %s on channel #%s",
+                           len(tags), delivery_tag, channel_id)
+
+        for tag in tags:
+            d = unconfirmed.pop(tag)
+            if acked:
+                d.callback(tag)
+            else:
+                d.errback(PublishNotConfirmed('Message nacked by broker (delivery tag %s)' % tag))
+
+    def failUnconfirmed(self, reason):
+        """Errback all the messages waiting for a confirmation, these are lost with the channel
+        and delivery tags start over on a new channel"""
+        count = self.getUnconfirmedCount()
+        if count > 0:
+            self.log.error("%s published message(s) were not confirmed: %s", count, reason)
+
+        unconfirmed, self.unconfirmed, self.publishSeq = self.unconfirmed, {}, {}
+        for channel_unconfirmed in unconfirmed.values():
+            for tag, d in channel_unconfirmed.items():
+                d.errback(PublishNotConfirmed('Message not confirmed (delivery tag %s): %s' % (tag, reason)))
+
+    def getUnconfirmedCount(self):
+        """Return the number of published messages waiting for a broker confirmation"""
+        return sum(len(channel_unconfirmed) for channel_unconfirmed in self.unconfirmed.values())
 
     def stopConnectionRetrying(self):
         """This will stop the factory from reconnecting
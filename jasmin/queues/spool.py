@@ -0,0 +1,244 @@
+"""
+A local disk spool holding messages to be published when the AMQP broker is disconnected
+"""
+
+import os
+import pickle
+import struct
+from collections import OrderedDict
+
+from twisted.internet import defer
+
+# Every record is a pickled dict of publish() arguments prefixed with its length
+RECORD_HEADER = struct.Struct('!I')
+SEGMENT_SUFFIX = '.spool'
+
+# Replay progress: the first segment number and the offset of its first record left to replay
+REPLAY_OFFSET = struct.Struct('!QQ')
+REPLAY_OFFSET_FILENAME = 'replay.offset'
+
+
+class SpoolOverflowPolicyError(Exception):
+    """Raised when an unknown overflow policy is configured"""
+
+
+class PublishSpool:
+    """Bounded, append-only spool of publish() arguments
+
+    Records are appended to segment files holding up to segment_messages records each, a segment
+    is deleted once all its records are replayed; records left by a previous run are replayed too.
+    The replay offset in the first segment is saved after every replayed record, records replayed
+    before a restart are not replayed again.
+    When max_messages records are spooled, the overflow_policy applies:
+     - reject:      new records are refused
+     - drop_oldest: the oldest segment is dropped to make room
+    """
+    overflow_policies = ['reject', 'drop_oldest']
+
+    def __init__(self, path, max_messages=100000, segment_messages=1000, overflow_policy='reject',
+                 pickleProtocol=pickle.HIGHEST_PROTOCOL):
+        if overflow_policy not in self.overflow_policies:
+            raise SpoolOverflowPolicyError('Unknown spool overflow policy: %s' % overflow_policy)
+
+        self.path = path
+        self.max_messages = max_messages
+        self.segment_messages = max(segment_messages, 1)
+        self.overflow_policy = overflow_policy
+        self.pickleProtocol = pickleProtocol
+        self.replaying = False
+
+        self.stats = {
+            'depth': 0,
+            'spooled_count': 0,
+            'replayed_count': 0,
+            'overflow_count': 0,
+        }
+
+        if not os.path.exists(self.path):
+            os.makedirs(self.path)
+
+        # Records are appended to the last segment and replayed from the first one
+        self.write_segment = None
+        self.write_count = 0
+        self.read_offset = 0
+        # Open file of the segment being replayed and of the replay offset
+        self.reader = None
+        self.reader_segment = None
+        self.offset_file = None
+
+        # Segment number -> number of records left to replay in the segment
+        self.segments = OrderedDict()
+        for filename in sorted(os.listdir(self.path)):
+            if filename.endswith(SEGMENT_SUFFIX):
+                self.segments[int(filename[:-len(SEGMENT_SUFFIX)])] = 0
+
+        if len(self.segments) > 0:
+            self.read_offset = self._loadReadOffset(next(iter(self.segments)))
+        for segment in self.segments:
+            offset = self.read_offset if segment == next(iter(self.segments)) else 0
+            self.segments[segment] = sum(1 for _ in self._read(segment, offset))
+        self.stats['depth'] = sum(self.segments.values())
+
+    def __len__(self):
+        return self.stats['depth']
+
+    def getStats(self):
+        return self.stats
+
+    def _filename(self, segment):
+        return os.path.join(self.path, '%020d%s' % (segment, SEGMENT_SUFFIX))
+
+    def _loadReadOffset(self, first_segment):
+        """Return the saved replay offset of first_segment, 0 if it was not being replayed"""
+        try:
+            with open(os.path.join(self.path, REPLAY_OFFSET_FILENAME), 'rb') as f:
+                segment, offset = REPLAY_OFFSET.unpack(f.read(REPLAY_OFFSET.size))
+        except (IOError, struct.error):
+            return 0
+
+        return offset if segment == first_segment else 0
+
+    def _saveReadOffset(self, segment):
+        if self.offset_file is None:
+            self.offset_file = open(os.path.join(self.path, REPLAY_OFFSET_FILENAME), 'wb')
+
+        self.offset_file.seek(0)
+        self.offset_file.write(REPLAY_OFFSET.pack(segment, self.read_offset))
+        self.offset_file.flush()
+
+    def _closeReader(self):
+        if self.reader is not None:
+            self.reader.close()
+            self.reader = None
+            self.reader_segment = None
+
+    def _read(self, segment, offset):
+        """Yield (record, next record offset) from a segment"""
+        with open(self._filename(segment), 'rb') as f:
+            f.seek(offset)
+            while True:
+                header = f.read(RECORD_HEADER.size)
+                if len(header) < RECORD_HEADER.size:
+                    return
+                data = f.read(RECORD_HEADER.unpack(header)[0])
+                if len(data) < RECORD_HEADER.unpack(header)[0]:
+                    # Truncated record (crash while appending)
+                    return
+                offset += RECORD_HEADER.size + len(data)
+                yield pickle.loads(data), offset
+
+    def _drop_segment(self, segment):
+        if segment == self.reader_segment:
+            self._closeReader()
+        self.stats['depth'] -= self.segments.pop(segment)
+        os.remove(self._filename(segment))
+        if segment == self.write_segment:
+            self.write_segment = None
+        self.read_offset = 0
+
+        # Segment numbers start over once the spool is empty, a saved offset would apply to them
+        if len(self.segments) == 0:
+            if self.offset_file is not None:
+                self.offset_file.close()
+                self.offset_file = None
+            if os.path.exists(os.path.join(self.path, REPLAY_OFFSET_FILENAME)):
+                os.remove(os.path.join(self.path, REPLAY_OFFSET_FILENAME))
+
+    def append(self, record):
+        """Append a record (publish() arguments), return False if it was refused"""
+        if self.stats['depth'] >= self.max_messages:
+            self.stats['overflow_count'] += 1
+            if self.overflow_policy == 'reject' or len(self.segments) == 0:
+                return False
+
+            # drop_oldest
+            self._drop_segment(next(iter(self.segments)))
+
+        if self.write_segment is None or self.write_count >= self.segment_messages:
+            self.write_segment = (next(reversed(self.segments)) + 1) if len(self.segments) > 0 else 0
+            self.write_count = 0
+            self.segments[self.write_segment] = 0
+
+        data = pickle.dumps(record, self.pickleProtocol)
+        with open(self._filename(self.write_segment), 'ab') as f:
+            f.write(RECORD_HEADER.pack(len(data)) + data)
+
+        self.write_count += 1
+        self.segments[self.write_segment] += 1
+        self.stats['depth'] += 1
+        self.stats['spooled_count'] += 1
+        return True
+
+    def peek(self):
+        """Return (record, next record offset) of the first record to replay or None
+
+        The file of the segment being replayed is kept open until replay() ends.
+        """
+        while len(self.segments) > 0:
+            segment = next(iter(self.segments))
+            if self.reader_segment != segment:
+                self._closeReader()
+                self.reader = open(self._filename(segment), 'rb')
+                self.reader_segment = segment
+
+            # Seeking drops the read buffer, records appended since the last read are seen
+            self.reader.seek(self.read_offset)
+            header = self.reader.read(RECORD_HEADER.size)
+            if len(header) == RECORD_HEADER.size:
+                size, = RECORD_HEADER.unpack(header)
+                data = self.reader.read(size)
+                if len(data) == size:
+                    return pickle.loads(data), self.read_offset + RECORD_HEADER.size + size
+
+            if segment == self.write_segment:
+                return None
+
+            # Fully replayed segment
+            self._drop_segment(segment)
+
+        return None
+
+    @defer.inlineCallbacks
+    def replay(self, publish):
+        """Publish the spooled records in order through publish(), stop at the first failure
+
+        Records appended while replaying are replayed too, return the number of replayed records.
+        """
+        if self.replaying:
+            defer.returnValue(0)
+
+        self.replaying = True
+        replayed = 0
+        try:
+            while True:
+                head = self.peek()
+                if head is None:
+                    break
+
+                record, offset = head
+                segment = next(iter(self.segments))
+                d = publish(**record)
+                if d is None:
+                    # Not connected
+                    break
+                yield d
+                replayed += 1
+                self.stats['replayed_count'] += 1
+
+                if segment not in self.segments:
+                    # Segment was dropped (overflow) while publishing
+                    continue
+
+                # Record is published, move forward
+                self.segments[segment] -= 1
+                self.stats['depth'] -= 1
+                self.read_offset = offset
+                if self.segments[segment] == 0:
+                    self._drop_segment(segment)
+                else:
+                    self._saveReadOffset(segment)
+        finally:
+            self._closeReader()
+            self.replaying = False
+
+        defer.returnValue(replayed)
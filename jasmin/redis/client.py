@@ -4,6 +4,7 @@ from logging.handlers import TimedRotatingFileHandler
 import txredisapi as redis
 from twisted.internet import reactor
 from twisted.internet import defer
+from twisted.python.failure import Failure
 from jasmin.redis.configs import RedisForJasminConfig
 
 LOG_CATEGORY = "jasmin-redis-client"
@@ -22,6 +23,78 @@ class RedisForJasminProtocol(redis.RedisProtocol):
         return redis.RedisProtocol.execute_command(self, *args, **kwargs)
 
 
+class RedisForJasminConnectionHandler(redis.ConnectionHandler):
+    """Connection handler adding pipelined writes: the writes issued in the same reactor
+    iteration are sent together in one pipeline, and so in one round trip"""
+
+    def __init__(self, factory):
+        redis.ConnectionHandler.__init__(self, factory)
+
+        self.pendingWrites = []
+
+    def hmsetExpire(self, key, mapping, expiry):
+        """HMSET mapping in key and EXPIRE key in expiry seconds, return HMSET reply"""
+        return self.pipelinedWrite([('hmset', key, mapping), ('expire', key, expiry)])
+
+    def hsetExpire(self, key, field, value, expiry):
+        """HSET field in key and EXPIRE key in expiry seconds, return HSET reply"""
+        return self.pipelinedWrite([('hset', key, field, value), ('expire', key, expiry)])
+
+    @defer.inlineCallbacks
+    def hgetallMany(self, keys):
+        """HGETALL keys in one pipeline, return their replies in order"""
+        pipeline = yield self.pipeline()
+        for key in keys:
+            pipeline.hgetall(key)
+
+        try:
+            replies = yield pipeline.execute_pipeline()
+        except defer.FirstError as e:
+            e.subFailure.raiseException()
+
+        defer.returnValue(replies)
+
+    def pipelinedWrite(self, commands):
+        """Queue commands for the next pipeline flush, return the first command's reply
+
+        The returned deferred fails when any of the commands fails.
+        """
+        d = defer.Deferred()
+        self.pendingWrites.append((commands, d))
+        if len(self.pendingWrites) == 1:
+            reactor.callLater(0, self.flushWrites)
+
+        return d
+
+    @defer.inlineCallbacks
+    def flushWrites(self):
+        writes, self.pendingWrites = self.pendingWrites, []
+        self._factory.log.debug('Flushing %s pipelined redis writes', len(writes))
+
+        try:
+            pipeline = yield self.pipeline()
+            replies = [[getattr(pipeline, command[0])(*command[1:]) for command in commands]
+                       for commands, _ in writes]
+        except Exception:
+            failure = Failure()
+            for _, d in writes:
+                d.errback(failure)
+            defer.returnValue(None)
+
+        # Every write gets its own reply back: the first command's reply, or the error of its
+        # first failing command
+        for (_, d), writeReplies in zip(writes, replies):
+            r = defer.gatherResults(writeReplies, consumeErrors=True)
+            r.addCallbacks(lambda commandReplies: commandReplies[0],
+                           lambda failure: failure.value.subFailure)
+            r.chainDeferred(d)
+
+        try:
+            yield pipeline.execute_pipeline()
+        except defer.FirstError as e:
+            self._factory.log.warning('Pipelined redis write failed: %s', e.subFailure.value)
+
+
 class RedisForJasminFactory(redis.RedisFactory):
     protocol = RedisForJasminProtocol
 
@@ -38,7 +111,7 @@ class RedisForJasminFactory(redis.RedisFactory):
         self.log.info('Connection failed. Reason: %s', reason)
 
     def __init__(self, uuid, dbid, poolsize, isLazy=True,
-                 handler=redis.ConnectionHandler, config=None):
+                 handler=RedisForJasminConnectionHandler, config=None):
         if isinstance(config, RedisForJasminConfig) and config.password is not None:
             redis.RedisFactory.__init__(self, uuid, dbid, poolsize, isLazy, handler, password=config.password)
         else:
@@ -65,7 +138,8 @@ class RedisForJasminFactory(redis.RedisFactory):
 
 def makeConnection(host, port, dbid, poolsize, reconnect, isLazy, _RedisForJasminConfig=None):
     uuid = "%s:%s" % (host, port)
-    factory = RedisForJasminFactory(uuid, None, poolsize, isLazy, redis.ConnectionHandler, _RedisForJasminConfig)
+    factory = RedisForJasminFactory(uuid, None, poolsize, isLazy, RedisForJasminConnectionHandler,
+                                    _RedisForJasminConfig)
     factory.continueTrying = reconnect
     for _ in range(poolsize):
         reactor.connectTCP(host, int(port), factory)
@@ -9,6 +9,7 @@ from jasmin.routing.Bills import SubmitSmBill
 from jasmin.routing.Filters import Filter
 from jasmin.routing.Routables import Routable
 from jasmin.routing.jasminApi import *
+from jasmin.protocols.smpp.stats import SMPPClientQualityCollector
 
 
 class InvalidRouteParameterError(Exception):
@@ -368,13 +369,133 @@ class FailoverMTRoute(FailoverRoute, MTRoute):
         return MTRoute.matchFilters(self, routable)
 
 
-class BestQualityMTRoute(MTRoute):
-    # @todo: Work in progress
-    """Take the best route based on:
-        * (submit_sm / submit_sm_resp) ratio
-        * (delivered submits / underlivered submits)
+class BestQualityMTRoute(RandomRoundrobinMTRoute):
+    """Return the connector having the best recent delivery quality, the quality score is
+    based on:
+        * (submit_sm / submit_sm_resp) success ratio
+        * (delivered submits / undelivered submits) ratio
+        * submit_sm_resp latency
+    c.f. jasmin.protocols.smpp.stats.ClientConnectorQuality
+
+    Quality statistics are per process: delivered ratios are only fed when DLRLookup runs in
+    the router's process (jasmind --enable-dlr-lookup), not from a standalone dlrlookupd.
+
+    Only bound connectors are considered when the caller gives a callable returning the state of
+    a connector (c.f. SMPPClientManagerPB.getConnectorState()), when none is bound (or without
+    any state information) all connectors are considered.
     """
 
-    def __init__(self, filters, connector, rate):
-        MTRoute.__init__(self, filters, connector, rate)
-        raise NotImplementedError
+    # Probability of picking a random connector instead of the best one, this keeps the
+    # statistics of a degraded connector fresh so it can win traffic back when it recovers
+    exploration = 0.05
+
+    def getConnector(self, state=None):
+        connectors = self.connector
+        if state is not None:
+            bound_connectors = []
+            for connector in self.connector:
+                connector_state = state(connector.cid)
+                if connector_state is not None and connector_state['session_state'][:6] == 'BOUND_':
+                    bound_connectors.append(connector)
+
+            if len(bound_connectors) > 0:
+                connectors = bound_connectors
+
+        if random.random() < self.exploration:
+            return random.choice(connectors)
+
+        collector = SMPPClientQualityCollector()
+        best_score = None
+        best_connectors = []
+        for connector in connectors:
+            score = collector.get(connector.cid).getScore()
+            if best_score is None or score > best_score:
+                best_score = score
+                best_connectors = [connector]
+            elif score == best_score:
+                best_connectors.append(connector)
+
+        # Balance traffic between connectors having the same score
+        return random.choice(best_connectors)
+
+
+class WeightedRoundrobinMTRoute(RandomRoundrobinMTRoute):
+    """Return one route taken randomly from a pool of routes, each connector is picked
+    proportionally to its static weight
+    """
+
+    def __init__(self, filters, connectors, weights, rate):
+        if not isinstance(weights, list):
+            raise InvalidRouteParameterError("weights must be a list")
+        if isinstance(connectors, list) and len(weights) != len(connectors):
+            raise InvalidRouteParameterError("weights must have one weight per connector")
+        for weight in weights:
+            if not isinstance(weight, int) or weight <= 0:
+                raise InvalidRouteParameterError("weight must be a positive integer")
+
+        self.weights = weights
+
+        RandomRoundrobinMTRoute.__init__(self, filters, connectors, rate)
+
+        connector_list_str = ''
+        for c, weight in zip(connectors, weights):
+            if connector_list_str != '':
+                connector_list_str += '\n'
+            connector_list_str += '\t- %s(%s) weight %s' % (c._type, c.cid, weight)
+        if self.rate > 0:
+            rate_str = '\nrated %.2f' % self.rate
+        else:
+            rate_str = '\nNOT RATED'
+        self._str = '%s to %s connectors:\n%s %s' % (self.__class__.__name__,
+                                                     len(connectors),
+                                                     connector_list_str,
+                                                     rate_str)
+
+    def getConnector(self):
+        return random.choices(self.connector, weights=self.weights)[0]
+
+
+class LoadBalancedMTRoute(RandomRoundrobinMTRoute):
+    """Generic load balanced MT Route
+
+    Return the connector having the lowest live load_metric, the load is given by the caller
+    through a callable returning the load dict of a connector (or None if it's not bound),
+    c.f. SMPPClientManagerPB.getConnectorLoad().
+    When called without any load information (or when no connector is bound), it will behave
+    like a RandomRoundrobinMTRoute.
+    """
+    load_metric = None
+
+    def getConnector(self, load=None):
+        if load is None:
+            return RandomRoundrobinMTRoute.getConnector(self)
+
+        lowest_load = None
+        lowest_connectors = []
+        for connector in self.connector:
+            connector_load = load(connector.cid)
+            if connector_load is None:
+                continue
+
+            if lowest_load is None or connector_load[self.load_metric] < lowest_load:
+                lowest_load = connector_load[self.load_metric]
+                lowest_connectors = [connector]
+            elif connector_load[self.load_metric] == lowest_load:
+                lowest_connectors.append(connector)
+
+        if len(lowest_connectors) == 0:
+            return RandomRoundrobinMTRoute.getConnector(self)
+
+        return random.choice(lowest_connectors)
+
+
+class LeastOutstandingMTRoute(LoadBalancedMTRoute):
+    """Return the bound connector having the least submit_sm waiting for their submit_sm_resp
+    """
+    load_metric = 'outstanding'
+
+
+class ShortestQueueMTRoute(LoadBalancedMTRoute):
+    """Return the bound connector having the least messages in its submit.sm.<cid> queue
+    """
+    load_metric = 'queue_depth'
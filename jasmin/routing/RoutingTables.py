@@ -2,6 +2,11 @@
 More info: http://docs.jasminsms.com/en/latest/routing/index.html
 """
 
+from collections import OrderedDict
+
+from jasmin.routing.Filters import (TransparentFilter, ConnectorFilter, UserFilter, GroupFilter,
+                                    SourceAddrFilter, DestinationAddrFilter, ShortMessageFilter,
+                                    TagFilter)
 from jasmin.routing.Routables import Routable
 from jasmin.routing.Routes import Route
 
@@ -12,15 +17,208 @@ class InvalidRoutingTableParameterError(Exception):
     """
 
 
+def destination_addr_prefix(pattern):
+    """Return the literal digit prefix every destination_addr matching pattern must start with
+
+    DestinationAddrFilter is matched with re.match(), the pattern is then always anchored to the
+    start of destination_addr, e.g. '^3367\\d+' and '3367\\d+' will both return '3367'.
+    None is returned when no literal prefix can be safely extracted from the pattern.
+    """
+    if '|' in pattern:
+        # Alternations can not be indexed on a single prefix
+        return None
+
+    pos = 1 if pattern.startswith('^') else 0
+    prefix = ''
+    while pos < len(pattern) and pattern[pos].isdigit() and pattern[pos].isascii():
+        prefix += pattern[pos]
+        pos += 1
+
+    # A quantifier on the last literal digit makes it optional (or repeatable)
+    if pos < len(pattern) and pattern[pos] in '?*{' and prefix != '':
+        prefix = prefix[:-1]
+
+    return prefix if prefix != '' else None
+
+
+class DestinationAddrIndex:
+    """A digit trie narrowing the candidate routes of a RoutingTable
+
+    Every route holding an indexable DestinationAddrFilter is attached to the trie node of its
+    literal destination_addr prefix, all other routes (including DefaultRoute) are kept in a
+    linear list and are always candidates.
+    Candidates are returned as positions in the routing table, in table order.
+    """
+
+    def __init__(self, table):
+        self.trie = {}
+        self.unindexed = []
+
+        for position, r in enumerate(table):
+            route = list(r.values())[0]
+
+            prefix = None
+            for _filter in getattr(route, 'filters', []):
+                if isinstance(_filter, DestinationAddrFilter):
+                    _prefix = destination_addr_prefix(_filter.destination_addr.pattern)
+                    # Filters are ANDed, keep the most selective prefix
+                    if _prefix is not None and (prefix is None or len(_prefix) > len(prefix)):
+                        prefix = _prefix
+
+            if prefix is None:
+                self.unindexed.append(position)
+            else:
+                node = self.trie
+                for digit in prefix:
+                    node = node.setdefault(digit, {})
+                node.setdefault(None, []).append(position)
+
+    def getCandidates(self, destination_addr):
+        """Return table positions of routes that may match destination_addr"""
+        candidates = list(self.unindexed)
+
+        node = self.trie
+        for digit in destination_addr:
+            node = node.get(digit)
+            if node is None:
+                break
+            candidates.extend(node.get(None, []))
+
+        return sorted(candidates)
+
+
+# Routable attributes read by each cacheable filter type, any other filter type (EvalPyFilter,
+# DateIntervalFilter, TimeIntervalFilter or a custom one) makes its route decisions uncacheable
+CACHEABLE_FILTERS = {
+    TransparentFilter: (),
+    ConnectorFilter: ('connector',),
+    UserFilter: ('user',),
+    GroupFilter: ('group',),
+    SourceAddrFilter: ('source_addr',),
+    DestinationAddrFilter: ('destination_addr',),
+    ShortMessageFilter: ('short_message',),
+    TagFilter: ('tags',),
+}
+
+
+class RouteDecisionCache:
+    """A bounded LRU cache of getRouteFor() decisions
+
+    Decisions are keyed on the routable attributes read by the table filters, they are only
+    cached when no evaluated route holds a volatile (time or code dependant) filter.
+    Hits and misses are cumulated through the table lifetime, entries are dropped on every
+    table change.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self.entries = OrderedDict()
+        self.attributes = None
+        self.volatile = None
+
+    def invalidate(self):
+        self.entries.clear()
+        self.attributes = None
+        self.volatile = None
+
+    def compile(self, table):
+        """Collect routable attributes and volatile route positions of table"""
+        attributes = set()
+        self.volatile = set()
+
+        for position, r in enumerate(table):
+            route = list(r.values())[0]
+            for _filter in getattr(route, 'filters', []):
+                if type(_filter) in CACHEABLE_FILTERS:
+                    attributes.update(CACHEABLE_FILTERS[type(_filter)])
+                else:
+                    self.volatile.add(position)
+
+        self.attributes = tuple(sorted(attributes))
+
+    def getKey(self, routable):
+        key = []
+        for attribute in self.attributes:
+            if attribute == 'connector':
+                key.append(routable.connector.cid)
+            elif attribute == 'user':
+                key.append(routable.user.uid)
+            elif attribute == 'group':
+                key.append(routable.user.group.gid)
+            elif attribute == 'short_message':
+                key.append(routable.pdu.params.get('short_message'))
+                key.append(routable.pdu.params.get('message_payload'))
+            elif attribute == 'tags':
+                key.append(tuple(sorted(set(routable.getTags()))))
+            else:
+                key.append(routable.pdu.params.get(attribute))
+
+        return tuple(key)
+
+    def get(self, key):
+        """Return (found, position) for key, position is None for cached 'no route' decisions"""
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return True, self.entries[key]
+
+        self.misses += 1
+        return False, None
+
+    def set(self, key, position):
+        self.entries[key] = position
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+    def getStats(self):
+        return {'size': self.size, 'entries': len(self.entries), 'hits': self.hits, 'misses': self.misses}
+
+
 class RoutingTable:
     """Generic Routing table
     """
     _type = 'generic'
+    # Built on demand by getRouteFor() and dropped on every table change
+    _index = None
+    # Optional route decision cache, c.f. enableCache()
+    _cache = None
 
     def __init__(self):
         self.table = []
+        self._index = None
+        self._cache = None
 
-    def add(self, route, order):
+    def __getstate__(self):
+        """The destination_addr index and the route decision cache are never persisted"""
+        state = self.__dict__.copy()
+        state.pop('_index', None)
+        state.pop('_cache', None)
+        return state
+
+    def _invalidate(self):
+        self._index = None
+        if self._cache is not None:
+            self._cache.invalidate()
+
+    def enableCache(self, size):
+        """Enable a route decision cache holding up to size entries, size=0 will disable it"""
+        if not isinstance(size, int) or size < 0:
+            raise InvalidRoutingTableParameterError("cache size must be a positive integer")
+
+        self._cache = RouteDecisionCache(size) if size > 0 else None
+
+    def getCacheStats(self):
+        """Return the route decision cache counters or None if cache is disabled"""
+        if self._cache is None:
+            return None
+
+        return self._cache.getStats()
+
+    def _validate(self, route, order):
+        """Raise InvalidRoutingTableParameterError if route can not be added with order"""
         if not isinstance(route, Route):
             raise InvalidRoutingTableParameterError("route is not an instance of Route")
         if not isinstance(order, int):
@@ -56,16 +254,43 @@ class RoutingTable:
         if order == 0 and route._type != 'default':
             raise InvalidRoutingTableParameterError("Route with order=0 must be a DefaultRoute")
 
+    def add(self, route, order):
+        self._validate(route, order)
+
         # Replace older routes with the same given order
         self.remove(order)
 
         self.table.append({order: route})
         self.table = sorted(self.table, key=lambda x: sorted(x.keys()), reverse=True)
+        self._invalidate()
+
+    def bulkAdd(self, routes, replace=False):
+        """Add many (order, route) tuples at once
+
+        All routes are validated before touching the table, the new table is then built in one
+        sorted pass and swapped in, routes already having the same order are replaced.
+        When replace is True, the current table content is dropped.
+        """
+        if not isinstance(routes, list):
+            raise InvalidRoutingTableParameterError("routes must be a list of (order, route) tuples")
+
+        if replace:
+            routes_by_order = {}
+        else:
+            routes_by_order = {list(r)[0]: list(r.values())[0] for r in self.table}
+
+        for order, route in routes:
+            self._validate(route, order)
+            routes_by_order[order] = route
+
+        self.table = [{order: routes_by_order[order]} for order in sorted(routes_by_order, reverse=True)]
+        self._invalidate()
 
     def remove(self, order):
         for r in self.table:
             if list(r)[0] == order:
                 self.table.remove(r)
+                self._invalidate()
                 return True
 
         return False
@@ -75,6 +300,7 @@ class RoutingTable:
 
     def flush(self):
         self.table = []
+        self._invalidate()
 
     def getRouteFor(self, routable):
         """This will return the right route to send the routable to, None returned otherwise
@@ -83,11 +309,45 @@ class RoutingTable:
         if not isinstance(routable, Routable):
             raise InvalidRoutingTableParameterError("routable is not an instance of Routable")
 
-        for r in self.table:
-            route = list(r.values())[0]
+        table = self.table
+        cache = self._cache
+        if cache is not None:
+            if cache.attributes is None:
+                cache.compile(table)
+
+            key = cache.getKey(routable)
+            found, position = cache.get(key)
+            if found:
+                if position is None:
+                    return None
+
+                # Calling matchFilters() again will reset stateful routes (e.g. FailoverMTRoute)
+                route = list(table[position].values())[0]
+                if route.matchFilters(routable):
+                    return route
+
+        destination_addr = routable.pdu.params.get('destination_addr')
+        if destination_addr is None:
+            # No way to narrow the candidates, walk through the whole table
+            candidates = range(len(table))
+        else:
+            if self._index is None:
+                self._index = DestinationAddrIndex(table)
+            candidates = self._index.getCandidates(destination_addr.decode('utf-8', 'replace'))
+
+        volatile = False
+        for position in candidates:
+            if cache is not None and position in cache.volatile:
+                volatile = True
+
+            route = list(table[position].values())[0]
             if route.matchFilters(routable):
+                if cache is not None and not volatile:
+                    cache.set(key, position)
                 return route
 
+        if cache is not None and not volatile:
+            cache.set(key, None)
         return None
 
 
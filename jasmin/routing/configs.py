@@ -31,6 +31,9 @@ class RouterPBConfig(ConfigFile):
 
         self.pickle_protocol = self._getint('router', 'pickle_protocol', 2)
 
+        # Route decision cache size (per routing table), 0 will disable caching
+        self.route_cache_size = self._getint('router', 'route_cache_size', 0)
+
         # Logging
         self.log_level = logging.getLevelName(self._get('router', 'log_level', 'INFO'))
         self.log_rotate = self._get('router', 'log_rotate', 'W6')
@@ -47,8 +50,24 @@ class deliverSmThrowerConfig(ConfigFile):
         ConfigFile.__init__(self, config_file)
 
         self.timeout = self._getint('deliversm-thrower', 'http_timeout', 30)
+
+        # Persistent HTTP connections to the callback urls
+        self.http_persistent = self._getbool('deliversm-thrower', 'http_persistent', True)
+        self.http_pool_max_per_host = self._getint('deliversm-thrower', 'http_pool_max_per_host', 2)
+        self.http_pool_idle_timeout = self._getint('deliversm-thrower', 'http_pool_idle_timeout', 240)
+
+        # Per callback url circuit breaker and in-flight requests cap
+        self.http_circuit_failures = self._getint('deliversm-thrower', 'http_circuit_failures', 0)
+        self.http_circuit_reset_timeout = self._getint('deliversm-thrower', 'http_circuit_reset_timeout', 30)
+        self.http_max_in_flight = self._getint('deliversm-thrower', 'http_max_in_flight', 0)
+
         self.retry_delay = self._getint('deliversm-thrower', 'retry_delay', 30)
         self.max_retries = self._getint('deliversm-thrower', 'max_retries', 3)
+        self.prefetch_count = self._getint('deliversm-thrower', 'prefetch_count', None)
+
+        # Bounds of the throwing retrials tracker
+        self.retrials_ttl = self._getint('deliversm-thrower', 'retrials_ttl', 86400)
+        self.retrials_max_size = self._getint('deliversm-thrower', 'retrials_max_size', 100000)
 
         # Logging
         self.log_level = logging.getLevelName(self._get('deliversm-thrower', 'log_level', 'INFO'))
@@ -67,8 +86,28 @@ class DLRThrowerConfig(ConfigFile):
         ConfigFile.__init__(self, config_file)
 
         self.timeout = self._getint('dlr-thrower', 'http_timeout', 30)
+
+        # Persistent HTTP connections to the callback urls
+        self.http_persistent = self._getbool('dlr-thrower', 'http_persistent', True)
+        self.http_pool_max_per_host = self._getint('dlr-thrower', 'http_pool_max_per_host', 2)
+        self.http_pool_idle_timeout = self._getint('dlr-thrower', 'http_pool_idle_timeout', 240)
+
+        # Per callback url circuit breaker and in-flight requests cap
+        self.http_circuit_failures = self._getint('dlr-thrower', 'http_circuit_failures', 0)
+        self.http_circuit_reset_timeout = self._getint('dlr-thrower', 'http_circuit_reset_timeout', 30)
+        self.http_max_in_flight = self._getint('dlr-thrower', 'http_max_in_flight', 0)
+
+        # Batched POST DLRs, disabled when http_batch_size is lower than 2
+        self.http_batch_size = self._getint('dlr-thrower', 'http_batch_size', 0)
+        self.http_batch_max_wait = self._getint('dlr-thrower', 'http_batch_max_wait', 500)
+
         self.retry_delay = self._getint('dlr-thrower', 'retry_delay', 30)
         self.max_retries = self._getint('dlr-thrower', 'max_retries', 3)
+        self.prefetch_count = self._getint('dlr-thrower', 'prefetch_count', None)
+
+        # Bounds of the throwing retrials tracker
+        self.retrials_ttl = self._getint('dlr-thrower', 'retrials_ttl', 86400)
+        self.retrials_max_size = self._getint('dlr-thrower', 'retrials_max_size', 100000)
 
         # #139: need configuration to send deliver_sm instead of data_sm for SMPP delivery receipt
         # 20150521: it seems better to get deliver_sm the default pdu for receipts
@@ -22,6 +22,12 @@ class jasminApiGeneric:
     pass
 
 
+# Default MtMessagingCredential value filters, compiled once and shared by all credentials
+MATCH_ALL_FILTER = re.compile(b'.*')
+PRIORITY_FILTER = re.compile(b'^[0-3]$')
+VALIDITY_PERIOD_FILTER = re.compile(rb'^\d+$')
+
+
 class CredentialGeneric(jasminApiGeneric):
     """A generic credential object"""
     authorizations = {}
@@ -29,6 +35,14 @@ class CredentialGeneric(jasminApiGeneric):
     defaults = {}
     quotas = {}
     quotas_updated = False
+    # Value filter patterns always matching an already validated value, c.f. getBinaryValueFilter()
+    match_all_value_filters = {}
+
+    def __getstate__(self):
+        """Compiled binary value filters are never persisted"""
+        state = self.__dict__.copy()
+        state.pop('_binary_value_filters', None)
+        return state
 
     def setAuthorization(self, key, value):
         if key not in self.authorizations:
@@ -53,12 +67,36 @@ class CredentialGeneric(jasminApiGeneric):
         except TypeError:
             raise jasminApiCredentialError('%s is not a regex pattern: %s' % (key, value))
 
+        if '_binary_value_filters' in self.__dict__:
+            self._binary_value_filters.pop(key, None)
+
     def getValueFilter(self, key):
         if key not in self.value_filters:
             raise jasminApiCredentialError('%s is not a valid Filter' % key)
 
         return self.value_filters[key]
 
+    def getBinaryValueFilter(self, key):
+        """Return the value filter compiled with a binary pattern, None if it matches everything
+
+        The binary form is compiled once and kept until the filter is set again, it is rebuilt
+        on first use after the credential is loaded.
+        """
+        if '_binary_value_filters' not in self.__dict__:
+            self._binary_value_filters = {}
+
+        if key not in self._binary_value_filters:
+            r = self.getValueFilter(key)
+            if isinstance(r.pattern, str):
+                r = re.compile(r.pattern.encode())
+
+            if r.pattern == b'.*' or r.pattern == self.match_all_value_filters.get(key):
+                r = None
+
+            self._binary_value_filters[key] = r
+
+        return self._binary_value_filters[key]
+
     def setDefaultValue(self, key, value):
         if key not in self.defaults:
             raise jasminApiCredentialError('%s is not a valid Default value' % key)
@@ -102,6 +140,8 @@ class CredentialGeneric(jasminApiGeneric):
 
 class MtMessagingCredential(CredentialGeneric):
     """Credential set for sending MT Messages through"""
+    # Priority values are validated by the APIs before filtering
+    match_all_value_filters = {'priority': PRIORITY_FILTER.pattern}
 
     def __init__(self, default_authorizations=True):
         if not isinstance(default_authorizations, bool):
@@ -124,11 +164,11 @@ class MtMessagingCredential(CredentialGeneric):
         }
 
         self.value_filters = {
-            'destination_address': re.compile(b'.*'),
-            'source_address': re.compile(b'.*'),
-            'priority': re.compile(b'^[0-3]$'),
-            'validity_period': re.compile(rb'^\d+$'),
-            'content': re.compile(b'.*'),
+            'destination_address': MATCH_ALL_FILTER,
+            'source_address': MATCH_ALL_FILTER,
+            'priority': PRIORITY_FILTER,
+            'validity_period': VALIDITY_PERIOD_FILTER,
+            'content': MATCH_ALL_FILTER,
         }
 
         self.defaults = {'source_address': None, }
@@ -283,6 +323,9 @@ class CnxStatus(jasminApiGeneric):
             'qos_last_submit_sm_at': 0,
         }
 
+        # Throughput token buckets (per api), c.f. jasmin.tools.qos.reserve_user_throughput()
+        self.qos_buckets = {}
+
 
 class UserStats(metaclass=Singleton):
     """User statistics singleton holder"""
@@ -46,9 +46,17 @@ class RouterPB(pb.Avatar):
 
         # Init routing-related objects
         self.mo_routing_table = MORoutingTable()
+        self.mo_routing_table.enableCache(self.config.route_cache_size)
         self.mt_routing_table = MTRoutingTable()
+        self.mt_routing_table.enableCache(self.config.route_cache_size)
         self.users = []
         self.groups = []
+        # Indexes on users and groups, kept in sync by every users/groups mutation
+        self.users_by_username = {}
+        self.users_by_uid = {}
+        self.groups_by_gid = {}
+        # Bumped on every users/groups update, used to invalidate authenticated credential caches
+        self.credentials_revision = 0
 
         # Init interception-related objects
         self.mo_interception_table = MOInterceptionTable()
@@ -89,7 +97,8 @@ class RouterPB(pb.Avatar):
         queueName = 'RouterPB_deliver_sm_all'  # A local queue to RouterPB
         yield self.amqpBroker.named_queue_declare(queue=queueName)
         yield self.amqpBroker.chan.queue_bind(queue=queueName, exchange="messaging", routing_key=routingKey)
-        yield self.amqpBroker.chan.basic_consume(queue=queueName, no_ack=False, consumer_tag=consumerTag)
+        chan = yield self.amqpBroker.getConsumerChannel(consumerTag)
+        yield chan.basic_consume(queue=queueName, no_ack=False, consumer_tag=consumerTag)
         self.deliver_sm_q = yield self.amqpBroker.client.queue(consumerTag)
         self.deliver_sm_q.get().addCallback(self.deliver_sm_callback).addErrback(self.deliver_sm_errback)
         self.log.info('RouterPB is consuming from routing key: %s', routingKey)
@@ -101,7 +110,8 @@ class RouterPB(pb.Avatar):
         queueName = 'RouterPB_bill_request_submit_sm_resp_all'  # A local queue to RouterPB
         yield self.amqpBroker.named_queue_declare(queue=queueName)
         yield self.amqpBroker.chan.queue_bind(queue=queueName, exchange="billing", routing_key=routingKey)
-        yield self.amqpBroker.chan.basic_consume(queue=queueName, no_ack=False, consumer_tag=consumerTag)
+        chan = yield self.amqpBroker.getConsumerChannel(consumerTag)
+        yield chan.basic_consume(queue=queueName, no_ack=False, consumer_tag=consumerTag)
         self.bill_request_submit_sm_resp_q = yield self.amqpBroker.client.queue(consumerTag)
         self.bill_request_submit_sm_resp_q.get().addCallback(
             self.bill_request_submit_sm_resp_callback).addErrback(
@@ -110,11 +120,12 @@ class RouterPB(pb.Avatar):
 
     @defer.inlineCallbacks
     def rejectMessage(self, message):
-        yield self.amqpBroker.chan.basic_reject(delivery_tag=message.delivery_tag, requeue=0)
+        yield self.amqpBroker.lookupConsumerChannel(message.consumer_tag).basic_reject(
+            delivery_tag=message.delivery_tag, requeue=0)
 
     @defer.inlineCallbacks
     def ackMessage(self, message):
-        yield self.amqpBroker.chan.basic_ack(message.delivery_tag)
+        yield self.amqpBroker.lookupConsumerChannel(message.consumer_tag).basic_ack(message.delivery_tag)
 
     def activatePersistenceTimer(self):
         if self.persistenceTimer and self.persistenceTimer.active():
@@ -286,35 +297,51 @@ class RouterPB(pb.Avatar):
     def getMTRoutingTable(self):
         return self.mt_routing_table
 
+    def indexUsers(self):
+        """Rebuild users indexes, must be called whenever self.users is replaced"""
+        self.users_by_username = {}
+        self.users_by_uid = {}
+        for _user in self.users:
+            self.users_by_username[_user.username] = _user
+            self.users_by_uid[str(_user.uid)] = _user
+        self.credentials_revision += 1
+
+    def indexGroups(self):
+        """Rebuild groups index, must be called whenever self.groups is replaced"""
+        self.groups_by_gid = {}
+        for _group in self.groups:
+            self.groups_by_gid[str(_group.gid)] = _group
+        self.credentials_revision += 1
+
     def authenticateUser(self, username, password, return_pickled=False):
         """Authenticate a user agains username and password and return user object or None
         """
         # Find user having correct username/password
-        for _user in self.users:
-            if _user.username == username and _user.password == md5(password.encode('ascii')).digest():
-                self.log.debug('authenticateUser [username:%s] returned a User', username)
-
-                # Check if user's group is enabled
-                _group = self.getGroup(_user.group.gid)
-                if _group is not None and not _group.enabled:
-                    self.log.info('authenticateUser [username:%s] returned None (group %s is disabled)',
-                                  username, _user.group)
-                    return None
-
-                # Check if user is enabled
-                if not _user.enabled:
-                    self.log.info('authenticateUser [username:%s] returned None (user is disabled)',
-                                  username)
-                    return None
-
-                # If user/group are enabled:
-                if return_pickled:
-                    return pickle.dumps(_user, self.pickleProtocol)
-                else:
-                    return _user
-
-        self.log.info('authenticateUser [username:%s] returned None', username)
-        return None
+        _user = self.users_by_username.get(username)
+        if _user is None or _user.password != md5(password.encode('ascii')).digest():
+            self.log.info('authenticateUser [username:%s] returned None', username)
+            return None
+
+        self.log.debug('authenticateUser [username:%s] returned a User', username)
+
+        # Check if user's group is enabled
+        _group = self.getGroup(_user.group.gid)
+        if _group is not None and not _group.enabled:
+            self.log.info('authenticateUser [username:%s] returned None (group %s is disabled)',
+                          username, _user.group)
+            return None
+
+        # Check if user is enabled
+        if not _user.enabled:
+            self.log.info('authenticateUser [username:%s] returned None (user is disabled)',
+                          username)
+            return None
+
+        # If user/group are enabled:
+        if return_pickled:
+            return pickle.dumps(_user, self.pickleProtocol)
+        else:
+            return _user
 
     def chargeUserForSubmitSms(self, user, bill, submit_sm_count=1, requirements=None):
         """Will charge the user using the bill object after checking requirements
@@ -363,19 +390,19 @@ class RouterPB(pb.Avatar):
         return True
 
     def getUser(self, uid):
-        for _user in self.users:
-            if str(_user.uid) == str(uid):
-                self.log.debug('getUser [uid:%s] returned a User', uid)
-                return _user
+        _user = self.users_by_uid.get(str(uid))
+        if _user is not None:
+            self.log.debug('getUser [uid:%s] returned a User', uid)
+            return _user
 
         self.log.debug('getUser [uid:%s] returned None', uid)
         return None
 
     def getGroup(self, gid):
-        for _group in self.groups:
-            if str(_group.gid) == str(gid):
-                self.log.debug('getGroup [gid:%s] returned a Group', gid)
-                return _group
+        _group = self.groups_by_gid.get(str(gid))
+        if _group is not None:
+            self.log.debug('getGroup [gid:%s] returned a Group', gid)
+            return _group
 
         self.log.debug('getGroup [gid:%s] returned None', gid)
         return None
@@ -559,6 +586,7 @@ class RouterPB(pb.Avatar):
 
                 # Adding new groups
                 self.groups = cf.getMigratedData()
+                self.indexGroups()
                 self.log.info('Added new Groups (%d)', len(self.groups))
 
                 # Set persistance state to True
@@ -584,6 +612,7 @@ class RouterPB(pb.Avatar):
 
                 # Adding new users
                 self.users = cf.getMigratedData()
+                self.indexUsers()
                 self.log.info('Added new Users (%d)', len(self.users))
 
                 # Set persistance state to True
@@ -654,6 +683,7 @@ class RouterPB(pb.Avatar):
 
                 # Adding new MO Routes
                 self.mo_routing_table = cf.getMigratedData()
+                self.mo_routing_table.enableCache(self.config.route_cache_size)
                 self.log.info('Added new MORoutingTable with %d routes',
                               len(self.mo_routing_table.getAll()))
 
@@ -677,6 +707,7 @@ class RouterPB(pb.Avatar):
 
                 # Adding new MT Routes
                 self.mt_routing_table = cf.getMigratedData()
+                self.mt_routing_table.enableCache(self.config.route_cache_size)
                 self.log.info('Added new MTRoutingTable with %d routes',
                               len(self.mt_routing_table.getAll()))
 
@@ -705,25 +736,31 @@ class RouterPB(pb.Avatar):
         self.log.info('Adding a User (id:%s)', user.uid)
 
         # Check if group exists
-        foundGroup = False
-        for _group in self.groups:
-            if _group.gid == user.group.gid:
-                foundGroup = True
-        if not foundGroup:
+        if self.getGroup(user.group.gid) is None:
             self.log.error("Group with id:%s not found, cancelling user adding.", user.group.gid)
             return False
 
-        # Replace existant users
-        for _user in self.users:
-            if user.uid == _user.uid or user.username == _user.username:
-                self.log.warning('User (id:%s) already existant, will be replaced !', user.uid)
-                self.users.remove(_user)
-
-                # Save old CnxStatus in new user
-                user.setCnxStatus(_user.getCnxStatus())
-                break
+        # Replace existant users, the uid and the username may be matching two different users
+        _replaced = []
+        for _user in [self.users_by_uid.get(str(user.uid)), self.users_by_username.get(user.username)]:
+            if _user is not None and _user not in _replaced:
+                _replaced.append(_user)
+        for _user in _replaced:
+            self.log.warning('User (id:%s, username:%s) already existant, will be replaced !',
+                             _user.uid, _user.username)
+            self.users.remove(_user)
+            del self.users_by_uid[str(_user.uid)]
+            if self.users_by_username.get(_user.username) is _user:
+                del self.users_by_username[_user.username]
+
+        # Save old CnxStatus in new user, the one of the user having the same uid is kept
+        if len(_replaced) > 0:
+            user.setCnxStatus(_replaced[0].getCnxStatus())
 
         self.users.append(user)
+        self.users_by_uid[str(user.uid)] = user
+        self.users_by_username[user.username] = user
+        self.credentials_revision += 1
 
         # Set persistance state to False (pending for persistance)
         self.persistenceState['users'] = False
@@ -740,13 +777,14 @@ class RouterPB(pb.Avatar):
         self.log.info('Enabling a User (id:%s)', uid)
 
         # Enable user
-        for _user in self.users:
-            if uid == _user.uid:
-                _user.enable()
+        _user = self.getUser(uid)
+        if _user is not None:
+            _user.enable()
+            self.credentials_revision += 1
 
-                # Set persistance state to False (pending for persistance)
-                self.persistenceState['users'] = False
-                return True
+            # Set persistance state to False (pending for persistance)
+            self.persistenceState['users'] = False
+            return True
 
         self.log.error("User with id:%s not found, not enabling it.", uid)
         return False
@@ -755,13 +793,14 @@ class RouterPB(pb.Avatar):
         self.log.info('Disabling a User (id:%s)', uid)
 
         # Disable user
-        for _user in self.users:
-            if uid == _user.uid:
-                _user.disable()
+        _user = self.getUser(uid)
+        if _user is not None:
+            _user.disable()
+            self.credentials_revision += 1
 
-                # Set persistance state to False (pending for persistance)
-                self.persistenceState['users'] = False
-                return True
+            # Set persistance state to False (pending for persistance)
+            self.persistenceState['users'] = False
+            return True
 
         self.log.error("User with id:%s not found, not disabling it.", uid)
         return False
@@ -770,13 +809,14 @@ class RouterPB(pb.Avatar):
         self.log.info('Removing a User (id:%s)', uid)
 
         # Remove user
-        for _user in self.users:
-            if uid == _user.uid:
-                self.users.remove(_user)
+        _user = self.getUser(uid)
+        if _user is not None:
+            self.users.remove(_user)
+            self.indexUsers()
 
-                # Set persistance state to False (pending for persistance)
-                self.persistenceState['users'] = False
-                return True
+            # Set persistance state to False (pending for persistance)
+            self.persistenceState['users'] = False
+            return True
 
         self.log.error("User with id:%s not found, not removing it.", uid)
         return False
@@ -785,6 +825,7 @@ class RouterPB(pb.Avatar):
         self.log.info('Removing all users')
 
         self.users = []
+        self.indexUsers()
 
         # Set persistance state to False (pending for persistance)
         self.persistenceState['users'] = False
@@ -809,28 +850,28 @@ class RouterPB(pb.Avatar):
         self.log.info('Setting a User (id:%s) quota: %s/%s %s', uid, cred, quota, value)
 
         # Find user
-        for _user in self.users:
-            if uid == _user.uid:
-                try:
-                    if not hasattr(_user, cred):
-                        raise Exception("Invalid cred: %s", cred)
-                    else:
-                        _cred = getattr(_user, cred)
-
-                    if quota not in _cred.quotas:
-                        raise Exception("Unknown quota: %s", quota)
-
-                    # Update the quota
-                    _cred.setQuota(quota, value)
-
-                except Exception as e:
-                    self.log.error("Error updating user (id:%s): %s", uid, e)
-                    return False
+        _user = self.getUser(uid)
+        if _user is not None:
+            try:
+                if not hasattr(_user, cred):
+                    raise Exception("Invalid cred: %s", cred)
                 else:
-                    # Successful update !
-                    # Set persistance state to False (pending for persistance)
-                    self.persistenceState['users'] = False
-                    return True
+                    _cred = getattr(_user, cred)
+
+                if quota not in _cred.quotas:
+                    raise Exception("Unknown quota: %s", quota)
+
+                # Update the quota
+                _cred.setQuota(quota, value)
+
+            except Exception as e:
+                self.log.error("Error updating user (id:%s): %s", uid, e)
+                return False
+            else:
+                # Successful update !
+                # Set persistance state to False (pending for persistance)
+                self.persistenceState['users'] = False
+                return True
 
         self.log.error("User with id:%s not found, not updating it.", uid)
 
@@ -840,28 +881,28 @@ class RouterPB(pb.Avatar):
         self.log.info('Updating a User (id:%s) quota: %s/%s %s', uid, cred, quota, value)
 
         # Find user
-        for _user in self.users:
-            if uid == _user.uid:
-                try:
-                    if not hasattr(_user, cred):
-                        raise Exception("Invalid cred: %s", cred)
-                    else:
-                        _cred = getattr(_user, cred)
-
-                    if quota not in _cred.quotas:
-                        raise Exception("Unknown quota: %s", quota)
-
-                    # Update the quota
-                    _cred.updateQuota(quota, value)
-
-                except Exception as e:
-                    self.log.error("Error updating user (id:%s): %s", uid, e)
-                    return False
+        _user = self.getUser(uid)
+        if _user is not None:
+            try:
+                if not hasattr(_user, cred):
+                    raise Exception("Invalid cred: %s", cred)
                 else:
-                    # Successful update !
-                    # Set persistance state to False (pending for persistance)
-                    self.persistenceState['users'] = False
-                    return True
+                    _cred = getattr(_user, cred)
+
+                if quota not in _cred.quotas:
+                    raise Exception("Unknown quota: %s", quota)
+
+                # Update the quota
+                _cred.updateQuota(quota, value)
+
+            except Exception as e:
+                self.log.error("Error updating user (id:%s): %s", uid, e)
+                return False
+            else:
+                # Successful update !
+                # Set persistance state to False (pending for persistance)
+                self.persistenceState['users'] = False
+                return True
 
         self.log.error("User with id:%s not found, not updating it.", uid)
 
@@ -872,12 +913,13 @@ class RouterPB(pb.Avatar):
         self.log.info('Adding a Group (id:%s)', group.gid)
 
         # Replace existant groups
-        for _group in self.groups:
-            if group.gid == _group.gid:
-                self.groups.remove(_group)
-                break
+        _group = self.getGroup(group.gid)
+        if _group is not None:
+            self.groups.remove(_group)
 
         self.groups.append(group)
+        self.groups_by_gid[str(group.gid)] = group
+        self.credentials_revision += 1
 
         # Set persistance state to False (pending for persistance)
         self.persistenceState['groups'] = False
@@ -888,13 +930,14 @@ class RouterPB(pb.Avatar):
         self.log.info('Enabling a Group (id:%s)', gid)
 
         # Enable group
-        for _group in self.groups:
-            if gid == _group.gid:
-                _group.enable()
+        _group = self.getGroup(gid)
+        if _group is not None:
+            _group.enable()
+            self.credentials_revision += 1
 
-                # Set persistance state to False (pending for persistance)
-                self.persistenceState['groups'] = False
-                return True
+            # Set persistance state to False (pending for persistance)
+            self.persistenceState['groups'] = False
+            return True
 
         self.log.error("Group with id:%s not found, not enabling it.", gid)
         return False
@@ -903,13 +946,14 @@ class RouterPB(pb.Avatar):
         self.log.info('Disabling a Group (id:%s)', gid)
 
         # Disable group
-        for _group in self.groups:
-            if gid == _group.gid:
-                _group.disable()
+        _group = self.getGroup(gid)
+        if _group is not None:
+            _group.disable()
+            self.credentials_revision += 1
 
-                # Set persistance state to False (pending for persistance)
-                self.persistenceState['groups'] = False
-                return True
+            # Set persistance state to False (pending for persistance)
+            self.persistenceState['groups'] = False
+            return True
 
         self.log.error("Group with id:%s not found, not disabling it.", gid)
         return False
@@ -918,18 +962,20 @@ class RouterPB(pb.Avatar):
         self.log.info('Removing a Group (id:%s)', gid)
 
         # Remove group
-        for _group in self.groups:
-            if gid == _group.gid:
-                # Remove users from this group
-                _users = copy(self.users)
-                for _user in _users:
-                    if _user.group.gid == _group.gid:
-                        self.log.info('Removing a User (id:%s) from the Group (id:%s)', _user.uid, gid)
-                        self.users.remove(_user)
-
-                # Safely remove this group
-                self.groups.remove(_group)
-                return True
+        _group = self.getGroup(gid)
+        if _group is not None:
+            # Remove users from this group
+            _users = copy(self.users)
+            for _user in _users:
+                if _user.group.gid == _group.gid:
+                    self.log.info('Removing a User (id:%s) from the Group (id:%s)', _user.uid, gid)
+                    self.users.remove(_user)
+            self.indexUsers()
+
+            # Safely remove this group
+            self.groups.remove(_group)
+            self.indexGroups()
+            return True
 
         self.log.error("Group with id:%s not found, not removing it.", gid)
 
@@ -955,6 +1001,8 @@ class RouterPB(pb.Avatar):
                     self.users.remove(_user)
 
         self.groups = []
+        self.indexUsers()
+        self.indexGroups()
 
         # Set persistance state to False (pending for persistance)
         self.persistenceState['groups'] = False
@@ -1091,6 +1139,24 @@ class RouterPB(pb.Avatar):
 
         return True
 
+    def perspective_moroute_bulk_add(self, routes, replace=False):
+        routes = pickle.loads(routes)
+        self.log.info('Bulk adding MO Routes (%d routes, replace=%s)', len(routes), replace)
+
+        try:
+            self.mo_routing_table.bulkAdd(routes, replace)
+        except InvalidRoutingTableParameterError as e:
+            self.log.error('Cannot bulk add MO Routes: %s', str(e))
+            return False
+        except Exception as e:
+            self.log.error('Unknown error occurred while bulk adding MO Routes: %s', str(e))
+            return False
+
+        # Set persistance state to False (pending for persistance)
+        self.persistenceState['moroutes'] = False
+
+        return True
+
     def perspective_moroute_remove(self, order):
         self.log.info('Removing MO Route [%s]', order)
 
@@ -1099,6 +1165,24 @@ class RouterPB(pb.Avatar):
 
         return self.mo_routing_table.remove(order)
 
+    def perspective_mtroute_bulk_add(self, routes, replace=False):
+        routes = pickle.loads(routes)
+        self.log.info('Bulk adding MT Routes (%d routes, replace=%s)', len(routes), replace)
+
+        try:
+            self.mt_routing_table.bulkAdd(routes, replace)
+        except InvalidRoutingTableParameterError as e:
+            self.log.error('Cannot bulk add MT Routes: %s', str(e))
+            return False
+        except Exception as e:
+            self.log.error('Unknown error occurred while bulk adding MT Routes: %s', str(e))
+            return False
+
+        # Set persistance state to False (pending for persistance)
+        self.persistenceState['mtroutes'] = False
+
+        return True
+
     def perspective_mtroute_remove(self, order):
         self.log.info('Removing MT Route [%s]', order)
 
@@ -1123,6 +1207,11 @@ class RouterPB(pb.Avatar):
 
         return self.mo_routing_table.flush()
 
+    def perspective_route_cache_stats(self):
+        """Return route decision cache counters of MT and MO routing tables"""
+        return {'mt': self.mt_routing_table.getCacheStats(),
+                'mo': self.mo_routing_table.getCacheStats()}
+
     def perspective_mtroute_get_all(self):
         self.log.info('Getting MT Routing table')
 
@@ -0,0 +1,59 @@
+from jasmin.tools.singleton import Singleton
+from jasmin.tools.stats import Stats
+
+
+class DLRLookupStatistics(Stats):
+    """DLRLookup statistics holder"""
+
+    def __init__(self):
+        self.init()
+
+    def init(self):
+        self._stats = {
+            'lookup_retrials_size': 0,
+        }
+
+    def getStats(self):
+        return self._stats
+
+
+class ThrowerStatistics(Stats):
+    """One thrower statistics holder"""
+
+    def __init__(self, name):
+        self.name = name
+
+        self.init()
+
+    def init(self):
+        self._stats = {
+            'throwing_retrials_size': 0,
+        }
+
+    def getStats(self):
+        return self._stats
+
+
+class DLRLookupStatsCollector(metaclass=Singleton):
+    """DLRLookup statistics collection holder"""
+    lookups = {}
+
+    def get(self):
+        """Return the DLRLookup stats object or instanciate a new one"""
+        name = 'main'
+        if name not in self.lookups:
+            self.lookups[name] = DLRLookupStatistics()
+
+        return self.lookups[name]
+
+
+class ThrowerStatsCollector(metaclass=Singleton):
+    """Throwers statistics collection holder"""
+    throwers = {}
+
+    def get(self, name):
+        """Return a thrower's stats object or instanciate a new one"""
+        if name not in self.throwers:
+            self.throwers[name] = ThrowerStatistics(name)
+
+        return self.throwers[name]
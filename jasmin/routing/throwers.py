@@ -9,7 +9,7 @@ from logging.handlers import TimedRotatingFileHandler
 from twisted.application.service import Service
 from twisted.internet import defer
 from twisted.internet import reactor
-from twisted.web.client import Agent
+from twisted.web.client import Agent, HTTPConnectionPool
 from txamqp.queue import Closed
 from treq.client import HTTPClient
 from treq import text_content
@@ -20,6 +20,9 @@ from jasmin.protocols.smpp.factory import SMPPServerFactory
 from jasmin.protocols.smpp.operations import SMPPOperationFactory
 from jasmin.protocols.smpp.proxies import SMPPServerPBProxy
 from jasmin.protocols.http.errors import HttpApiError
+from jasmin.routing.stats import ThrowerStatsCollector
+from jasmin.tools.circuitbreaker import CircuitBreakers, CircuitOpenError, EndpointBusyError
+from jasmin.tools.ttlmap import TTLMap
 
 
 
@@ -58,10 +61,22 @@ class Thrower(Service):
     callback = None
     errback = None
     requeueTimers = {}
-    throwing_retrials = {}
 
     def __init__(self, config):
         self.config = config
+        self.throwing_retrials = TTLMap(self.config.retrials_ttl, self.config.retrials_max_size)
+        self.stats = ThrowerStatsCollector().get(self.name)
+
+        # HTTP client shared by all throws, connections are kept alive and reused when persistent
+        self.httpPool = HTTPConnectionPool(reactor, persistent=self.config.http_persistent)
+        self.httpPool.maxPersistentPerHost = self.config.http_pool_max_per_host
+        self.httpPool.cachedConnectionTimeout = self.config.http_pool_idle_timeout
+        self.httpClient = HTTPClient(Agent(reactor, pool=self.httpPool))
+
+        # Slow or failing callback urls must not hold the throws to the healthy ones
+        self.circuitBreakers = CircuitBreakers(self.config.http_circuit_failures,
+                                               self.config.http_circuit_reset_timeout,
+                                               self.config.http_max_in_flight)
 
         # Check if callbacks are defined in child class ?
         if self.callback is None:
@@ -113,11 +128,14 @@ class Thrower(Service):
         if message.content.properties['message-id'] in self.throwing_retrials:
             self.throwing_retrials[message.content.properties['message-id']] += 1
         else:
-            self.throwing_retrials[message.content.properties['message-id']] = 1
+            # Messages requeued through retry tiers are carrying their retrials count
+            self.throwing_retrials[message.content.properties['message-id']] = (
+                message.content.properties.get('headers') or {}).get('retrials', 0) + 1
 
     def throwing_callback(self, message):
         # Init retrial mechanism
         self.incThrowingRetrials(message)
+        self.stats.set('throwing_retrials_size', len(self.throwing_retrials))
 
         self.thrower_q.get().addCallback(self.callback).addErrback(self.errback)
 
@@ -146,6 +164,28 @@ class Thrower(Service):
                 timer.cancel()
             del self.requeueTimers[msgid]
 
+    @defer.inlineCallbacks
+    def httpRequest(self, method, url, **kwargs):
+        """Make a request to url through its circuit breaker, return (response, content)
+
+        Connection errors, timeouts and 5xx replies are counted as failures of url.
+        """
+        self.circuitBreakers.acquire(url)
+        try:
+            response = yield self.httpClient.request(method, url, timeout=self.config.timeout, **kwargs)
+            content = yield text_content(response)
+        except Exception:
+            success = False
+            raise
+        else:
+            success = response.code < 500
+        finally:
+            if self.circuitBreakers.release(url, success):
+                self.log.warning('Circuit opened for %s: no throws for %s seconds', url,
+                                 self.config.http_circuit_reset_timeout)
+
+        defer.returnValue((response, content))
+
     def clearAllTimers(self):
         self.clearRequeueTimers()
 
@@ -157,6 +197,8 @@ class Thrower(Service):
 
         self.clearAllTimers()
 
+        return self.httpPool.closeCachedConnections()
+
     @defer.inlineCallbacks
     def addAmqpBroker(self, amqpBroker):
         self.amqpBroker = amqpBroker
@@ -174,17 +216,34 @@ class Thrower(Service):
         yield self.amqpBroker.chan.queue_bind(queue=self.queueName,
                                               exchange=self.exchangeName,
                                               routing_key=self.routingKey)
-        yield self.amqpBroker.chan.basic_consume(queue=self.queueName,
-                                                 no_ack=False,
-                                                 consumer_tag=self.consumerTag)
+        chan = yield self.amqpBroker.getConsumerChannel(self.consumerTag, self.config.prefetch_count)
+        yield chan.basic_consume(queue=self.queueName,
+                                 no_ack=False,
+                                 consumer_tag=self.consumerTag)
         self.thrower_q = yield self.amqpBroker.client.queue(self.consumerTag)
         self.thrower_q.get().addCallback(self.callback).addErrback(self.errback)
         self.log.info('Consuming from routing key: %s', self.routingKey)
 
     @defer.inlineCallbacks
-    def rejectAndRequeueMessage(self, message, delay=True):
+    def rejectAndRequeueMessage(self, message, delay=True, retrial=True):
         msgid = message.content.properties['message-id']
 
+        if not retrial and msgid in self.throwing_retrials:
+            # This throw is not counted as a retrial
+            self.throwing_retrials[msgid] -= 1
+
+        if delay and self.amqpBroker.config.retry_tiers:
+            self.log.debug("Requeuing Content[%s] through the %ss retry tier",
+                           msgid, self.config.retry_delay)
+            try:
+                yield self.amqpBroker.publishRetry(message, self.config.retry_delay, retrial)
+            except Exception as e:
+                self.log.error("Cannot requeue Content[%s] through retry tier, using a timer: %s", msgid, e)
+            else:
+                # Retrials are now tracked in the message headers
+                yield self.ackMessage(message)
+                defer.returnValue(None)
+
         if delay:
             self.log.debug("Requeuing Content[%s] with delay: %s seconds",
                            msgid, self.config.retry_delay)
@@ -210,14 +269,15 @@ class Thrower(Service):
             # Remove retrial tracker
             self.delThrowingRetrials(message)
 
-        yield self.amqpBroker.chan.basic_reject(delivery_tag=message.delivery_tag, requeue=requeue)
+        yield self.amqpBroker.lookupConsumerChannel(message.consumer_tag).basic_reject(
+            delivery_tag=message.delivery_tag, requeue=requeue)
 
     @defer.inlineCallbacks
     def ackMessage(self, message):
         # Remove retrial tracker
         self.delThrowingRetrials(message)
 
-        yield self.amqpBroker.chan.basic_ack(message.delivery_tag)
+        yield self.amqpBroker.lookupConsumerChannel(message.consumer_tag).basic_ack(message.delivery_tag)
 
 
 class deliverSmThrower(Thrower):
@@ -349,22 +409,17 @@ class deliverSmThrower(Thrower):
                     postdata = args
 
                 self.log.debug('Calling %s with args %s using %s method.', dc.baseurl, args, _method)
-                agent = Agent(reactor)
-                client = HTTPClient(agent)
-                response = yield client.request(
+                response, content = yield self.httpRequest(
                     _method,
                     baseurl,
                     params=params,
                     data=postdata,
-                    timeout=self.config.timeout,
                     headers={'Content-Type': 'application/x-www-form-urlencoded',
                              'Accept': 'text/plain',
                              'User-Agent': 'Jasmin gateway/1.0 deliverSmHttpThrower'})
                 self.log.info('Throwed message [msgid:%s] to connector (%s %s/%s)[cid:%s] using http to %s.',
                               msgid, route_type, counter, len(dcs), dc.cid, dc.baseurl)
-                
-                content = yield text_content(response)
-                
+
                 if response.code >= 400:
                     raise HttpApiError(response.code, content)
 
@@ -384,7 +439,10 @@ class deliverSmThrower(Thrower):
 
                 if route_type == 'simple':
                     # Requeue message for later retry
-                    if (str(e) not in noRetryErrors
+                    if isinstance(e, (CircuitOpenError, EndpointBusyError)):
+                        # The url was not called, this is not a retrial
+                        yield self.rejectAndRequeueMessage(message, retrial=False)
+                    elif (str(e) not in noRetryErrors
                         and self.getThrowingRetrials(message) <= self.config.max_retries):
                         self.log.debug('Message try-count is %s [msgid:%s]: requeuing',
                                        self.getThrowingRetrials(message), msgid)
@@ -551,22 +609,17 @@ class DLRThrower(Thrower):
         self.callback = self.dlr_throwing_callback
         self.opFactory = SMPPOperationFactory()
 
+        # Buffered POST DLRs per url, waiting to be thrown in one batch
+        self.httpBatches = {}
+
         Thrower.__init__(self, config)
 
-    @defer.inlineCallbacks
-    def http_dlr_callback(self, message):
-        msgid = message.content.properties['message-id']
-        url = message.content.properties['headers']['url']
-        method = message.content.properties['headers']['method']
+    def getHttpDLRArgs(self, message):
         level = message.content.properties['headers']['level']
-        self.log.debug('Got one message (msgid:%s) to throw', msgid)
-
-        # If any, clear requeuing timer
-        self.clearRequeueTimer(msgid)
 
         # Build mandatory arguments
         args = {
-            'id': msgid,
+            'id': message.content.properties['message-id'],
             'level': level,
             'message_status': message.content.properties['headers']['message_status'],
             'connector': message.content.properties['headers']['connector']
@@ -582,6 +635,48 @@ class DLRThrower(Thrower):
             args['err'] = message.content.properties['headers']['err']
             args['text'] = message.content.properties['headers']['text']
 
+        return args
+
+    @defer.inlineCallbacks
+    def retryOrRejectHttpDLR(self, message, e):
+        msgid = message.content.properties['message-id']
+
+        # List of errors after which, no further retrying shall be made
+        noRetryErrors = ['404']
+
+        # Requeue message for later retry
+        if isinstance(e, (CircuitOpenError, EndpointBusyError)):
+            # The url was not called, this is not a retrial
+            yield self.rejectAndRequeueMessage(message, retrial=False)
+        elif (str(e) not in noRetryErrors
+            and self.getThrowingRetrials(message) <= self.config.max_retries):
+            self.log.debug('Message try-count is %s [msgid:%s]: requeuing',
+                           self.getThrowingRetrials(message), msgid)
+            yield self.rejectAndRequeueMessage(message)
+        elif str(e) in noRetryErrors:
+            self.log.warning('Message is no more processed after receiving "%s" error', str(e))
+            yield self.rejectMessage(message)
+        else:
+            self.log.warning('Message try-count is %s [msgid:%s]: purged from queue',
+                          self.getThrowingRetrials(message), msgid)
+            yield self.rejectMessage(message)
+
+    @defer.inlineCallbacks
+    def http_dlr_callback(self, message):
+        msgid = message.content.properties['message-id']
+        url = message.content.properties['headers']['url']
+        method = message.content.properties['headers']['method']
+        self.log.debug('Got one message (msgid:%s) to throw', msgid)
+
+        # If any, clear requeuing timer
+        self.clearRequeueTimer(msgid)
+
+        if self.config.http_batch_size > 1 and method == 'POST':
+            yield self.batchHttpDLR(url, message)
+            defer.returnValue(None)
+
+        args = self.getHttpDLRArgs(message)
+
         try:
             # Throw the message to http endpoint
             postdata = None
@@ -593,21 +688,16 @@ class DLRThrower(Thrower):
                 postdata = args
 
             self.log.debug('Calling %s with args %s using %s method.', baseurl, args, method)
-            agent = Agent(reactor)
-            client = HTTPClient(agent)
-            response = yield client.request(
+            response, content = yield self.httpRequest(
                 method,
                 baseurl,
                 params=params,
                 data=postdata,
-                timeout=self.config.timeout,
                 headers={'Content-Type': 'application/x-www-form-urlencoded',
                          'Accept': 'text/plain',
                          'User-Agent': 'Jasmin gateway/1.0 %s' % self.name})
             self.log.info('Throwed DLR [msgid:%s] to %s.', msgid, baseurl)
 
-            content = yield text_content(response)
-            
             if response.code >= 400:
                 raise HttpApiError(response.code, content)
 
@@ -622,22 +712,76 @@ class DLRThrower(Thrower):
         except Exception as e:
             self.log.error('Throwing HTTP/DLR [msgid:%s] to (%s): %r.', msgid, baseurl, e)
 
-            # List of errors after which, no further retrying shall be made
-            noRetryErrors = ['404']
+            yield self.retryOrRejectHttpDLR(message, e)
 
-            # Requeue message for later retry
-            if (str(e) not in noRetryErrors
-                and self.getThrowingRetrials(message) <= self.config.max_retries):
-                self.log.debug('Message try-count is %s [msgid:%s]: requeuing',
-                               self.getThrowingRetrials(message), msgid)
-                yield self.rejectAndRequeueMessage(message)
-            elif str(e) in noRetryErrors:
-                self.log.warning('Message is no more processed after receiving "%s" error', str(e))
-                yield self.rejectMessage(message)
-            else:
-                self.log.warning('Message try-count is %s [msgid:%s]: purged from queue',
-                              self.getThrowingRetrials(message), msgid)
-                yield self.rejectMessage(message)
+    @defer.inlineCallbacks
+    def batchHttpDLR(self, url, message):
+        """Buffer a POST DLR until http_batch_size DLRs are waiting for the same url or
+        http_batch_max_wait milliseconds have passed, whichever comes first"""
+        if url not in self.httpBatches:
+            timer = reactor.callLater(self.config.http_batch_max_wait / 1000.0, self.flushHttpDLRBatch, url)
+            self.httpBatches[url] = {'messages': [], 'timer': timer}
+        self.httpBatches[url]['messages'].append(message)
+
+        if len(self.httpBatches[url]['messages']) >= self.config.http_batch_size:
+            yield self.flushHttpDLRBatch(url)
+
+    @defer.inlineCallbacks
+    def flushHttpDLRBatch(self, url):
+        """POST the buffered DLRs of url as one JSON array, all of them are acked or retried
+        together"""
+        if url not in self.httpBatches:
+            defer.returnValue(None)
+
+        batch = self.httpBatches.pop(url)
+        if batch['timer'].active():
+            batch['timer'].cancel()
+        messages = batch['messages']
+        msgids = [message.content.properties['message-id'] for message in messages]
+
+        try:
+            args = [self.getHttpDLRArgs(message) for message in messages]
+
+            self.log.debug('Calling %s with %s DLRs using POST method.', url, len(args))
+            response, content = yield self.httpRequest(
+                'POST',
+                url,
+                data=json.dumps(args).encode(),
+                headers={'Content-Type': 'application/json',
+                         'Accept': 'text/plain',
+                         'User-Agent': 'Jasmin gateway/1.0 %s' % self.name})
+            self.log.info('Throwed %s DLRs [msgid:%s] to %s.', len(messages), ','.join(msgids), url)
+
+            if response.code >= 400:
+                raise HttpApiError(response.code, content)
+
+            self.log.debug('Destination end replied to %s DLRs: %r', len(messages), content)
+            # Check for acknowledgement
+            if content.strip() != 'ACK/Jasmin':
+                raise MessageAcknowledgementError(
+                    'Destination end did not acknowledge receipt of the DLR messages.')
+        except Exception as e:
+            self.log.error('Throwing %s HTTP/DLRs [msgid:%s] to (%s): %r.',
+                           len(messages), ','.join(msgids), url, e)
+
+            for message in messages:
+                yield self.retryOrRejectHttpDLR(message, e)
+        else:
+            # Everything is okay ? then:
+            for message in messages:
+                yield self.ackMessage(message)
+
+    def clearHttpDLRBatches(self):
+        """Drop the buffered DLRs, being unacked they are redelivered by the broker"""
+        for url, batch in list(self.httpBatches.items()):
+            if batch['timer'].active():
+                batch['timer'].cancel()
+            del self.httpBatches[url]
+
+    def clearAllTimers(self):
+        Thrower.clearAllTimers(self)
+
+        self.clearHttpDLRBatches()
 
     @defer.inlineCallbacks
     def smpp_dlr_callback(self, message):
@@ -0,0 +1,89 @@
+import time
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+
+class CircuitOpenError(Exception):
+    """Raised when an endpoint's circuit is open"""
+
+
+class EndpointBusyError(Exception):
+    """Raised when an endpoint has reached its maximum number of in-flight requests"""
+
+
+class CircuitBreakers:
+    """Per endpoint circuit breakers and in-flight request caps
+
+    A circuit opens after failure_threshold consecutive failures (0 never opens it) and refuses
+    requests for reset_timeout seconds, it is then half-open: one trial request is let through,
+    closing the circuit if it succeeds or opening it again if it fails.
+    Up to max_in_flight requests (0 for no limit) are let through at once to an endpoint.
+    """
+
+    def __init__(self, failure_threshold=0, reset_timeout=30, max_in_flight=0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_in_flight = max_in_flight
+
+        # Endpoint -> state, only endpoints with failures or in-flight requests are kept
+        self.endpoints = {}
+
+        self.stats = {
+            'opened_count': 0,
+            'open_rejected_count': 0,
+            'busy_rejected_count': 0,
+        }
+
+    def getState(self, endpoint):
+        if endpoint not in self.endpoints:
+            return CLOSED
+
+        e = self.endpoints[endpoint]
+        if e['state'] == OPEN and time.monotonic() - e['opened_at'] >= self.reset_timeout:
+            e['state'] = HALF_OPEN
+        return e['state']
+
+    def acquire(self, endpoint):
+        """Take an in-flight slot for a request to endpoint, raise CircuitOpenError or
+        EndpointBusyError if the request must not be made"""
+        state = self.getState(endpoint)
+        e = self.endpoints.setdefault(
+            endpoint, {'state': CLOSED, 'failures': 0, 'opened_at': None, 'in_flight': 0})
+
+        if state == OPEN or (state == HALF_OPEN and e['in_flight'] > 0):
+            self.stats['open_rejected_count'] += 1
+            raise CircuitOpenError('Circuit is %s for %s' % (state, endpoint))
+        if 0 < self.max_in_flight <= e['in_flight']:
+            self.stats['busy_rejected_count'] += 1
+            raise EndpointBusyError('%s requests are already in-flight to %s' % (e['in_flight'], endpoint))
+
+        e['in_flight'] += 1
+
+    def release(self, endpoint, success):
+        """Release the in-flight slot of a request to endpoint, return True if its failure
+        opened the circuit"""
+        e = self.endpoints[endpoint]
+        e['in_flight'] -= 1
+        opened = False
+
+        if success:
+            e['state'] = CLOSED
+            e['failures'] = 0
+        else:
+            e['failures'] += 1
+            if e['state'] == HALF_OPEN or (
+                    e['state'] == CLOSED and 0 < self.failure_threshold <= e['failures']):
+                e['state'] = OPEN
+                e['opened_at'] = time.monotonic()
+                self.stats['opened_count'] += 1
+                opened = True
+
+        if e['state'] == CLOSED and e['failures'] == 0 and e['in_flight'] == 0:
+            del self.endpoints[endpoint]
+
+        return opened
+
+    def getStats(self):
+        return dict(self.stats, open=len([e for e in self.endpoints if self.getState(e) != CLOSED]))
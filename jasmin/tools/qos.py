@@ -1,5 +1,9 @@
+import time
+
 from twisted.internet import defer, reactor
 
+from jasmin.tools.singleton import Singleton
+
 
 @defer.inlineCallbacks
 def slow_down(seconds):
@@ -7,3 +11,166 @@ def slow_down(seconds):
     waitDeferred = defer.Deferred()
     reactor.callLater(seconds, waitDeferred.callback, None)
     yield waitDeferred
+
+
+class TokenBucket:
+    """A token bucket refilled with rate tokens per second, holding up to burst tokens
+
+    Time is measured with a monotonic clock, the bucket is full when created.
+    """
+
+    def __init__(self, rate, burst=1):
+        self.rate = float(rate)
+        self.burst = max(burst, 1)
+        self.tokens = float(self.burst)
+        self.updated_at = time.monotonic()
+
+    def setRate(self, rate, burst=1):
+        """Update rate and burst, tokens already in the bucket are kept"""
+        if rate == self.rate and burst == self.burst:
+            return
+
+        self._refill()
+        self.rate = float(rate)
+        self.burst = max(burst, 1)
+        self.tokens = min(self.tokens, float(self.burst))
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(float(self.burst), self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def reserve(self, tokens=1, max_delay=0):
+        """Take tokens from the bucket and return the delay (seconds) to wait before using them
+
+        Tokens are reserved in advance when the bucket is empty, consecutive calls will then get
+        increasing delays; None is returned (and nothing is taken) when the delay would exceed
+        max_delay.
+        """
+        self._refill()
+
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return 0
+
+        if self.rate <= 0:
+            return None
+
+        delay = (tokens - self.tokens) / self.rate
+        if delay > max_delay:
+            return None
+
+        self.tokens -= tokens
+        return delay
+
+    def consume(self, tokens=1):
+        """Take tokens from the bucket, return False if there is not enough of them"""
+        return self.reserve(tokens) == 0
+
+
+class Pacer(TokenBucket):
+    """Space out events to rate per second (fractional rates are allowed), bursts of up to burst
+    events are sent without delay after an idle period; a rate of 0 disables pacing
+    """
+
+    def getDelay(self):
+        """Reserve a slot for the next event and return the delay (seconds) to wait before it"""
+        if self.rate <= 0:
+            return 0
+
+        return self.reserve(max_delay=float('inf'))
+
+
+class PacerCollector(metaclass=Singleton):
+    """Pacers holder, pacing budget is shared by all the users of a pacer key (e.g. all the
+    listeners serving the same connector)"""
+    pacers = {}
+
+    def get(self, key, rate, burst=1):
+        """Return the key's pacer updated to rate and burst or instanciate a new one"""
+        if key not in self.pacers:
+            self.pacers[key] = Pacer(rate, burst)
+        else:
+            self.pacers[key].setRate(rate, burst)
+
+        return self.pacers[key]
+
+
+class AIMDRate:
+    """Additive increase / multiplicative decrease of a rate kept between min_rate and max_rate
+
+    The rate starts at max_rate, it is multiplied by decrease_factor on throttled() calls and
+    raised by increase_step after increase_after consecutive succeeded() calls.
+    A burst of throttled submits (window_size > 1 or many sessions) is one congestion event and
+    cuts the rate once: throttles of submits sent before the last decrease are ignored, or
+    throttles coming within one pacing interval after it when the submit time is unknown.
+    """
+    decrease_factor = 0.5
+    increase_step = 1.0
+    increase_after = 10
+
+    def __init__(self, min_rate, max_rate):
+        self.min_rate = float(min(min_rate, max_rate))
+        self.max_rate = float(max_rate)
+        self.rate = self.max_rate
+        self.success_run = 0
+        self.decreased_at = None
+
+    def setLimits(self, min_rate, max_rate):
+        """Update the limits, the current rate is clamped into the new ones"""
+        self.min_rate = float(min(min_rate, max_rate))
+        self.max_rate = float(max_rate)
+        self.rate = min(max(self.rate, self.min_rate), self.max_rate)
+
+    def throttled(self, sent_at=None):
+        """Decrease the rate, sent_at is the time (monotonic clock) the throttled submit was sent at"""
+        self.success_run = 0
+
+        now = time.monotonic()
+        if self.decreased_at is not None:
+            if sent_at is not None and sent_at <= self.decreased_at:
+                return self.rate
+            if sent_at is None and now - self.decreased_at < 1.0 / self.rate:
+                return self.rate
+
+        self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+        self.decreased_at = now
+        return self.rate
+
+    def succeeded(self):
+        self.success_run += 1
+        if self.success_run >= self.increase_after:
+            self.success_run = 0
+            self.rate = min(self.max_rate, self.rate + self.increase_step)
+        return self.rate
+
+
+class AIMDRateCollector(metaclass=Singleton):
+    """AIMD rates holder, a rate is shared by all the users of its key (e.g. all the listeners
+    serving the same connector)"""
+    rates = {}
+
+    def get(self, key, min_rate, max_rate):
+        """Return the key's rate updated to min_rate and max_rate or instanciate a new one"""
+        if key not in self.rates:
+            self.rates[key] = AIMDRate(min_rate, max_rate)
+        else:
+            self.rates[key].setLimits(min_rate, max_rate)
+
+        return self.rates[key]
+
+
+def reserve_user_throughput(user, api, throughput, burst=1, max_delay=0):
+    """Reserve one message from user's throughput token bucket for api ('httpapi' or 'smpps')
+
+    Buckets are kept in the user CnxStatus and follow quota updates, returns the delay to wait
+    before sending or None if throughput is exceeded, c.f. TokenBucket.reserve().
+    """
+    buckets = user.getCnxStatus().qos_buckets
+    bucket = buckets.get(api)
+    if bucket is None:
+        bucket = buckets[api] = TokenBucket(throughput, burst)
+    else:
+        bucket.setRate(throughput, burst)
+
+    return bucket.reserve(max_delay=max_delay)
@@ -1,3 +1,6 @@
+import time
+
+
 class KeyNotFound(Exception):
     """
     Raised when setting or getting an unknown statistics key
@@ -40,3 +43,45 @@ class Stats:
             raise KeyNotIncrementable(key)
 
         self._stats[key] -= inc
+
+
+class DecayingMean:
+    """Exponentially time-decayed mean of numeric samples
+
+    A sample's weight is halved every half_life seconds, the mean is blended with prior (weighing
+    prior_weight samples), so it starts from prior and goes back to it when samples get stale.
+    """
+
+    def __init__(self, half_life, prior=None, prior_weight=1.0):
+        self.half_life = half_life
+        self.prior = prior
+        self.prior_weight = prior_weight
+        self.weight = 0.0
+        self.total = 0.0
+        self.updated_at = time.monotonic()
+
+    def decay(self):
+        now = time.monotonic()
+        factor = 0.5 ** ((now - self.updated_at) / self.half_life)
+        self.weight *= factor
+        self.total *= factor
+        self.updated_at = now
+
+    def samples(self):
+        """Return the decayed number of samples"""
+        self.decay()
+        return self.weight
+
+    def add(self, value):
+        self.decay()
+        self.weight += 1
+        self.total += value
+
+    def mean(self):
+        """Return the decayed mean blended with prior, or the plain decayed mean (None if there's
+        no sample) when there's no prior"""
+        self.decay()
+        if self.prior is None:
+            return self.total / self.weight if self.weight > 0 else None
+
+        return (self.total + self.prior * self.prior_weight) / (self.weight + self.prior_weight)
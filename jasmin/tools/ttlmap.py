@@ -0,0 +1,107 @@
+import time
+from collections import deque
+from collections.abc import MutableMapping
+
+
+class TTLMap(MutableMapping):
+    """A mapping forgetting its keys ttl seconds after they were last set and holding up to
+    max_size keys
+
+    Keys are stored in time slots covering ttl/slots seconds each: expiry drops whole slots (a key
+    lives between ttl and ttl + ttl/slots seconds) and the oldest keys are evicted first when
+    max_size is reached, no per-key timer or timestamp is kept.
+    """
+
+    def __init__(self, ttl=86400, max_size=100000, slots=12):
+        self.ttl = ttl
+        self.max_size = max(max_size, 1)
+        self.slot_duration = float(ttl) / max(slots, 1)
+
+        # (slot start time, {key: value}), oldest slot first
+        self.slots = deque()
+        self.size = 0
+
+        self.stats = {
+            'expired_count': 0,
+            'evicted_count': 0,
+        }
+
+    def _expire(self):
+        now = time.monotonic()
+
+        while len(self.slots) > 0 and now - self.slots[0][0] >= self.ttl + self.slot_duration:
+            _, slot = self.slots.popleft()
+            self.size -= len(slot)
+            self.stats['expired_count'] += len(slot)
+
+        return now
+
+    def _current_slot(self):
+        now = self._expire()
+
+        if len(self.slots) == 0 or now - self.slots[-1][0] >= self.slot_duration:
+            self.slots.append((now, {}))
+
+        return self.slots[-1][1]
+
+    def _find(self, key):
+        """Return the slot holding key or None, recently set keys are found first"""
+        for _, slot in reversed(self.slots):
+            if key in slot:
+                return slot
+
+        return None
+
+    def __getitem__(self, key):
+        self._expire()
+
+        slot = self._find(key)
+        if slot is None:
+            raise KeyError(key)
+
+        return slot[key]
+
+    def __setitem__(self, key, value):
+        current = self._current_slot()
+
+        slot = self._find(key)
+        if slot is None:
+            self.size += 1
+        elif slot is not current:
+            # Setting a key renews its ttl
+            del slot[key]
+        current[key] = value
+
+        while self.size > self.max_size:
+            oldest = self.slots[0][1]
+            if len(oldest) == 0:
+                self.slots.popleft()
+                continue
+
+            del oldest[next(iter(oldest))]
+            self.size -= 1
+            self.stats['evicted_count'] += 1
+
+    def __delitem__(self, key):
+        self._expire()
+
+        slot = self._find(key)
+        if slot is None:
+            raise KeyError(key)
+
+        del slot[key]
+        self.size -= 1
+
+    def __iter__(self):
+        self._expire()
+
+        for _, slot in list(self.slots):
+            yield from list(slot)
+
+    def __len__(self):
+        self._expire()
+
+        return self.size
+
+    def getStats(self):
+        return dict(self.stats, size=len(self))
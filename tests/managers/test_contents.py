@@ -10,7 +10,10 @@ from twisted.trial.unittest import TestCase
 from jasmin.managers.content import (SubmitSmContent, SubmitSmRespContent,
                                      DeliverSmContent, SubmitSmRespBillContent,
                                      DLRContentForHttpapi, DLRContentForSmpps,
-                                     DLR, InvalidParameterError)
+                                     DLR, InvalidParameterError, PDUCodecError,
+                                     encode_pdu, decode_pdu, COMPACT_CODEC_MAGIC)
+from jasmin.protocols.smpp.configs import SMPPClientConfig
+from jasmin.protocols.smpp.operations import SMPPOperationFactory
 from jasmin.routing.jasminApi import *
 from smpp.pdu.pdu_types import AddrTon, AddrNpi, CommandId, CommandStatus
 
@@ -363,3 +366,64 @@ class SubmitSmRespBillContentTestCase(ContentTestCase):
         self.assertRaises(InvalidParameterError, SubmitSmRespBillContent, 'bid', 'uid', 'a')
         self.assertRaises(InvalidParameterError, SubmitSmRespBillContent, 'bid', 'uid', '1')
         self.assertRaises(InvalidParameterError, SubmitSmRespBillContent, 'bid', 'uid', -1)
+
+
+class PDUCodecTestCase(TestCase):
+    def setUp(self):
+        self.opFactory = SMPPOperationFactory(SMPPClientConfig(id='test-codec'))
+
+    def assertPDUEqual(self, pdu, expected):
+        while expected is not None:
+            self.assertEqual(pdu.__class__, expected.__class__)
+            self.assertEqual(pdu.seqNum, expected.seqNum)
+            self.assertEqual(pdu.params, expected.params)
+            self.assertEqual(pdu.custom_tlvs, expected.custom_tlvs)
+
+            expected = getattr(expected, 'nextPdu', None)
+            pdu = getattr(pdu, 'nextPdu', None)
+        self.assertEqual(pdu, None)
+
+    def test_pickle(self):
+        pdu = self.opFactory.SubmitSM(source_addr=b'1234', destination_addr=b'4567', short_message=b'hello')
+        body = encode_pdu(pdu)
+
+        self.assertEqual(body, pickle.dumps(pdu, pickle.HIGHEST_PROTOCOL))
+        self.assertPDUEqual(decode_pdu(body), pdu)
+
+    def test_compact(self):
+        pdu = self.opFactory.SubmitSM(source_addr=None, destination_addr=b'4567', short_message=b'hello')
+        body = encode_pdu(pdu, 'compact')
+
+        self.assertEqual(body[:1], COMPACT_CODEC_MAGIC)
+        self.assertLess(len(body), len(pickle.dumps(pdu, 2)))
+        decoded = decode_pdu(body)
+        self.assertPDUEqual(decoded, pdu)
+        self.assertEqual(decoded.params['source_addr'], None)
+        self.assertEqual(decoded.params['data_coding'], 0)
+
+    def test_compact_long_message(self):
+        pdu = self.opFactory.SubmitSM(source_addr=b'1234', destination_addr=b'4567', short_message=b'A' * 400)
+        pdu.seqNum = 10
+
+        self.assertPDUEqual(decode_pdu(encode_pdu(pdu, 'compact')), pdu)
+
+    def test_compact_custom_tlvs(self):
+        pdu = self.opFactory.SubmitSM(source_addr=b'1234', destination_addr=b'4567', short_message=b'hello')
+
+        # Typed TLVs are carried on the wire
+        pdu.custom_tlvs = [(0x1400, None, 'OctetString', b'abc')]
+        body = encode_pdu(pdu, 'compact')
+        self.assertEqual(body[:1], COMPACT_CODEC_MAGIC)
+        self.assertEqual(decode_pdu(body).custom_tlvs, [(0x1400, 3, 'OctetString', b'abc')])
+
+        # Untyped TLVs are resolved by the consumer, they are pickled
+        pdu.custom_tlvs = [(0x1400, None, None, 'abc')]
+        body = encode_pdu(pdu, 'compact')
+        self.assertNotEqual(body[:1], COMPACT_CODEC_MAGIC)
+        self.assertPDUEqual(decode_pdu(body), pdu)
+
+    def test_unsupported_version(self):
+        pdu = self.opFactory.SubmitSM(source_addr=b'1234', destination_addr=b'4567', short_message=b'hello')
+        body = encode_pdu(pdu, 'compact')
+
+        self.assertRaises(PDUCodecError, decode_pdu, body[:1] + b'\xff' + body[2:])
@@ -0,0 +1,139 @@
+from unittest import mock
+
+from twisted.internet import defer
+from twisted.trial.unittest import TestCase
+from smpp.pdu.pdu_types import CommandId
+
+from jasmin.managers.configs import DLRLookupConfig
+from jasmin.managers.content import DLR
+from jasmin.managers.dlr import DLRLookup
+from jasmin.protocols.smpp.stats import SMPPClientQualityCollector
+
+
+class FakeRedisClient:
+    def __init__(self, data):
+        self.data = data
+        self.calls = []
+
+    def hgetall(self, key):
+        self.calls.append(key)
+        return defer.succeed(self.data.get(key, {}))
+
+    def hgetallMany(self, keys):
+        self.calls.append(keys)
+        return defer.succeed([self.data.get(key, {}) for key in keys])
+
+    def pipelinedWrite(self, commands):
+        return defer.succeed([None for _ in commands])
+
+
+class LookupDLRMapTestCase(TestCase):
+    def setUp(self):
+        self.config = DLRLookupConfig()
+        self.redisClient = FakeRedisClient({
+            'queue-msgid:smsc1': {'msgid': 'q1', 'connector_type': 'httpapi'},
+            'queue-msgid:smsc3': {'msgid': 'q3', 'connector_type': 'smppsapi'},
+            'dlr:q1': {'sc': 'httpapi', 'url': 'http://127.0.0.1/dlr'},
+            'dlr:q3': {'sc': 'smppsapi', 'system_id': 'user1'},
+        })
+        self.dlrlookup = DLRLookup(self.config, None, self.redisClient)
+
+    @defer.inlineCallbacks
+    def test_lookup(self):
+        q, dlr = yield self.dlrlookup.lookupDLRMap('smsc1')
+        self.assertEqual(q['msgid'], 'q1')
+        self.assertEqual(dlr['url'], 'http://127.0.0.1/dlr')
+
+        q, dlr = yield self.dlrlookup.lookupDLRMap('smsc2')
+        self.assertEqual(q, {})
+        self.assertEqual(dlr, None)
+
+        self.assertEqual(self.redisClient.calls, ['queue-msgid:smsc1', 'dlr:q1', 'queue-msgid:smsc2'])
+
+    @defer.inlineCallbacks
+    def test_batched_lookup(self):
+        self.config.dlr_lookup_batch_size = 10
+        self.config.dlr_lookup_batch_wait = 1
+
+        r = yield defer.gatherResults([self.dlrlookup.lookupDLRMap(msgid)
+                                       for msgid in ['smsc1', 'smsc2', 'smsc3']])
+
+        # Results are given back in order, after two pipelined lookups
+        self.assertEqual([(q.get('msgid'), dlr and dlr['sc']) for q, dlr in r],
+                         [('q1', 'httpapi'), (None, None), ('q3', 'smppsapi')])
+        self.assertEqual(self.redisClient.calls, [
+            ['queue-msgid:smsc1', 'queue-msgid:smsc2', 'queue-msgid:smsc3'],
+            ['dlr:q1', 'dlr:q3']])
+
+    @defer.inlineCallbacks
+    def test_batched_lookup_full(self):
+        self.config.dlr_lookup_batch_size = 2
+        self.config.dlr_lookup_batch_wait = 1000
+
+        # A full batch is looked up without waiting
+        d1 = self.dlrlookup.lookupDLRMap('smsc1')
+        d2 = self.dlrlookup.lookupDLRMap('smsc3')
+        self.assertTrue(d1.called and d2.called)
+        self.assertEqual(self.dlrlookup.lookupsTimer, None)
+
+        d3 = self.dlrlookup.lookupDLRMap('smsc2')
+        self.assertFalse(d3.called)
+        self.dlrlookup.flushLookups()
+        q, dlr = yield d3
+        self.assertEqual(q, {})
+
+    @defer.inlineCallbacks
+    def test_batched_lookup_error(self):
+        self.config.dlr_lookup_batch_size = 2
+        self.redisClient.hgetallMany = lambda keys: defer.fail(ConnectionError('Not connected'))
+
+        d1 = self.dlrlookup.lookupDLRMap('smsc1')
+        d2 = self.dlrlookup.lookupDLRMap('smsc3')
+        yield self.assertFailure(d1, ConnectionError)
+        yield self.assertFailure(d2, ConnectionError)
+
+
+class FakeMessage:
+    def __init__(self, routing_key, content):
+        self.routing_key = routing_key
+        self.content = content
+        self.consumer_tag = 'DLRLookup'
+        self.delivery_tag = 1
+
+
+class QualityFeedTestCase(TestCase):
+    def setUp(self):
+        self.config = DLRLookupConfig()
+        self.redisClient = FakeRedisClient({
+            'queue-msgid:smsc1': {'msgid': 'q1', 'connector_type': 'httpapi'},
+            'dlr:q1': {'sc': 'httpapi', 'url': 'http://127.0.0.1/dlr', 'level': 1, 'method': 'POST'},
+        })
+        self.amqpBroker = mock.Mock(connected=True)
+        self.dlrlookup = DLRLookup(self.config, self.amqpBroker, self.redisClient)
+        self.dlrlookup.q = mock.Mock()
+
+        self.quality = SMPPClientQualityCollector()
+        self.addCleanup(self.quality.connectors.clear)
+
+    def dlr(self, msgid, status):
+        return FakeMessage('dlr.deliver_sm', DLR(
+            pdu_type=CommandId.deliver_sm, msgid=msgid, status=status, cid='abc',
+            dlr_details={'id': msgid, 'sub': '001', 'dlvrd': '001', 'sdate': '2610180000',
+                         'ddate': '2610180001', 'stat': status, 'err': '000', 'text': ''}))
+
+    @defer.inlineCallbacks
+    def test_receipts_are_fed(self):
+        yield self.dlrlookup.dlr_callback_dispatcher(self.dlr('smsc1', 'DELIVRD'))
+        yield self.dlrlookup.dlr_callback_dispatcher(self.dlr('smsc1', 'UNDELIV'))
+
+        # Non final receipts are not fed
+        yield self.dlrlookup.dlr_callback_dispatcher(self.dlr('smsc1', 'ACCEPTD'))
+
+        self.assertAlmostEqual(self.quality.get('abc').dlr.samples(), 2, places=3)
+
+    @defer.inlineCallbacks
+    def test_retried_receipts_are_not_fed_again(self):
+        self.dlrlookup.lookup_retrials['smsc1'] = 1
+        yield self.dlrlookup.dlr_callback_dispatcher(self.dlr('smsc1', 'DELIVRD'))
+
+        self.assertEqual(self.quality.get('abc').dlr.samples(), 0)
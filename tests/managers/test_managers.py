@@ -23,6 +23,7 @@ from jasmin.managers.configs import SMPPClientPBConfig
 from jasmin.managers.proxies import SMPPClientManagerPBProxy
 from jasmin.protocols.smpp.configs import SMPPClientConfig
 from jasmin.protocols.smpp.operations import SMPPOperationFactory
+from jasmin.protocols.smpp.stats import SMPPClientStatsCollector
 from tests.protocols.smpp.smsc_simulator import HappySMSC, HappySMSCRecorder, DeliverSMSMSC
 from jasmin.queues.configs import AmqpConfig
 from jasmin.queues.factory import AmqpFactory
@@ -66,6 +67,7 @@ class SMPPClientPBTestCase(TestCase):
 
         # Launch the client manager server
         pbRoot = SMPPClientManagerPB(self.SMPPClientPBConfigInstance)
+        self.pbRoot = pbRoot
 
         yield pbRoot.addAmqpBroker(self.amqpBroker)
         p = portal.Portal(JasminPBRealm(pbRoot))
@@ -903,6 +905,83 @@ class ClientConnectorSubmitSmTestCases(SMSCSimulatorRecorder):
         # Take the lastClient (and unique one) and assert received message
         self.assertEqual(len(self.SMSCPort.factory.lastClient.submitRecords), 150)
 
+    @defer.inlineCallbacks
+    def test_submitSm_window(self):
+        """Messages are all delivered when more than one submit_sm is allowed in-flight"""
+        yield self.connect('127.0.0.1', self.pbPort)
+
+        localConfig = copy.copy(self.defaultConfig)
+        localConfig.submit_sm_throughput = 0
+        localConfig.window_size = 5
+        yield self.add(localConfig)
+        yield self.start(localConfig.id)
+
+        # Send 20 messages to the queue
+        submitCounter = 0
+        submit_sm_pdu = copy.copy(self.SubmitSmPDU)
+        while submitCounter < 20:
+            submit_sm_pdu.params['short_message'] = '%s' % submitCounter
+            yield self.submit_sm(localConfig.id, submit_sm_pdu, self.SubmitSmBill.user.uid)
+            submitCounter += 1
+
+        # Wait 5 seconds
+        yield waitFor(5)
+
+        yield self.stop(localConfig.id)
+
+        # Wait for unbound state
+        yield waitFor(2)
+
+        # Assertions
+        self.assertEqual(len(self.SMSCPort.factory.lastClient.submitRecords), 20)
+        connector = self.pbRoot.getConnector(localConfig.id)
+        self.assertEqual(connector['sm_listener'].submit_sm_inflight, 0)
+
+    @defer.inlineCallbacks
+    def test_submitSm_sessions(self):
+        """Messages are shared by all the sessions (binds) of a multi-session connector"""
+        yield self.connect('127.0.0.1', self.pbPort)
+
+        localConfig = copy.copy(self.defaultConfig)
+        localConfig.id = 'test_submitSm_sessions'
+        localConfig.submit_sm_throughput = 0
+        localConfig.sessions = 3
+        yield self.add(localConfig)
+        yield self.start(localConfig.id)
+
+        # Wait for all sessions to be bound
+        yield waitFor(2)
+        connector = self.pbRoot.getConnector(localConfig.id)
+        self.assertEqual(len(self.pbRoot.getSessions(connector)), 3)
+        ssRet = yield self.session_state(localConfig.id)
+        self.assertEqual(SMPPSessionStates.BOUND_TRX.name, ssRet)
+
+        # Send 30 messages to the queue
+        submitCounter = 0
+        submit_sm_pdu = copy.copy(self.SubmitSmPDU)
+        while submitCounter < 30:
+            submit_sm_pdu.params['short_message'] = '%s' % submitCounter
+            yield self.submit_sm(localConfig.id, submit_sm_pdu, self.SubmitSmBill.user.uid)
+            submitCounter += 1
+
+        # Wait 5 seconds
+        yield waitFor(5)
+
+        yield self.stop(localConfig.id)
+
+        # Wait for unbound state
+        yield waitFor(2)
+
+        # Assertions
+        stats = SMPPClientStatsCollector().get(localConfig.id)
+        sessions_stats = SMPPClientStatsCollector().getSessions(localConfig.id)
+        self.assertEqual(stats.get('bound_count'), 3)
+        self.assertEqual(stats.get('submit_sm_count'), 30)
+        self.assertEqual(len(sessions_stats), 3)
+        self.assertEqual(sum([s.get('submit_sm_count') for s in sessions_stats]), 30)
+        for s in sessions_stats:
+            self.assertEqual(s.get('bound_count'), 1)
+
     @defer.inlineCallbacks
     def test_submitSm_validity(self):
         yield self.connect('127.0.0.1', self.pbPort)
@@ -1160,6 +1239,34 @@ class ClientConnectorStatusTestCases(SMSCSimulator):
 
         yield self.stopall()
 
+    @defer.inlineCallbacks
+    def test_connector_state_cache(self):
+        yield self.connect('127.0.0.1', self.pbPort)
+
+        yield self.add(self.defaultConfig)
+
+        state = self.pbRoot.getConnectorState(self.defaultConfig.id)
+        self.assertEqual(SMPPSessionStates.NONE.name, state['session_state'])
+        # Config is the live connector config, not a copy
+        self.assertIs(self.pbRoot.getConnector(self.defaultConfig.id)['config'], state['config'])
+
+        yield self.start(self.defaultConfig.id)
+        yield waitFor(0.2)
+
+        state = self.pbRoot.getConnectorState(self.defaultConfig.id)
+        self.assertEqual(SMPPSessionStates.BOUND_TRX.name, state['session_state'])
+
+        yield self.stop(self.defaultConfig.id)
+
+        # Wait for unbound state
+        yield waitFor(2)
+
+        state = self.pbRoot.getConnectorState(self.defaultConfig.id)
+        self.assertNotEqual(SMPPSessionStates.BOUND_TRX.name, state['session_state'])
+
+        yield self.remove(self.defaultConfig.id)
+        self.assertIsNone(self.pbRoot.getConnectorState(self.defaultConfig.id))
+
     @defer.inlineCallbacks
     def test_session_state_none(self):
         yield self.connect('127.0.0.1', self.pbPort)
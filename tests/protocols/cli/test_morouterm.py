@@ -1,4 +1,7 @@
+import json
+import os
 import re
+import tempfile
 
 from twisted.internet import defer
 
@@ -569,3 +572,35 @@ class MoRouteArgsTestCases(MxRouterTestCases):
                         'Total MO Routes: 1']
         commands = [{'command': 'morouter -l', 'expect': expectedList}]
         yield self._test(r'jcli : ', commands)
+
+
+class MoRouteImportTestCases(MxRouterTestCases):
+    def write_file(self, content, suffix):
+        fd, path = tempfile.mkstemp(suffix=suffix)
+        with os.fdopen(fd, 'w') as fh:
+            fh.write(content)
+        self.addCleanup(os.remove, path)
+
+        return path
+
+    @defer.inlineCallbacks
+    def test_import_json(self):
+        path = self.write_file(json.dumps([
+            {'type': 'DefaultRoute', 'connector': 'smpps(user_1)'},
+            {'order': 10, 'type': 'StaticMORoute', 'connector': 'http(http1)', 'filters': 'cf1'},
+            {'order': 20, 'type': 'RandomRoundrobinMORoute', 'connectors': 'http(http1);http(http2)',
+             'filters': 'f1'}]), '.json')
+
+        commands = [{'command': 'morouter -i %s' % path, 'expect': r'Successfully imported 3 MO Routes'},
+                    {'command': 'morouter -l', 'expect': r'Total MO Routes: 3'}]
+        yield self._test(r'jcli : ', commands)
+
+    @defer.inlineCallbacks
+    def test_import_invalid_record(self):
+        path = self.write_file('order,type,connector,filters\n'
+                               '10,StaticMORoute,http(http1),f1\n'
+                               '20,StaticMORoute,http(http3),f1\n', '.csv')
+
+        commands = [{'command': 'morouter -i %s' % path, 'expect': r'Error in record #2: Unknown http cid: http3'},
+                    {'command': 'morouter -l', 'expect': r'Total MO Routes: 0'}]
+        yield self._test(r'jcli : ', commands)
@@ -1,4 +1,7 @@
+import json
+import os
 import re
+import tempfile
 
 from twisted.internet import defer
 
@@ -188,7 +191,9 @@ class MtRouteTypingTestCases(MxRouterTestCases):
 
         # Any new filter must be added here
         self.assertEqual(filters, ['DefaultRoute', 'StaticMTRoute',
-                                   'RandomRoundrobinMTRoute', 'FailoverMTRoute'])
+                                   'RandomRoundrobinMTRoute', 'FailoverMTRoute', 'BestQualityMTRoute',
+                                   'WeightedRoundrobinMTRoute', 'LeastOutstandingMTRoute',
+                                   'ShortestQueueMTRoute'])
 
         # Check if MtRouteTypingTestCases is covering all the mtroutes
         for f in filters:
@@ -314,6 +319,138 @@ class MtRouteTypingTestCases(MxRouterTestCases):
         yield self._test(r'jcli : ', commands)
 
 
+    @defer.inlineCallbacks
+    def test_add_BestQualityMTRoute(self):
+        rorder = '10'
+        rtype = 'BestQualityMTRoute'
+        cid1 = 'smpp1'
+        typed_cid1 = 'smppc(%s)' % cid1
+        cid2 = 'smpp2'
+        typed_cid2 = 'smppc(%s)' % cid2
+        rate = '0'
+        fid = 'f1'
+        _str_ = ['%s to 2 connectors:' % rtype, '\t- %s' % re.escape(typed_cid1), '\t- %s' % re.escape(typed_cid2),
+                 'NOT RATED']
+
+        # Add MTRoute
+        extraCommands = [{'command': 'order %s' % rorder},
+                         {'command': 'type %s' % rtype},
+                         {'command': 'connectors %s;%s' % (typed_cid1, typed_cid2)},
+                         {'command': 'rate %s' % rate},
+                         {'command': 'filters %s' % fid}]
+        yield self.add_mtroute('jcli : ', extraCommands)
+
+        # Make asserts
+        expectedList = _str_
+        yield self._test('jcli : ', [{'command': 'mtrouter -s %s' % rorder, 'expect': expectedList}])
+        expectedList = [
+            '#Order Type                    Rate       Connector ID\(s\)                                  Filter\(s\)',
+            '#%s %s %s %s     <T>' % (rorder.ljust(5), rtype.ljust(23), '0 \(\!\)'.ljust(13),
+                                      (re.escape(typed_cid1) + ', ' + re.escape(typed_cid2)).ljust(48)),
+            'Total MT Routes: 1']
+        commands = [{'command': 'mtrouter -l', 'expect': expectedList}]
+        yield self._test(r'jcli : ', commands)
+
+
+    @defer.inlineCallbacks
+    def test_add_LeastOutstandingMTRoute(self):
+        rorder = '10'
+        rtype = 'LeastOutstandingMTRoute'
+        cid1 = 'smpp1'
+        typed_cid1 = 'smppc(%s)' % cid1
+        cid2 = 'smpp2'
+        typed_cid2 = 'smppc(%s)' % cid2
+        rate = '0'
+        fid = 'f1'
+        _str_ = ['%s to 2 connectors:' % rtype, '\t- %s' % re.escape(typed_cid1), '\t- %s' % re.escape(typed_cid2),
+                 'NOT RATED']
+
+        # Add MTRoute
+        extraCommands = [{'command': 'order %s' % rorder},
+                         {'command': 'type %s' % rtype},
+                         {'command': 'connectors %s;%s' % (typed_cid1, typed_cid2)},
+                         {'command': 'rate %s' % rate},
+                         {'command': 'filters %s' % fid}]
+        yield self.add_mtroute('jcli : ', extraCommands)
+
+        # Make asserts
+        expectedList = _str_
+        yield self._test('jcli : ', [{'command': 'mtrouter -s %s' % rorder, 'expect': expectedList}])
+        expectedList = [
+            '#Order Type                    Rate       Connector ID\(s\)                                  Filter\(s\)',
+            '#%s %s %s %s     <T>' % (rorder.ljust(5), rtype.ljust(23), '0 \(\!\)'.ljust(13),
+                                      (re.escape(typed_cid1) + ', ' + re.escape(typed_cid2)).ljust(48)),
+            'Total MT Routes: 1']
+        commands = [{'command': 'mtrouter -l', 'expect': expectedList}]
+        yield self._test(r'jcli : ', commands)
+
+
+    @defer.inlineCallbacks
+    def test_add_ShortestQueueMTRoute(self):
+        rorder = '10'
+        rtype = 'ShortestQueueMTRoute'
+        cid1 = 'smpp1'
+        typed_cid1 = 'smppc(%s)' % cid1
+        cid2 = 'smpp2'
+        typed_cid2 = 'smppc(%s)' % cid2
+        rate = '0'
+        fid = 'f1'
+        _str_ = ['%s to 2 connectors:' % rtype, '\t- %s' % re.escape(typed_cid1), '\t- %s' % re.escape(typed_cid2),
+                 'NOT RATED']
+
+        # Add MTRoute
+        extraCommands = [{'command': 'order %s' % rorder},
+                         {'command': 'type %s' % rtype},
+                         {'command': 'connectors %s;%s' % (typed_cid1, typed_cid2)},
+                         {'command': 'rate %s' % rate},
+                         {'command': 'filters %s' % fid}]
+        yield self.add_mtroute('jcli : ', extraCommands)
+
+        # Make asserts
+        expectedList = _str_
+        yield self._test('jcli : ', [{'command': 'mtrouter -s %s' % rorder, 'expect': expectedList}])
+        expectedList = [
+            '#Order Type                    Rate       Connector ID\(s\)                                  Filter\(s\)',
+            '#%s %s %s %s     <T>' % (rorder.ljust(5), rtype.ljust(23), '0 \(\!\)'.ljust(13),
+                                      (re.escape(typed_cid1) + ', ' + re.escape(typed_cid2)).ljust(48)),
+            'Total MT Routes: 1']
+        commands = [{'command': 'mtrouter -l', 'expect': expectedList}]
+        yield self._test(r'jcli : ', commands)
+
+
+    @defer.inlineCallbacks
+    def test_add_WeightedRoundrobinMTRoute(self):
+        rorder = '10'
+        rtype = 'WeightedRoundrobinMTRoute'
+        cid1 = 'smpp1'
+        typed_cid1 = 'smppc(%s)' % cid1
+        cid2 = 'smpp2'
+        typed_cid2 = 'smppc(%s)' % cid2
+        rate = '0'
+        fid = 'f1'
+        _str_ = ['%s to 2 connectors:' % rtype, '\t- %s weight 3' % re.escape(typed_cid1),
+                 '\t- %s weight 1' % re.escape(typed_cid2), 'NOT RATED']
+
+        # Add MTRoute
+        extraCommands = [{'command': 'order %s' % rorder},
+                         {'command': 'type %s' % rtype},
+                         {'command': 'connectors %s;%s' % (typed_cid1, typed_cid2)},
+                         {'command': 'weights 3;1'},
+                         {'command': 'rate %s' % rate},
+                         {'command': 'filters %s' % fid}]
+        yield self.add_mtroute('jcli : ', extraCommands)
+
+        # Make asserts
+        expectedList = _str_
+        yield self._test('jcli : ', [{'command': 'mtrouter -s %s' % rorder, 'expect': expectedList}])
+        expectedList = [
+            '#Order Type                    Rate       Connector ID\(s\)                                  Filter\(s\)',
+            '#%s %s %s %s     <T>' % (rorder.ljust(5), rtype.ljust(23), '0 \(\!\)'.ljust(13),
+                                      (re.escape(typed_cid1) + ', ' + re.escape(typed_cid2)).ljust(48)),
+            'Total MT Routes: 1']
+        commands = [{'command': 'mtrouter -l', 'expect': expectedList}]
+        yield self._test(r'jcli : ', commands)
+
 class MtRouteArgsTestCases(MxRouterTestCases):
     @defer.inlineCallbacks
     def test_add_defaultroute_with_nonzero_order(self):
@@ -397,3 +534,56 @@ class MtRouteArgsTestCases(MxRouterTestCases):
             'Total MT Routes: 1']
         commands = [{'command': 'mtrouter -l', 'expect': expectedList}]
         yield self._test(r'jcli : ', commands)
+
+
+class MtRouteImportTestCases(MxRouterTestCases):
+    def write_file(self, content, suffix):
+        fd, path = tempfile.mkstemp(suffix=suffix)
+        with os.fdopen(fd, 'w') as fh:
+            fh.write(content)
+        self.addCleanup(os.remove, path)
+
+        return path
+
+    @defer.inlineCallbacks
+    def test_import_csv(self):
+        path = self.write_file('order,type,connector,connectors,filters,rate\n'
+                               '0,DefaultRoute,smppc(smpp1),,,0.0\n'
+                               '20,StaticMTRoute,smppc(smpp1),,uf1,1.5\n'
+                               '30,FailoverMTRoute,,smppc(smpp1);smppc(smpp2),f1,0.0\n', '.csv')
+
+        commands = [{'command': 'mtrouter -i %s' % path, 'expect': r'Successfully imported 3 MT Routes'},
+                    {'command': 'mtrouter -l', 'expect': r'Total MT Routes: 3'}]
+        yield self._test(r'jcli : ', commands)
+
+    @defer.inlineCallbacks
+    def test_import_json_with_replace(self):
+        extraCommands = [{'command': 'order 20'},
+                         {'command': 'type StaticMTRoute'},
+                         {'command': 'connector smppc(smpp1)'},
+                         {'command': 'rate 0.0'},
+                         {'command': 'filters uf1'}]
+        yield self.add_mtroute(r'jcli : ', extraCommands)
+
+        path = self.write_file(json.dumps([
+            {'order': 10, 'type': 'StaticMTRoute', 'connector': 'smppc(smpp2)', 'filters': 'f1', 'rate': 0.0}]),
+            '.json')
+
+        expectedList = [
+            r'#Order Type                    Rate       Connector ID\(s\)                                  Filter\(s\)',
+            r'#10    StaticMTRoute           0 \(!\)      smppc\(smpp2\)                                     <T>',
+            'Total MT Routes: 1']
+        commands = [{'command': 'mtrouter -i %s --replace' % path, 'expect': r'Successfully imported 1 MT Routes'},
+                    {'command': 'mtrouter -l', 'expect': expectedList}]
+        yield self._test(r'jcli : ', commands)
+
+    @defer.inlineCallbacks
+    def test_import_invalid_record(self):
+        path = self.write_file('order,type,connector,filters,rate\n'
+                               '20,StaticMTRoute,smppc(smpp1),uf1,0.0\n'
+                               '30,StaticMTRoute,smppc(smpp1),cf1,0.0\n', '.csv')
+
+        commands = [{'command': 'mtrouter -i %s' % path,
+                     'expect': r'Error in record #2: ConnectorFilter#cf1 is not a valid filter for MTRoute'},
+                    {'command': 'mtrouter -l', 'expect': r'Total MT Routes: 0'}]
+        yield self._test(r'jcli : ', commands)
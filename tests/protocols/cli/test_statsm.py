@@ -167,6 +167,10 @@ class SmppcStatsTestCases(SmppccmTestCases):
                         '#other_submit_error_count  0',
                         '#interceptor_error_count   0',
                         '#interceptor_count         0',
+                        '#pacing_delay_count        0',
+                        '#pacing_delay_ms           0',
+                        '#effective_throughput      0',
+                        '#submit_retrials_size      0',
                         ]
         commands = [{'command': 'stats --smppc=test_smppc', 'expect': expectedList}]
         yield self._test(r'jcli : ', commands)
@@ -1,4 +1,8 @@
 from twisted.internet import defer
+from smpp.pdu.operations import SubmitSM
+
+from jasmin.routing.Routables import RoutableSubmitSm
+from jasmin.routing.stats import DLRLookupStatsCollector, ThrowerStatsCollector
 
 from .test_server import HTTPApiTestCases
 
@@ -64,3 +68,54 @@ class HttpapiTestCases(MetricsTestCases):
                          int(_after['httpapi_request_count'].encode()))
         self.assertEqual(int(_before['httpapi_server_error_count'].encode()) + 1,
                          int(_after['httpapi_server_error_count'].encode()))
+
+
+class RetrialsTestCases(MetricsTestCases):
+    def setUp(self):
+        # Collectors are shared with the other tests running in this process
+        DLRLookupStatsCollector().lookups.clear()
+        ThrowerStatsCollector().throwers.clear()
+        self.addCleanup(DLRLookupStatsCollector().lookups.clear)
+        self.addCleanup(ThrowerStatsCollector().throwers.clear)
+
+        return MetricsTestCases.setUp(self)
+
+    @defer.inlineCallbacks
+    def test_not_running(self):
+        "DLRLookup and throwers metrics are exported only when running in the same process"
+        _metrics = yield self.get_metric()
+
+        self.assertNotIn('dlrlookup_lookup_retrials_size', _metrics)
+        self.assertEqual([k for k in _metrics if k.startswith('thrower_')], [])
+
+    @defer.inlineCallbacks
+    def test_retrials_size(self):
+        DLRLookupStatsCollector().get().set('lookup_retrials_size', 2)
+        ThrowerStatsCollector().get('DLRThrower').set('throwing_retrials_size', 3)
+        ThrowerStatsCollector().get('deliverSmThrower')
+
+        _metrics = yield self.get_metric()
+        self.assertEqual(_metrics['dlrlookup_lookup_retrials_size'], '2')
+        self.assertEqual(_metrics['thrower_throwing_retrials_size{thrower="DLRThrower"}'], '3')
+        self.assertEqual(_metrics['thrower_throwing_retrials_size{thrower="deliverSmThrower"}'], '0')
+
+
+class RouteCacheTestCases(MetricsTestCases):
+    @defer.inlineCallbacks
+    def test_disabled(self):
+        _metrics = yield self.get_metric()
+
+        self.assertEqual([k for k in _metrics if k.startswith('route_cache_')], [])
+
+    @defer.inlineCallbacks
+    def test_hits_and_misses(self):
+        self.RouterPB_f.mt_routing_table.enableCache(10)
+        routable = RoutableSubmitSm(SubmitSM(source_addr='20203060', destination_addr='06155423'), self.u1)
+        for _ in range(3):
+            self.RouterPB_f.mt_routing_table.getRouteFor(routable)
+
+        _metrics = yield self.get_metric()
+        self.assertEqual(_metrics['route_cache_hits{table="mt"}'], '2')
+        self.assertEqual(_metrics['route_cache_misses{table="mt"}'], '1')
+        self.assertEqual(_metrics['route_cache_entries{table="mt"}'], '1')
+        self.assertNotIn('route_cache_hits{table="mo"}', _metrics)
@@ -1,5 +1,8 @@
 import json
+import pickle
+import time
 from datetime import datetime
+from unittest.mock import Mock
 
 from twisted.internet import defer
 from twisted.trial.unittest import TestCase
@@ -28,6 +31,8 @@ class HTTPApiTestCases(TestCase):
         self.u1 = User(1, self.g1, 'nathalie', 'correct')
         self.RouterPB_f.groups.append(self.g1)
         self.RouterPB_f.users.append(self.u1)
+        self.RouterPB_f.indexGroups()
+        self.RouterPB_f.indexUsers()
         self.RouterPB_f.mt_routing_table.add(DefaultRoute(SmppClientConnector('abc')), 0)
 
         # Instanciate a SMPPClientManagerPB (a requirement for HTTPApi)
@@ -136,6 +141,138 @@ class AuthenticationTestCases(HTTPApiTestCases):
         self.assertEqual(response.value(), b'"Authentication failure for username:nathalie"')
 
 
+class CredentialCacheTestCases(HTTPApiTestCases):
+    def setUp(self):
+        HTTPApiTestCases.setUp(self)
+
+        # Rebuild HTTPApi with credentials cache enabled
+        SMPPClientPBConfigInstance = SMPPClientPBConfig()
+        SMPPClientPBConfigInstance.authentication = False
+        clientManager_f = SMPPClientManagerPB(SMPPClientPBConfigInstance)
+
+        httpApiConfigInstance = HTTPApiConfig()
+        httpApiConfigInstance.auth_cache_ttl = 60
+        self.web = DummySite(HTTPApi(self.RouterPB_f, clientManager_f, httpApiConfigInstance))
+
+        self.RouterPB_f.authenticateUser = Mock(wraps=self.RouterPB_f.authenticateUser)
+
+    @defer.inlineCallbacks
+    def balance(self, password=b'correct'):
+        response = yield self.web.get(b"balance", {b'username': self.u1.username,
+                                                  b'password': password})
+        defer.returnValue(response.responseCode)
+
+    @defer.inlineCallbacks
+    def test_shared_cache(self):
+        self.assertEqual((yield self.balance()), 200)
+        response = yield self.web.get(b"rate", {b'username': self.u1.username,
+                                               b'password': b'correct',
+                                               b'to': b'06155423'})
+        self.assertEqual(response.responseCode, 200)
+        self.assertEqual((yield self.balance()), 200)
+
+        # Only the first request was authenticated against RouterPB
+        self.assertEqual(self.RouterPB_f.authenticateUser.call_count, 1)
+
+    @defer.inlineCallbacks
+    def test_failures_are_not_cached(self):
+        self.assertEqual((yield self.balance(b'incorrect')), 403)
+        self.assertEqual((yield self.balance(b'incorrect')), 403)
+        self.assertEqual((yield self.balance()), 200)
+        self.assertEqual(self.RouterPB_f.authenticateUser.call_count, 3)
+
+    @defer.inlineCallbacks
+    def test_invalidation_on_user_disable(self):
+        self.assertEqual((yield self.balance()), 200)
+        self.RouterPB_f.perspective_user_disable(self.u1.uid)
+        self.assertEqual((yield self.balance()), 403)
+
+    @defer.inlineCallbacks
+    def test_invalidation_on_user_remove(self):
+        self.assertEqual((yield self.balance()), 200)
+        self.RouterPB_f.perspective_user_remove(self.u1.uid)
+        self.assertEqual((yield self.balance()), 403)
+
+    @defer.inlineCallbacks
+    def test_invalidation_on_password_change(self):
+        self.assertEqual((yield self.balance()), 200)
+        self.RouterPB_f.perspective_user_add(pickle.dumps(User(1, self.g1, 'nathalie', 'newpwd')))
+        self.assertEqual((yield self.balance()), 403)
+        self.assertEqual((yield self.balance(b'newpwd')), 200)
+
+    @defer.inlineCallbacks
+    def test_invalidation_on_group_disable(self):
+        self.assertEqual((yield self.balance()), 200)
+        self.RouterPB_f.perspective_group_disable(self.g1.gid)
+        self.assertEqual((yield self.balance()), 403)
+
+    @defer.inlineCallbacks
+    def test_expiry(self):
+        # Entries are expired as soon as they are cached
+        self.web.resource.children[b'balance'].credential_cache.ttl = -1
+        self.assertEqual((yield self.balance()), 200)
+        self.assertEqual((yield self.balance()), 200)
+        self.assertEqual(self.RouterPB_f.authenticateUser.call_count, 2)
+
+
+class ThroughputTestCases(HTTPApiTestCases):
+    def setUp(self):
+        HTTPApiTestCases.setUp(self)
+        self.u1.getCnxStatus().qos_buckets.clear()
+
+    def tearDown(self):
+        HTTPApiTestCases.tearDown(self)
+        self.u1.getCnxStatus().qos_buckets.clear()
+
+    def setThroughput(self, throughput, burst=1, queue_timeout=0):
+        self.u1.mt_credential.setQuota('http_throughput', throughput)
+
+        SMPPClientPBConfigInstance = SMPPClientPBConfig()
+        SMPPClientPBConfigInstance.authentication = False
+        clientManager_f = SMPPClientManagerPB(SMPPClientPBConfigInstance)
+
+        httpApiConfigInstance = HTTPApiConfig()
+        httpApiConfigInstance.throughput_burst = burst
+        httpApiConfigInstance.throughput_queue_timeout = queue_timeout
+        self.web = DummySite(HTTPApi(self.RouterPB_f, clientManager_f, httpApiConfigInstance))
+
+    @defer.inlineCallbacks
+    def send(self):
+        response = yield self.web.post(b'send', {b'username': self.u1.username,
+                                               b'password': b'correct',
+                                               b'to': b'06155423',
+                                               b'content': 'anycontent'})
+        # 500 is a normal error since SMPPClientManagerPB is not really running
+        defer.returnValue(response.responseCode)
+
+    @defer.inlineCallbacks
+    def test_burst(self):
+        self.setThroughput(0.1, burst=3)
+
+        self.assertEqual((yield self.send()), 500)
+        self.assertEqual((yield self.send()), 500)
+        self.assertEqual((yield self.send()), 500)
+        self.assertEqual((yield self.send()), 403)
+
+    @defer.inlineCallbacks
+    def test_queue(self):
+        self.setThroughput(20, queue_timeout=1)
+
+        start = time.monotonic()
+        for i in range(3):
+            self.assertEqual((yield self.send()), 500)
+
+        # Second and third requests were queued for 1/20 seconds
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
+
+    @defer.inlineCallbacks
+    def test_queue_timeout(self):
+        self.setThroughput(0.1, queue_timeout=1)
+
+        self.assertEqual((yield self.send()), 500)
+        self.assertEqual((yield self.send()), 403)
+
+
 class SendTestCases(HTTPApiTestCases):
     username = 'nathalie'
 
@@ -423,6 +560,7 @@ class RateTestCases(HTTPApiTestCases):
         u3.mt_credential.setQuota('balance', 10)
         self.RouterPB_f.users.append(u2)
         self.RouterPB_f.users.append(u3)
+        self.RouterPB_f.indexUsers()
         filters = [GroupFilter(Group(2))]
         route = StaticMTRoute(filters, SmppClientConnector('abc'), 1.5)
         self.RouterPB_f.mt_routing_table.add(route, 2)
@@ -522,6 +660,7 @@ class BalanceTestCases(HTTPApiTestCases):
         u3.mt_credential.setQuota('balance', 10)
         self.RouterPB_f.users.append(u2)
         self.RouterPB_f.users.append(u3)
+        self.RouterPB_f.indexUsers()
 
     @defer.inlineCallbacks
     def test_balance_with_correct_args(self):
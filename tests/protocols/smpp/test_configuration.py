@@ -5,7 +5,7 @@ Test cases for jasmin.protocols.smpp.configs module.
 from twisted.trial.unittest import TestCase
 
 from jasmin.protocols.smpp.configs import ConfigUndefinedIdError, ConfigInvalidIdError
-from jasmin.protocols.smpp.configs import SMPPClientConfig
+from jasmin.protocols.smpp.configs import SMPPClientConfig, TypeMismatch, UnknownValue
 
 
 class SMPPClientConfigCases(TestCase):
@@ -16,3 +16,38 @@ class SMPPClientConfigCases(TestCase):
         invalidValues = ['zzz s', '', 'a,', 'r#r', '9a', '&"()=+~#{[|\`\^@]}', 'a123456789012345678901234-', 'aa']
         for invalidValue in invalidValues:
             self.assertRaises(ConfigInvalidIdError, SMPPClientConfig, id=invalidValue)
+
+    def test_window_size(self):
+        self.assertEqual(SMPPClientConfig(id='abc').window_size, 1)
+        self.assertEqual(SMPPClientConfig(id='abc', window_size=10).window_size, 10)
+
+        self.assertRaises(TypeMismatch, SMPPClientConfig, id='abc', window_size='10')
+        self.assertRaises(TypeMismatch, SMPPClientConfig, id='abc', window_size=1.5)
+        self.assertRaises(UnknownValue, SMPPClientConfig, id='abc', window_size=0)
+
+    def test_submit_sm_burst(self):
+        self.assertEqual(SMPPClientConfig(id='abc').submit_sm_burst, 1)
+        self.assertEqual(SMPPClientConfig(id='abc', submit_sm_burst=5).submit_sm_burst, 5)
+
+        self.assertRaises(TypeMismatch, SMPPClientConfig, id='abc', submit_sm_burst=2.5)
+        self.assertRaises(UnknownValue, SMPPClientConfig, id='abc', submit_sm_burst=0)
+
+    def test_adaptive_throughput(self):
+        config = SMPPClientConfig(id='abc')
+        self.assertEqual(config.adaptive_throughput, False)
+        self.assertEqual(config.adaptive_min_throughput, 1)
+
+        config = SMPPClientConfig(id='abc', adaptive_throughput=True, adaptive_min_throughput=0.5)
+        self.assertEqual(config.adaptive_throughput, True)
+        self.assertEqual(config.adaptive_min_throughput, 0.5)
+
+        self.assertRaises(TypeMismatch, SMPPClientConfig, id='abc', adaptive_throughput='yes')
+        self.assertRaises(TypeMismatch, SMPPClientConfig, id='abc', adaptive_min_throughput='1')
+        self.assertRaises(UnknownValue, SMPPClientConfig, id='abc', adaptive_min_throughput=0)
+
+    def test_sessions(self):
+        self.assertEqual(SMPPClientConfig(id='abc').sessions, 1)
+        self.assertEqual(SMPPClientConfig(id='abc', sessions=4).sessions, 4)
+
+        self.assertRaises(TypeMismatch, SMPPClientConfig, id='abc', sessions='2')
+        self.assertRaises(UnknownValue, SMPPClientConfig, id='abc', sessions=0)
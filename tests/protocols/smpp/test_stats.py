@@ -60,6 +60,10 @@ class SMPPClientStatsCollectorBasicTestCases(TestCase):
                                         'submit_sm_count': 0,
                                         'submit_sm_request_count': 0,
                                         'throttling_error_count': 0,
+                                        'pacing_delay_count': 0,
+                                        'pacing_delay_ms': 0,
+                                        'effective_throughput': 0,
+                                        'submit_retrials_size': 0,
                                         })
 
     def test_stats_set(self):
@@ -79,6 +83,31 @@ class SMPPClientStatsCollectorBasicTestCases(TestCase):
         stats.inc('bound_count', 5)
         self.assertEqual(stats.get('bound_count'), 6)
 
+    def test_sessions(self):
+        c = SMPPClientStatsCollector()
+        connector_stats = c.get(cid='test_sessions')
+        s0 = c.get(cid='test_sessions', session=0)
+        s1 = c.get(cid='test_sessions', session=1)
+        self.assertIs(c.get(cid='test_sessions', session=1), s1)
+        self.assertEqual(c.getSessions('test_sessions'), [s0, s1])
+
+        # Sessions stats are aggregated in connector stats
+        s0.inc('submit_sm_count', 2)
+        s1.inc('submit_sm_count', 3)
+        self.assertEqual(s0.get('submit_sm_count'), 2)
+        self.assertEqual(s1.get('submit_sm_count'), 3)
+        self.assertEqual(connector_stats.get('submit_sm_count'), 5)
+
+        s1.set('bound_at', 1)
+        self.assertEqual(connector_stats.get('bound_at'), 1)
+        s1.set('created_at', 1)
+        self.assertEqual(connector_stats.get('created_at'), 0)
+        s0.set('created_at', 2)
+        self.assertEqual(connector_stats.get('created_at'), 2)
+
+        c.delSession('test_sessions', 1)
+        self.assertEqual(c.getSessions('test_sessions'), [s0])
+
     def test_exceptions(self):
         stats = SMPPClientStatsCollector().get(cid='test_exceptions')
         self.assertRaises(KeyNotFound, stats.get, 'anything')
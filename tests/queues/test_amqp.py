@@ -3,18 +3,25 @@ Test cases for AmqpFactory
 These are test cases for only Jasmin's code, smpp.twisted tests are not included here
 """
 
+import os
 import pickle
 import logging
 import time
 import uuid
+from unittest.mock import Mock
 
 from twisted.internet import defer, reactor
 from twisted.trial.unittest import TestCase
+from txamqp import spec
 from txamqp.content import Content
 from txamqp.queue import Closed
 
+from jasmin.managers.configs import DLRLookupConfig
+from jasmin.managers.dlr import DLRLookup
 from jasmin.queues.configs import AmqpConfig
-from jasmin.queues.factory import AmqpFactory
+from jasmin.queues.factory import AmqpFactory, PublishNotConfirmed
+from jasmin.routing.configs import deliverSmThrowerConfig, DLRThrowerConfig
+from jasmin.routing.throwers import deliverSmThrower, DLRThrower
 
 
 @defer.inlineCallbacks
@@ -124,6 +131,345 @@ class PublishTestCase(AmqpTestCase):
         yield self.amqp.disconnect()
 
 
+class FakeChannel:
+    """A channel recording the calls made on it"""
+    existing = ['submit.sm.abc']
+
+    def __init__(self, id):
+        self.id = id
+        self.closed = False
+        self.published = 0
+        self.last_published = None
+        self.declared = {}
+        self.prefetch_count = None
+        self.acked = []
+        self.rejected = []
+
+    def channel_open(self):
+        return defer.succeed(None)
+
+    def channel_close(self):
+        self.closed = True
+        return defer.succeed(None)
+
+    def confirm_select(self):
+        return defer.succeed(None)
+
+    def basic_qos(self, prefetch_count):
+        self.prefetch_count = prefetch_count
+        return defer.succeed(None)
+
+    def basic_publish(self, **args):
+        self.published += 1
+        self.last_published = args
+        return defer.succeed(None)
+
+    def basic_ack(self, delivery_tag):
+        self.acked.append(delivery_tag)
+        return defer.succeed(None)
+
+    def basic_reject(self, delivery_tag, requeue):
+        self.rejected.append(delivery_tag)
+        return defer.succeed(None)
+
+    def queue_declare(self, queue, arguments=None, passive=False):
+        if passive:
+            # Unknown queues close the channel, as a broker does
+            if queue not in FakeChannel.existing:
+                self.closed = True
+                return defer.fail(Closed('NOT_FOUND - no queue %s' % queue))
+            return defer.succeed(type('DeclareOk', (), {'queue': queue, 'message_count': 5})())
+
+        self.declared[queue] = arguments
+        return defer.succeed(type('DeclareOk', (), {'queue': queue})())
+
+
+RESOURCE_PATH = os.path.join(os.path.dirname(__file__), '..', '..', 'misc', 'config', 'resource')
+
+
+class FakeClient:
+    spec = spec.load(os.path.join(RESOURCE_PATH, 'amqp0-9-1.xml'))
+
+    def channel(self, id):
+        return defer.succeed(FakeChannel(id))
+
+
+class FakeChannelsTestCase(AmqpTestCase):
+    """The connection and channels are faked, no broker is needed"""
+
+    def setUp(self):
+        AmqpTestCase.setUp(self)
+
+        self.amqp = AmqpFactory(self.config)
+        self.amqp.client = FakeClient()
+        self.amqp.chan = FakeChannel(1)
+        self.amqp.channelReady = defer.Deferred()
+        self.amqp.connected = True
+
+    def publish(self, count):
+        for _ in range(count):
+            self.amqp.publish(exchange='messaging', routing_key='any', content=Content(self.message))
+
+
+class PublisherConfirmsTestCase(FakeChannelsTestCase):
+
+    def setUp(self):
+        FakeChannelsTestCase.setUp(self)
+
+        self.config.publisher_confirms = True
+
+    def test_multiple_ack(self):
+        self.publish(5)
+        self.assertEqual(self.amqp.getUnconfirmedCount(), 5)
+
+        # Confirm the first 3 messages in one batch
+        self.amqp.publishConfirmed(3, True, True)
+        self.assertEqual(self.amqp.getUnconfirmedCount(), 2)
+        self.assertEqual(list(self.amqp.unconfirmed[1]), [4, 5])
+
+        # Then the last one alone
+        self.amqp.publishConfirmed(5, False, True)
+        self.assertEqual(list(self.amqp.unconfirmed[1]), [4])
+
+    def test_ack_fires_deferred(self):
+        confirmed = []
+        for _ in range(3):
+            self.amqp.publish(exchange='messaging', routing_key='any',
+                              content=Content(self.message)).addCallback(confirmed.append)
+        self.assertEqual(confirmed, [])
+
+        self.amqp.publishConfirmed(2, True, True)
+        self.assertEqual(confirmed, [1, 2])
+
+    def test_nack(self):
+        failures = []
+        for _ in range(2):
+            self.amqp.publish(exchange='messaging', routing_key='any',
+                              content=Content(self.message)).addErrback(failures.append)
+
+        self.amqp.publishConfirmed(2, True, False)
+        self.assertEqual(len(failures), 2)
+        failures[0].trap(PublishNotConfirmed)
+        self.assertEqual(self.amqp.getUnconfirmedCount(), 0)
+
+    def test_channel_lost(self):
+        failures = []
+        for _ in range(3):
+            self.amqp.publish(exchange='messaging', routing_key='any',
+                              content=Content(self.message)).addErrback(failures.append)
+
+        self.amqp.failUnconfirmed('Connection lost')
+        self.assertEqual(len(failures), 3)
+        self.assertEqual(self.amqp.getUnconfirmedCount(), 0)
+
+        # Delivery tags start over on a new channel
+        self.publish(1)
+        self.assertEqual(list(self.amqp.unconfirmed[1]), [1])
+
+    def test_disabled(self):
+        self.config.publisher_confirms = False
+
+        self.publish(1)
+        self.assertEqual(self.amqp.getUnconfirmedCount(), 0)
+
+    @defer.inlineCallbacks
+    def test_spec_without_confirms(self):
+        "Confirms are disabled when the spec file has no confirm class"
+        self.amqp.client.spec = spec.load(os.path.join(RESOURCE_PATH, 'amqp0-8.stripped.rabbitmq.xml'))
+        yield self.amqp._channel_open(None)
+
+        self.assertTrue(self.amqp.connected)
+        self.assertFalse(self.config.publisher_confirms)
+        self.publish(1)
+        self.assertEqual(self.amqp.getUnconfirmedCount(), 0)
+
+    @defer.inlineCallbacks
+    def test_publish_channels(self):
+        self.config.publish_channels = 2
+        yield self.amqp._channel_open(None)
+        self.publish(4)
+
+        # Delivery tags are tracked per channel
+        self.assertEqual(self.amqp.getUnconfirmedCount(), 4)
+        self.assertEqual(list(self.amqp.unconfirmed[2]), [1, 2])
+        self.assertEqual(list(self.amqp.unconfirmed[3]), [1, 2])
+
+        self.amqp.publishConfirmed(2, True, True, 3)
+        self.assertEqual(self.amqp.getUnconfirmedCount(), 2)
+        self.assertEqual(list(self.amqp.unconfirmed[2]), [1, 2])
+
+
+class FakeQueue:
+    def get(self):
+        return defer.Deferred()
+
+
+class RetryTiersTestCase(FakeChannelsTestCase):
+
+    def setUp(self):
+        FakeChannelsTestCase.setUp(self)
+
+        self.config.retry_tiers = True
+
+    def consumed(self, routing_key, content, delivery_tag=1):
+        return type('Message', (), {'routing_key': routing_key, 'content': content,
+                                    'consumer_tag': 'any', 'delivery_tag': delivery_tag})()
+
+    def deadLettered(self):
+        """Return the last message published to a retry tier as it gets consumed back after
+        being dead-lettered"""
+        published = self.amqp.chan.last_published
+        tier = self.amqp.chan.declared[published['routing_key']]
+        self.assertEqual(tier['x-dead-letter-exchange'], 'messaging')
+        return self.consumed(tier['x-dead-letter-routing-key'], published['content'], 2)
+
+    @defer.inlineCallbacks
+    def test_publish_retry(self):
+        message = self.consumed('submit.sm.abc', Content(self.message, properties={
+            'message-id': 'msg-1', 'headers': {'source_connector': 'httpapi'}}))
+
+        yield self.amqp.publishRetry(message, 30)
+
+        # Tier queue is dead-lettering back to the messaging exchange with the original routing key
+        self.assertEqual(self.amqp.chan.declared, {'retry.30s.messaging.submit.sm.abc': {
+            'x-message-ttl': 30000,
+            'x-dead-letter-exchange': 'messaging',
+            'x-dead-letter-routing-key': 'submit.sm.abc'}})
+        published = self.amqp.chan.last_published
+        self.assertEqual(published['exchange'], '')
+        self.assertEqual(published['routing_key'], 'retry.30s.messaging.submit.sm.abc')
+        self.assertEqual(published['content'].body, self.message)
+        self.assertEqual(published['content'].properties['message-id'], 'msg-1')
+        self.assertEqual(published['content'].properties['headers'],
+                         {'source_connector': 'httpapi', 'retrials': 1})
+
+        # Retrials are counted in the message header, the tier queue is declared once
+        message.content = published['content']
+        yield self.amqp.publishRetry(message, 30)
+        self.assertEqual(self.amqp.chan.last_published['content'].properties['headers']['retrials'], 2)
+        self.assertEqual(self.amqp.queues, ['retry.30s.messaging.submit.sm.abc'])
+
+        # Not counted retrial
+        yield self.amqp.publishRetry(message, 30, retrial=False)
+        self.assertEqual(self.amqp.chan.last_published['content'].properties['headers']['retrials'], 1)
+
+    @defer.inlineCallbacks
+    def test_dlr_thrower_dispatch(self):
+        thrower = DLRThrower(DLRThrowerConfig())
+        thrower.amqpBroker = self.amqp
+        thrower.thrower_q = FakeQueue()
+        thrower.http_dlr_callback = Mock(return_value=defer.succeed(None))
+
+        message = self.consumed('dlr_thrower.http', Content(self.message, properties={
+            'message-id': 'msg-1', 'headers': {}}))
+        yield thrower.rejectAndRequeueMessage(message)
+        self.assertEqual(self.amqp.chan.acked, [1])
+
+        # Retried message is dispatched as the original one
+        yield thrower.dlr_throwing_callback(self.deadLettered())
+        self.assertEqual(thrower.http_dlr_callback.call_count, 1)
+        self.assertEqual(self.amqp.chan.rejected, [])
+        yield thrower.stopService()
+
+    @defer.inlineCallbacks
+    def test_deliver_sm_thrower_dispatch(self):
+        thrower = deliverSmThrower(deliverSmThrowerConfig())
+        thrower.amqpBroker = self.amqp
+        thrower.thrower_q = FakeQueue()
+        thrower.smpp_deliver_sm_callback = Mock(return_value=defer.succeed(None))
+
+        message = self.consumed('deliver_sm_thrower.smpps', Content(self.message, properties={
+            'message-id': 'msg-1', 'headers': {}}))
+        yield thrower.rejectAndRequeueMessage(message, retrial=False)
+
+        yield thrower.deliver_sm_throwing_callback(self.deadLettered())
+        self.assertEqual(thrower.smpp_deliver_sm_callback.call_count, 1)
+        self.assertEqual(self.amqp.chan.rejected, [])
+        yield thrower.stopService()
+
+    @defer.inlineCallbacks
+    def test_dlr_lookup_dispatch(self):
+        dlrlookup = DLRLookup(DLRLookupConfig(), self.amqp, None)
+        dlrlookup.q = FakeQueue()
+        dlrlookup.deliver_sm_dlr_callback = Mock(return_value=defer.succeed(None))
+
+        message = self.consumed('dlr.deliver_sm', Content(self.message, properties={
+            'message-id': 'msg-1', 'headers': {}}))
+        yield dlrlookup.rejectAndRequeueMessage(message)
+
+        yield dlrlookup.dlr_callback_dispatcher(self.deadLettered())
+        self.assertEqual(dlrlookup.deliver_sm_dlr_callback.call_count, 1)
+        self.assertEqual(self.amqp.chan.rejected, [])
+
+
+class ChannelPoolTestCase(FakeChannelsTestCase):
+
+    @defer.inlineCallbacks
+    def test_publish_channels(self):
+        self.config.publish_channels = 3
+        yield self.amqp._channel_open(None)
+        self.publish(7)
+
+        # Publishes are spread over the publish channels
+        self.assertEqual([c.id for c in self.amqp.publishChans], [2, 3, 4])
+        self.assertEqual([c.published for c in self.amqp.publishChans], [3, 2, 2])
+        self.assertEqual(self.amqp.chan.published, 0)
+
+    @defer.inlineCallbacks
+    def test_passive_queue_declare(self):
+        r = yield self.amqp.passive_queue_declare('submit.sm.abc')
+        self.assertEqual(r.message_count, 5)
+        passiveChan = self.amqp.passiveChan
+        self.assertEqual(passiveChan.id, 2)
+
+        # A missing queue closes the dedicated channel only, it is reopened on next call
+        yield self.assertFailure(self.amqp.passive_queue_declare('submit.sm.unknown'), Closed)
+        self.assertTrue(passiveChan.closed)
+        self.assertFalse(self.amqp.chan.closed)
+
+        r = yield self.amqp.passive_queue_declare('submit.sm.abc')
+        self.assertEqual(r.message_count, 5)
+        self.assertEqual(self.amqp.passiveChan.id, 3)
+
+    def test_no_publish_channels(self):
+        self.publish(2)
+
+        self.assertEqual(self.amqp.chan.published, 2)
+
+    @defer.inlineCallbacks
+    def test_consumer_channels(self):
+        self.config.consumer_channels = True
+        self.config.consumer_prefetch_count = 10
+
+        chan_a = yield self.amqp.getConsumerChannel('consumer-a')
+        chan_b = yield self.amqp.getConsumerChannel('consumer-b', 1)
+
+        # Every consumer has its own channel and prefetch limit
+        self.assertNotEqual(chan_a.id, chan_b.id)
+        self.assertNotEqual(chan_a.id, self.amqp.chan.id)
+        self.assertEqual(chan_a.prefetch_count, 10)
+        self.assertEqual(chan_b.prefetch_count, 1)
+        self.assertIs(self.amqp.lookupConsumerChannel('consumer-a'), chan_a)
+
+        # Channel is kept for the same consumer tag
+        chan = yield self.amqp.getConsumerChannel('consumer-a')
+        self.assertIs(chan, chan_a)
+
+        # Until released
+        yield self.amqp.releaseConsumerChannel('consumer-a')
+        self.assertTrue(chan_a.closed)
+        self.assertIs(self.amqp.lookupConsumerChannel('consumer-a'), self.amqp.chan)
+
+    @defer.inlineCallbacks
+    def test_consumer_channels_disabled(self):
+        chan = yield self.amqp.getConsumerChannel('consumer-a', 5)
+
+        # The shared main channel's prefetch limit is left unchanged
+        self.assertIs(chan, self.amqp.chan)
+        self.assertEqual(chan.prefetch_count, None)
+        self.assertIs(self.amqp.lookupConsumerChannel('consumer-a'), self.amqp.chan)
+
+
 class ConsumeTools(AmqpTestCase):
     consumedMessages = 0
 
@@ -0,0 +1,139 @@
+import os
+
+from twisted.internet import defer
+from twisted.trial.unittest import TestCase
+
+from jasmin.queues.spool import PublishSpool, SpoolOverflowPolicyError
+
+
+class PublishSpoolTestCase(TestCase):
+    def setUp(self):
+        self.path = self.mktemp()
+        self.published = []
+
+    def publish(self, **args):
+        self.published.append(args['routing_key'])
+        return defer.succeed(None)
+
+    def fill(self, spool, count, start=0):
+        for i in range(start, start + count):
+            self.assertTrue(spool.append({'exchange': 'messaging', 'routing_key': 'submit.sm.%s' % i}))
+
+    def segment_files(self):
+        return sorted(os.listdir(self.path))
+
+    @defer.inlineCallbacks
+    def test_replay_in_order(self):
+        spool = PublishSpool(self.path, segment_messages=3)
+        self.fill(spool, 7)
+        self.assertEqual(len(spool), 7)
+        self.assertEqual(len(self.segment_files()), 3)
+
+        replayed = yield spool.replay(self.publish)
+
+        self.assertEqual(replayed, 7)
+        self.assertEqual(self.published, ['submit.sm.%s' % i for i in range(7)])
+        self.assertEqual(len(spool), 0)
+        self.assertEqual(self.segment_files(), [])
+        self.assertEqual(spool.getStats()['spooled_count'], 7)
+        self.assertEqual(spool.getStats()['replayed_count'], 7)
+
+    @defer.inlineCallbacks
+    def test_replay_stops_when_disconnected(self):
+        spool = PublishSpool(self.path, segment_messages=2)
+        self.fill(spool, 5)
+
+        def publish(**args):
+            if len(self.published) == 3:
+                # Broker is disconnected again
+                return None
+            return self.publish(**args)
+
+        replayed = yield spool.replay(publish)
+        self.assertEqual(replayed, 3)
+        self.assertEqual(len(spool), 2)
+
+        # Append more while disconnected, then replay the rest
+        self.fill(spool, 1, start=5)
+        replayed = yield spool.replay(self.publish)
+        self.assertEqual(replayed, 3)
+        self.assertEqual(self.published, ['submit.sm.%s' % i for i in range(6)])
+
+    @defer.inlineCallbacks
+    def test_reload_from_disk(self):
+        spool = PublishSpool(self.path, segment_messages=2)
+        self.fill(spool, 3)
+
+        # A new spool (i.e. after a restart) gets the records left on disk
+        spool = PublishSpool(self.path, segment_messages=2)
+        self.assertEqual(len(spool), 3)
+        self.fill(spool, 1, start=3)
+
+        yield spool.replay(self.publish)
+        self.assertEqual(self.published, ['submit.sm.%s' % i for i in range(4)])
+
+    @defer.inlineCallbacks
+    def test_reload_after_partial_replay(self):
+        spool = PublishSpool(self.path, segment_messages=3)
+        self.fill(spool, 5)
+
+        def publish(**args):
+            if len(self.published) == 2:
+                # Broker is disconnected, then jasmin is restarted
+                return None
+            return self.publish(**args)
+
+        yield spool.replay(publish)
+
+        # Records replayed before the restart are not replayed again
+        spool = PublishSpool(self.path, segment_messages=3)
+        self.assertEqual(len(spool), 3)
+        replayed = yield spool.replay(self.publish)
+        self.assertEqual(replayed, 3)
+        self.assertEqual(self.published, ['submit.sm.%s' % i for i in range(5)])
+        self.assertEqual(self.segment_files(), [])
+
+        # Segment numbers start over, the former replay offset does not apply to them
+        self.fill(spool, 2, start=5)
+        spool = PublishSpool(self.path, segment_messages=3)
+        self.assertEqual(len(spool), 2)
+
+    @defer.inlineCallbacks
+    def test_replay_keeps_segment_open(self):
+        spool = PublishSpool(self.path, segment_messages=3)
+        self.fill(spool, 5)
+        readers = []
+
+        def publish(**args):
+            readers.append((spool.reader_segment, spool.reader))
+            return self.publish(**args)
+
+        yield spool.replay(publish)
+
+        # One file object per segment, closed once replay is done
+        self.assertEqual(len(set(readers)), 2)
+        self.assertTrue(all(reader.closed for _, reader in readers))
+        self.assertEqual(spool.reader, None)
+
+    def test_overflow_reject(self):
+        spool = PublishSpool(self.path, max_messages=3, segment_messages=2)
+        self.fill(spool, 3)
+
+        self.assertFalse(spool.append({'exchange': 'messaging', 'routing_key': 'submit.sm.3'}))
+        self.assertEqual(len(spool), 3)
+        self.assertEqual(spool.getStats()['overflow_count'], 1)
+
+    @defer.inlineCallbacks
+    def test_overflow_drop_oldest(self):
+        spool = PublishSpool(self.path, max_messages=4, segment_messages=2, overflow_policy='drop_oldest')
+        self.fill(spool, 5)
+
+        # First segment (2 messages) was dropped
+        self.assertEqual(len(spool), 3)
+        self.assertEqual(spool.getStats()['overflow_count'], 1)
+
+        yield spool.replay(self.publish)
+        self.assertEqual(self.published, ['submit.sm.%s' % i for i in range(2, 5)])
+
+    def test_unknown_overflow_policy(self):
+        self.assertRaises(SpoolOverflowPolicyError, PublishSpool, self.path, overflow_policy='any')
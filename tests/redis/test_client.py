@@ -125,6 +125,53 @@ class DataTestCase(object):
         g = yield self.redisClient.hgetall('h_test')
         self.assertEqual(g, {})
 
+    @defer.inlineCallbacks
+    def test_hmset_expire_pipelined(self):
+        # Writes issued in the same reactor iteration are flushed in one pipeline
+        d1 = self.redisClient.hmsetExpire('h_test1', {'key_a': 'value_a'}, 5)
+        d2 = self.redisClient.hsetExpire('h_test2', 'key_b', 'value_b', 10)
+        self.assertEqual(len(self.redisClient.pendingWrites), 2)
+
+        r = yield defer.gatherResults([d1, d2])
+        self.assertEqual(r, ['OK', 1])
+        self.assertEqual(self.redisClient.pendingWrites, [])
+
+        g = yield self.redisClient.hgetall('h_test1')
+        self.assertEqual(g, {'key_a': 'value_a'})
+        g = yield self.redisClient.hgetall('h_test2')
+        self.assertEqual(g, {'key_b': 'value_b'})
+
+        ttl = yield self.redisClient.ttl('h_test1')
+        self.assertTrue(0 < ttl <= 5)
+        ttl = yield self.redisClient.ttl('h_test2')
+        self.assertTrue(5 < ttl <= 10)
+
+    @defer.inlineCallbacks
+    def test_hmset_expire_error(self):
+        yield self.redisClient.set('s_test', 'value')
+
+        # Reply error is given back to the failing write only
+        d1 = self.redisClient.hsetExpire('s_test', 'key_a', 'value_a', 5)
+        d2 = self.redisClient.hmsetExpire('h_test', {'key_a': 'value_a'}, 5)
+        yield self.assertFailure(d1, redis.ResponseError)
+        r = yield d2
+        self.assertEqual(r, 'OK')
+
+    @defer.inlineCallbacks
+    def test_hmset_expire_expire_error(self):
+        # A failing EXPIRE is given back to its write too
+        d = self.redisClient.hsetExpire('h_test', 'key_a', 'value_a', 'never')
+        yield self.assertFailure(d, redis.ResponseError)
+
+    @defer.inlineCallbacks
+    def test_hgetall_many(self):
+        yield self.redisClient.hmset('h_test1', {'key_a': 'value_a'})
+        yield self.redisClient.hmset('h_test2', {'key_b': 'value_b'})
+
+        g = yield self.redisClient.hgetallMany(['h_test1', 'incorrect', 'h_test2'])
+        self.assertEqual(g, [{'key_a': 'value_a'}, {}, {'key_b': 'value_b'}])
+
+
 class DataTestCaseWithAuth(AuthenticationTestCase, DataTestCase):
     pass
 
@@ -1,12 +1,14 @@
 # pylint: disable=W0401,W0611
 
 import copy
+from unittest import mock
 
 from twisted.trial.unittest import TestCase
 
 from jasmin.routing.Filters import *
 from jasmin.routing.Routables import RoutableSubmitSm, RoutableDeliverSm
 from jasmin.routing.Routes import *
+from jasmin.protocols.smpp.stats import SMPPClientQualityCollector, ClientConnectorQuality
 from smpp.pdu.operations import SubmitSM, DeliverSM
 
 
@@ -74,9 +76,41 @@ class RouteStrTestCase(RouteTestCase):
         self.assertRaises(InvalidRouteParameterError, FailoverMORoute, self.simple_filter_mo, [])
 
     def test_BestQualityMTRouteTestCase(self):
-        pass
+        s = BestQualityMTRoute(self.simple_filter_mt, [self.connector1, self.connector2], 0.0)
+        self.assertEqual(str(s), 'BestQualityMTRoute to 2 connectors:\n\t- generic(abc)\n\t- generic(def) \nNOT RATED')
+        self.assertEqual(repr(s), 'BestQualityMTRoute')
 
-    test_BestQualityMTRouteTestCase.skip = 'This route type is not implemented yet'
+        # Routes having multiple connectors must have at least one connector
+        self.assertRaises(InvalidRouteParameterError, BestQualityMTRoute, self.simple_filter_mt, [], 0.0)
+
+    def test_WeightedRoundrobinMTRouteTestCase(self):
+        s = WeightedRoundrobinMTRoute(self.simple_filter_mt, [self.connector1, self.connector2], [3, 1], 0.0)
+        self.assertEqual(str(s),
+                         'WeightedRoundrobinMTRoute to 2 connectors:\n\t- generic(abc) weight 3\n\t- generic(def) '
+                         'weight 1 \nNOT RATED')
+        self.assertEqual(repr(s), 'WeightedRoundrobinMTRoute')
+
+        # Routes having multiple connectors must have at least one connector
+        self.assertRaises(InvalidRouteParameterError, WeightedRoundrobinMTRoute, self.simple_filter_mt, [], [],
+                          0.0)
+
+    def test_LeastOutstandingMTRouteTestCase(self):
+        s = LeastOutstandingMTRoute(self.simple_filter_mt, [self.connector1, self.connector2], 0.0)
+        self.assertEqual(str(s),
+                         'LeastOutstandingMTRoute to 2 connectors:\n\t- generic(abc)\n\t- generic(def) \nNOT RATED')
+        self.assertEqual(repr(s), 'LeastOutstandingMTRoute')
+
+        # Routes having multiple connectors must have at least one connector
+        self.assertRaises(InvalidRouteParameterError, LeastOutstandingMTRoute, self.simple_filter_mt, [], 0.0)
+
+    def test_ShortestQueueMTRouteTestCase(self):
+        s = ShortestQueueMTRoute(self.simple_filter_mt, [self.connector1, self.connector2], 0.0)
+        self.assertEqual(str(s),
+                         'ShortestQueueMTRoute to 2 connectors:\n\t- generic(abc)\n\t- generic(def) \nNOT RATED')
+        self.assertEqual(repr(s), 'ShortestQueueMTRoute')
+
+        # Routes having multiple connectors must have at least one connector
+        self.assertRaises(InvalidRouteParameterError, ShortestQueueMTRoute, self.simple_filter_mt, [], 0.0)
 
 
 class AnyStaticRouteTestCase(RouteTestCase):
@@ -294,7 +328,8 @@ class RatedMTRoutesTestCase(RouteTestCase):
 
 class getBillForTestCase(RouteTestCase):
     test_routes = ['DefaultRoute', 'StaticMORoute', 'StaticMTRoute', 'RandomRoundrobinMORoute',
-                   'RandomRoundrobinMTRoute', 'FailoverMORoute', 'FailoverMTRoute']
+                   'RandomRoundrobinMTRoute', 'FailoverMORoute', 'FailoverMTRoute', 'BestQualityMTRoute',
+                   'LeastOutstandingMTRoute', 'ShortestQueueMTRoute']
 
     def test_all_routes(self):
         for route_class in self.test_routes:
@@ -307,7 +342,7 @@ class getBillForTestCase(RouteTestCase):
             # unrated route intialization
             if globals()[route_class]._type == 'default':
                 r = globals()[route_class](self.connector1, 0.0)
-            elif globals()[route_class]._type == 'mt' and route_class[:6] not in ['Random', 'Failov']:
+            elif globals()[route_class]._type == 'mt' and route_class[:6] not in ['Random', 'Failov', 'BestQu', 'LeastO', 'Shorte']:
                 r = globals()[route_class](self.simple_filter_all, self.connector1, 0.0)
             else:
                 r = globals()[route_class](self.simple_filter_all, [self.connector1, self.connector2], 0.0)
@@ -327,7 +362,7 @@ class getBillForTestCase(RouteTestCase):
             # rated route intialization
             if globals()[route_class]._type == 'default':
                 r = globals()[route_class](self.connector1, 2.0)
-            elif globals()[route_class]._type == 'mt' and route_class[:6] not in ['Random', 'Failov']:
+            elif globals()[route_class]._type == 'mt' and route_class[:6] not in ['Random', 'Failov', 'BestQu', 'LeastO', 'Shorte']:
                 r = globals()[route_class](self.simple_filter_all, self.connector1, 2.0)
             else:
                 r = globals()[route_class](self.simple_filter_all, [self.connector1, self.connector2], 2.0)
@@ -430,7 +465,233 @@ class FailoverMTRouteTestCase(RouteTestCase):
 
 
 class BestQualityMTRouteTestCase(RouteTestCase):
+    def setUp(self):
+        RouteTestCase.setUp(self)
+
+        self.PDU_dst_1 = SubmitSM(
+            source_addr='20203060',
+            destination_addr='1',
+            short_message='hello world',
+        )
+
+        self.routable_user1 = RoutableSubmitSm(self.PDU_dst_1, self.user1)
+        self.routable_user2 = RoutableSubmitSm(self.PDU_dst_1, self.user2)
+        self.connectors = [self.connector1, self.connector2]
+
+        self.quality = SMPPClientQualityCollector()
+        self.addCleanup(self.quality.connectors.clear)
+
+        self.now = 1000.0
+        patcher = mock.patch('jasmin.tools.stats.time.monotonic', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.states = {'abc': {'session_state': 'BOUND_TRX'},
+                       'def': {'session_state': 'BOUND_TX'}}
+
+    def state(self, cid):
+        return self.states.get(cid)
+
+    def test_standard(self):
+        o = BestQualityMTRoute(self.simple_filter_mt, self.connectors, 0.0)
+
+        t = o.matchFilters(self.routable_user1)
+        self.assertTrue(t)
+
+        t = o.matchFilters(self.routable_user2)
+        self.assertFalse(t)
+
+    def test_accepts_connectors_list(self):
+        BestQualityMTRoute(self.simple_filter_mt, self.connectors, 0.0)
+        self.assertRaises(InvalidRouteParameterError, BestQualityMTRoute, self.simple_filter_mt, self.connector1,
+                          0.0)
+        self.assertRaises(InvalidRouteParameterError, BestQualityMTRoute, self.simple_filter_mt, [0, 1], 0.0)
+
+    def test_unknown_quality(self):
+        "Connectors without any sample are balanced"
+        o = BestQualityMTRoute(self.simple_filter_mt, self.connectors, 0.0)
+        o.exploration = 0
+
+        cids = set(o.getConnector().cid for _ in range(100))
+        self.assertEqual(cids, {'abc', 'def'})
+
+    def test_submit_sm_resp_quality(self):
+        o = BestQualityMTRoute(self.simple_filter_mt, self.connectors, 0.0)
+        o.exploration = 0
+
+        for _ in range(10):
+            self.quality.get('abc').submit_sm_resp_received(True, 0.1)
+            self.quality.get('def').submit_sm_resp_received(True, 0.1)
+        self.quality.get('abc').submit_sm_resp_received(False)
+
+        for _ in range(10):
+            self.assertEqual(o.getConnector().cid, 'def')
+
+    def test_latency_quality(self):
+        o = BestQualityMTRoute(self.simple_filter_mt, self.connectors, 0.0)
+        o.exploration = 0
+
+        self.quality.get('abc').submit_sm_resp_received(True, 0.05)
+        self.quality.get('def').submit_sm_resp_received(True, 1.5)
+
+        for _ in range(10):
+            self.assertEqual(o.getConnector().cid, 'abc')
+
+    def test_dlr_quality(self):
+        o = BestQualityMTRoute(self.simple_filter_mt, self.connectors, 0.0)
+        o.exploration = 0
+
+        self.quality.get('abc').dlr_received(True)
+        self.quality.get('abc').dlr_received(False)
+        self.quality.get('def').dlr_received(True)
+
+        for _ in range(10):
+            self.assertEqual(o.getConnector().cid, 'def')
+
+    def test_no_samples_is_not_perfect(self):
+        "A connector without any sample does not beat a healthy one"
+        o = BestQualityMTRoute(self.simple_filter_mt, self.connectors, 0.0)
+        o.exploration = 0
+
+        for _ in range(10):
+            self.quality.get('def').submit_sm_resp_received(True, 0.5)
+            self.quality.get('def').dlr_received(True)
+        self.assertLess(self.quality.get('abc').getScore(), self.quality.get('def').getScore())
+
+        for _ in range(10):
+            self.assertEqual(o.getConnector().cid, 'def')
+
+    def test_stale_samples(self):
+        "Old samples fade out, a recovered connector wins its traffic back"
+        o = BestQualityMTRoute(self.simple_filter_mt, self.connectors, 0.0)
+        o.exploration = 0
+
+        # abc used to be perfect, def is fine but slower
+        for _ in range(100):
+            self.quality.get('abc').submit_sm_resp_received(True, 0.01)
+        self.now += ClientConnectorQuality.half_life * 10
+        for _ in range(10):
+            self.quality.get('def').submit_sm_resp_received(True, 0.5)
+        self.assertEqual(o.getConnector().cid, 'def')
+
+        # abc has been failing, then recovers
+        for _ in range(100):
+            self.quality.get('abc').submit_sm_resp_received(False)
+        self.assertEqual(o.getConnector().cid, 'def')
+        self.now += ClientConnectorQuality.half_life * 10
+        for _ in range(10):
+            self.quality.get('abc').submit_sm_resp_received(True, 0.01)
+        self.assertEqual(o.getConnector().cid, 'abc')
+
+    def test_unbound_connectors_are_skipped(self):
+        o = BestQualityMTRoute(self.simple_filter_mt, self.connectors, 0.0)
+        o.exploration = 1
+
+        self.quality.get('abc').submit_sm_resp_received(True, 0.01)
+        self.states['abc']['session_state'] = 'UNBOUND'
+        for _ in range(10):
+            self.assertEqual(o.getConnector(self.state).cid, 'def')
+
+        o.exploration = 0
+        del self.states['abc']
+        for _ in range(10):
+            self.assertEqual(o.getConnector(self.state).cid, 'def')
+
+    def test_no_bound_connector(self):
+        "When no connector is bound, all of them are considered"
+        o = BestQualityMTRoute(self.simple_filter_mt, self.connectors, 0.0)
+        o.exploration = 0
+        self.states = {}
+
+        cids = set(o.getConnector(self.state).cid for _ in range(100))
+        self.assertEqual(cids, {'abc', 'def'})
+
+
+class WeightedRoundrobinMTRouteTestCase(RouteTestCase):
+    def setUp(self):
+        RouteTestCase.setUp(self)
+
+        self.PDU_dst_1 = SubmitSM(
+            source_addr='20203060',
+            destination_addr='1',
+            short_message='hello world',
+        )
+
+        self.routable_user1 = RoutableSubmitSm(self.PDU_dst_1, self.user1)
+        self.routable_user2 = RoutableSubmitSm(self.PDU_dst_1, self.user2)
+        self.connectors = [self.connector1, self.connector2]
+
     def test_standard(self):
-        pass
+        o = WeightedRoundrobinMTRoute(self.simple_filter_mt, self.connectors, [1, 1], 0.0)
+
+        t = o.matchFilters(self.routable_user1)
+        self.assertTrue(t)
+
+        t = o.matchFilters(self.routable_user2)
+        self.assertFalse(t)
+
+    def test_weights(self):
+        o = WeightedRoundrobinMTRoute(self.simple_filter_mt, self.connectors, [9, 1], 0.0)
+
+        cids = [o.getConnector().cid for _ in range(1000)]
+        self.assertGreater(cids.count('abc'), cids.count('def') * 3)
+        self.assertIn('def', cids)
+
+    def test_accepts_weights_list(self):
+        self.assertRaises(InvalidRouteParameterError, WeightedRoundrobinMTRoute, self.simple_filter_mt,
+                          self.connectors, 1, 0.0)
+        self.assertRaises(InvalidRouteParameterError, WeightedRoundrobinMTRoute, self.simple_filter_mt,
+                          self.connectors, [1], 0.0)
+        self.assertRaises(InvalidRouteParameterError, WeightedRoundrobinMTRoute, self.simple_filter_mt,
+                          self.connectors, [1, 0], 0.0)
+        self.assertRaises(InvalidRouteParameterError, WeightedRoundrobinMTRoute, self.simple_filter_mt,
+                          self.connectors, [1, 0.5], 0.0)
+
+
+class LoadBalancedMTRouteTestCase(RouteTestCase):
+    def setUp(self):
+        RouteTestCase.setUp(self)
+
+        self.connectors = [self.connector1, self.connector2]
+        self.loads = {'abc': {'outstanding': 5, 'queue_depth': 0},
+                      'def': {'outstanding': 1, 'queue_depth': 100}}
+
+    def load(self, cid):
+        return self.loads.get(cid)
+
+    def test_least_outstanding(self):
+        o = LeastOutstandingMTRoute(self.simple_filter_mt, self.connectors, 0.0)
+
+        for _ in range(10):
+            self.assertEqual(o.getConnector(self.load).cid, 'def')
+
+    def test_shortest_queue(self):
+        o = ShortestQueueMTRoute(self.simple_filter_mt, self.connectors, 0.0)
+
+        for _ in range(10):
+            self.assertEqual(o.getConnector(self.load).cid, 'abc')
+
+    def test_unbound_connectors_are_skipped(self):
+        o = LeastOutstandingMTRoute(self.simple_filter_mt, self.connectors, 0.0)
+        del self.loads['def']
+
+        for _ in range(10):
+            self.assertEqual(o.getConnector(self.load).cid, 'abc')
+
+    def test_no_load_information(self):
+        "Without load information, connectors are picked randomly"
+        o = ShortestQueueMTRoute(self.simple_filter_mt, self.connectors, 0.0)
+        self.loads = {}
+
+        cids = set(o.getConnector(self.load).cid for _ in range(100))
+        self.assertEqual(cids, {'abc', 'def'})
+
+        cids = set(o.getConnector().cid for _ in range(100))
+        self.assertEqual(cids, {'abc', 'def'})
+
+    def test_same_load(self):
+        o = LeastOutstandingMTRoute(self.simple_filter_mt, self.connectors, 0.0)
+        self.loads['abc']['outstanding'] = 1
 
-    test_standard.skip = 'This route type is not implemented yet'
+        cids = set(o.getConnector(self.load).cid for _ in range(100))
+        self.assertEqual(cids, {'abc', 'def'})
@@ -1,5 +1,7 @@
 # pylint: disable=W0401,W0611
 
+import pickle
+
 from twisted.trial.unittest import TestCase
 from jasmin.routing.RoutingTables import *
 from jasmin.routing.Routes import *
@@ -150,3 +152,200 @@ class MORoutingTableTestCase(RoutingTableTests, TestCase):
         self.routable_matching_route1 = RoutableDeliverSm(self.PDU_dst_1, self.connector1)
         self.routable_matching_route2 = RoutableDeliverSm(self.PDU_dst_2, self.connector1)
         self.routable_notmatching_any = RoutableDeliverSm(self.PDU_dst_3, self.connector1)
+
+
+class DestinationAddrPrefixTestCase(TestCase):
+    def test_indexable(self):
+        self.assertEqual(destination_addr_prefix(r'^3367\d+'), '3367')
+        self.assertEqual(destination_addr_prefix(r'3367\d+'), '3367')
+        self.assertEqual(destination_addr_prefix(r'^216$'), '216')
+        self.assertEqual(destination_addr_prefix(r'^3367?\d+'), '336')
+        self.assertEqual(destination_addr_prefix(r'^33{2}'), '3')
+
+    def test_not_indexable(self):
+        self.assertEqual(destination_addr_prefix(r'^\d+'), None)
+        self.assertEqual(destination_addr_prefix(r'^(33|44)\d+'), None)
+        self.assertEqual(destination_addr_prefix(r'^33\d+|^44\d+'), None)
+        self.assertEqual(destination_addr_prefix(r'^[0-9]+'), None)
+        self.assertEqual(destination_addr_prefix(r'^3?'), None)
+        self.assertEqual(destination_addr_prefix(r'^'), None)
+
+
+class MTRoutingTableIndexTestCase(TestCase):
+    def setUp(self):
+        self.group100 = Group(100)
+        self.user1 = User(1, self.group100, 'username', 'password')
+        self.user2 = User(2, self.group100, 'username', 'password')
+        self.c_fr = SmppClientConnector('fr')
+        self.c_fr_orange = SmppClientConnector('fr_orange')
+        self.c_user1 = SmppClientConnector('user1')
+        self.c_regex = SmppClientConnector('regex')
+        self.c_default = SmppClientConnector('default')
+
+        self.routing_t = MTRoutingTable()
+        self.routing_t.add(StaticMTRoute([DestinationAddrFilter(r'^33\d+')], self.c_fr, 0.0), 10)
+        self.routing_t.add(StaticMTRoute([UserFilter(self.user1)], self.c_user1, 0.0), 20)
+        self.routing_t.add(StaticMTRoute([DestinationAddrFilter(r'^3367\d+')], self.c_fr_orange, 0.0), 30)
+        self.routing_t.add(StaticMTRoute([DestinationAddrFilter(r'^(216|33)99\d+')], self.c_regex, 0.0), 40)
+        self.routing_t.add(DefaultRoute(self.c_default), 0)
+
+    def routable(self, destination_addr, user=None):
+        return RoutableSubmitSm(SubmitSM(source_addr=b'x', destination_addr=destination_addr,
+                                         short_message=b'hello world'), user or self.user2)
+
+    def test_route_order_is_kept(self):
+        self.assertEqual(self.routing_t.getRouteFor(self.routable(b'33991')).getConnector(), self.c_regex)
+        self.assertEqual(self.routing_t.getRouteFor(self.routable(b'336712')).getConnector(), self.c_fr_orange)
+        self.assertEqual(self.routing_t.getRouteFor(self.routable(b'336712', self.user1)).getConnector(),
+                         self.c_fr_orange)
+        self.assertEqual(self.routing_t.getRouteFor(self.routable(b'33612', self.user1)).getConnector(),
+                         self.c_user1)
+        self.assertEqual(self.routing_t.getRouteFor(self.routable(b'33612')).getConnector(), self.c_fr)
+        self.assertEqual(self.routing_t.getRouteFor(self.routable(b'2169912')).getConnector(), self.c_regex)
+        self.assertEqual(self.routing_t.getRouteFor(self.routable(b'44')).getConnector(), self.c_default)
+        self.assertEqual(self.routing_t.getRouteFor(self.routable(b'3367')).getConnector(), self.c_fr)
+
+    def test_index_is_rebuilt_on_table_change(self):
+        self.assertEqual(self.routing_t.getRouteFor(self.routable(b'336712')).getConnector(), self.c_fr_orange)
+
+        self.routing_t.remove(30)
+        self.assertEqual(self.routing_t.getRouteFor(self.routable(b'336712')).getConnector(), self.c_fr)
+
+        self.routing_t.add(StaticMTRoute([DestinationAddrFilter(r'^4\d+')], self.c_fr_orange, 0.0), 50)
+        self.assertEqual(self.routing_t.getRouteFor(self.routable(b'44')).getConnector(), self.c_fr_orange)
+
+        self.routing_t.flush()
+        self.assertEqual(self.routing_t.getRouteFor(self.routable(b'44')), None)
+
+    def test_pickling(self):
+        self.routing_t.getRouteFor(self.routable(b'336712'))
+        self.assertNotEqual(self.routing_t._index, None)
+
+        routing_t = pickle.loads(pickle.dumps(self.routing_t))
+        self.assertEqual(routing_t._index, None)
+        self.assertEqual(routing_t.getRouteFor(self.routable(b'336712')).getConnector().cid, 'fr_orange')
+
+
+class RouteDecisionCacheTestCase(TestCase):
+    def setUp(self):
+        self.group100 = Group(100)
+        self.user1 = User(1, self.group100, 'username', 'password')
+        self.user2 = User(2, self.group100, 'username', 'password')
+        self.connector1 = SmppClientConnector('abc')
+        self.connector2 = SmppClientConnector('def')
+        self.connector3 = SmppClientConnector('ghi')
+
+        self.routing_t = MTRoutingTable()
+        self.routing_t.enableCache(2)
+        self.routing_t.add(StaticMTRoute([UserFilter(self.user1)], self.connector1, 0.0), 20)
+        self.routing_t.add(StaticMTRoute([DestinationAddrFilter(r'^33\d+')], self.connector2, 0.0), 10)
+
+    def routable(self, destination_addr, user=None, short_message=b'hello world'):
+        return RoutableSubmitSm(SubmitSM(source_addr=b'x', destination_addr=destination_addr,
+                                         short_message=short_message), user or self.user2)
+
+    def test_disabled_by_default(self):
+        routing_t = MTRoutingTable()
+        self.assertEqual(routing_t.getCacheStats(), None)
+        self.assertRaises(InvalidRoutingTableParameterError, routing_t.enableCache, -1)
+
+    def test_hit_and_miss(self):
+        self.assertEqual(self.routing_t.getRouteFor(self.routable(b'336')).getConnector(), self.connector2)
+        self.assertEqual(self.routing_t.getRouteFor(self.routable(b'336')).getConnector(), self.connector2)
+        self.assertEqual(self.routing_t.getRouteFor(self.routable(b'336', self.user1)).getConnector(),
+                         self.connector1)
+        self.assertEqual(self.routing_t.getRouteFor(self.routable(b'44')), None)
+        self.assertEqual(self.routing_t.getRouteFor(self.routable(b'44')), None)
+
+        # short_message is not read by any filter, it is not part of the key
+        self.assertEqual(self.routing_t.getRouteFor(self.routable(b'44', short_message=b'x')), None)
+
+        self.assertEqual(self.routing_t.getCacheStats(), {'size': 2, 'entries': 2, 'hits': 3, 'misses': 3})
+
+    def test_invalidation(self):
+        self.routing_t.getRouteFor(self.routable(b'44'))
+        self.routing_t.add(DefaultRoute(self.connector3), 0)
+        self.assertEqual(self.routing_t.getCacheStats()['entries'], 0)
+        self.assertEqual(self.routing_t.getRouteFor(self.routable(b'44')).getConnector(), self.connector3)
+
+        self.routing_t.remove(0)
+        self.assertEqual(self.routing_t.getRouteFor(self.routable(b'44')), None)
+
+        self.routing_t.getRouteFor(self.routable(b'44'))
+        self.routing_t.flush()
+        self.assertEqual(self.routing_t.getCacheStats()['entries'], 0)
+
+    def test_volatile_filters_bypass(self):
+        self.routing_t.add(StaticMTRoute([EvalPyFilter('result = True')], self.connector3, 0.0), 30)
+
+        self.assertEqual(self.routing_t.getRouteFor(self.routable(b'336')).getConnector(), self.connector3)
+        self.assertEqual(self.routing_t.getRouteFor(self.routable(b'336')).getConnector(), self.connector3)
+        self.assertEqual(self.routing_t.getCacheStats()['entries'], 0)
+
+    def test_volatile_filters_after_matched_route(self):
+        self.routing_t.add(StaticMTRoute([TimeIntervalFilter([datetime.time(0, 0), datetime.time(23, 59, 59)])],
+                                         self.connector3, 0.0), 5)
+
+        self.assertEqual(self.routing_t.getRouteFor(self.routable(b'336')).getConnector(), self.connector2)
+        self.assertEqual(self.routing_t.getCacheStats()['entries'], 1)
+        self.assertEqual(self.routing_t.getRouteFor(self.routable(b'44')).getConnector(), self.connector3)
+        self.assertEqual(self.routing_t.getCacheStats()['entries'], 1)
+
+    def test_failover_route_is_reset_on_hit(self):
+        route = FailoverMTRoute([DestinationAddrFilter(r'^44\d+')], [self.connector2, self.connector3], 0.0)
+        self.routing_t.add(route, 30)
+
+        for _ in range(2):
+            r = self.routing_t.getRouteFor(self.routable(b'446'))
+            self.assertEqual(r.getConnector(), self.connector2)
+            self.assertEqual(r.getConnector(), self.connector3)
+        self.assertEqual(self.routing_t.getCacheStats()['hits'], 1)
+
+    def test_not_pickled(self):
+        self.routing_t.getRouteFor(self.routable(b'336'))
+
+        routing_t = pickle.loads(pickle.dumps(self.routing_t))
+        self.assertEqual(routing_t.getCacheStats(), None)
+
+
+class BulkAddTestCase(TestCase):
+    def setUp(self):
+        self.connector1 = SmppClientConnector('abc')
+        self.connector2 = SmppClientConnector('def')
+        self.connector3 = SmppClientConnector('ghi')
+
+        self.route1 = StaticMTRoute([DestinationAddrFilter(r'^33\d+')], self.connector1, 0.0)
+        self.route2 = StaticMTRoute([DestinationAddrFilter(r'^44\d+')], self.connector2, 0.0)
+        self.route3 = DefaultRoute(self.connector3)
+
+        self.routing_t = MTRoutingTable()
+        self.routing_t.add(self.route3, 0)
+        self.routing_t.add(self.route1, 20)
+
+    def test_merge(self):
+        self.routing_t.bulkAdd([(10, self.route2), (30, self.route1), (20, self.route2)])
+
+        self.assertEqual([list(r)[0] for r in self.routing_t.getAll()], [30, 20, 10, 0])
+        self.assertEqual(self.routing_t.getAll()[1][20], self.route2)
+
+    def test_replace(self):
+        self.routing_t.bulkAdd([(10, self.route2)], replace=True)
+
+        self.assertEqual(self.routing_t.getAll(), [{10: self.route2}])
+
+    def test_atomic(self):
+        self.assertRaises(InvalidRoutingTableParameterError, self.routing_t.bulkAdd,
+                          [(10, self.route2), (0, self.route1)], True)
+        self.assertRaises(InvalidRoutingTableParameterError, self.routing_t.bulkAdd,
+                          [(10, self.route2), ('30', self.route1)])
+        self.assertRaises(InvalidRoutingTableParameterError, self.routing_t.bulkAdd, (10, self.route2))
+
+        self.assertEqual([list(r)[0] for r in self.routing_t.getAll()], [20, 0])
+
+    def test_routing_after_bulk_add(self):
+        routable = RoutableSubmitSm(SubmitSM(source_addr=b'x', destination_addr=b'446',
+                                             short_message=b'hello world'), User(1, Group(1), 'u', 'p'))
+        self.assertEqual(self.routing_t.getRouteFor(routable), self.route3)
+
+        self.routing_t.bulkAdd([(10, self.route2)])
+        self.assertEqual(self.routing_t.getRouteFor(routable), self.route2)
@@ -1,5 +1,6 @@
 # pylint: disable=W0401,W0611
 
+import pickle
 import re
 from twisted.trial.unittest import TestCase
 from jasmin.routing import jasminApi
@@ -203,6 +204,34 @@ class MtMessagingCredentialTestCase(TestCase):
         mc.setQuota('early_decrement_balance_percent', 100)
         self.assertEqual(mc.getQuota('early_decrement_balance_percent'), 100)
 
+    def test_binary_value_filters(self):
+        mc = MtMessagingCredential()
+
+        # Default filters are matching everything
+        self.assertEqual(mc.getBinaryValueFilter('destination_address'), None)
+        self.assertEqual(mc.getBinaryValueFilter('priority'), None)
+        self.assertEqual(mc.getBinaryValueFilter('content'), None)
+        self.assertEqual(mc.getBinaryValueFilter('validity_period'), re.compile(rb'^\d+$'))
+
+        # str patterns are compiled once to binary patterns
+        mc.setValueFilter('destination_address', r'^D.*')
+        _r = mc.getBinaryValueFilter('destination_address')
+        self.assertEqual(_r, re.compile(b'^D.*'))
+        self.assertIs(mc.getBinaryValueFilter('destination_address'), _r)
+
+        # and recompiled when set again
+        mc.setValueFilter('destination_address', '.*')
+        self.assertEqual(mc.getBinaryValueFilter('destination_address'), None)
+
+        # Compiled binary filters are not persisted
+        mc.setValueFilter('content', r'^C.*')
+        mc.getBinaryValueFilter('content')
+        mc = pickle.loads(pickle.dumps(mc))
+        self.assertNotIn('_binary_value_filters', mc.__dict__)
+        self.assertEqual(mc.getBinaryValueFilter('content'), re.compile(b'^C.*'))
+
+        self.assertRaises(jasminApiCredentialError, mc.getBinaryValueFilter, 'anykey')
+
     def test_get_invalid_key(self):
         mc = MtMessagingCredential()
 
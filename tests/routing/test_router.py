@@ -726,6 +726,66 @@ class UserAndGroupTestCases(RouterPBProxy, RouterPBTestCase):
         self.assertEqual(oldCnxStatus, newCnxStatus)
 
 
+    @defer.inlineCallbacks
+    def test_user_and_group_indexes(self):
+        yield self.connect('127.0.0.1', self.pbPort)
+
+        g1 = Group(1)
+        yield self.group_add(g1)
+        g2 = Group(2)
+        yield self.group_add(g2)
+
+        u1 = User(1, g1, 'username', 'password')
+        yield self.user_add(u1)
+        u2 = User(2, g2, 'username2', 'password')
+        yield self.user_add(u2)
+        self.assertEqual('username', self.pbRoot_f.getUser(1).username)
+        self.assertEqual('username', self.pbRoot_f.getUser('1').username)
+        self.assertEqual(2, self.pbRoot_f.getGroup('2').gid)
+
+        # Replacing a user with a new username will drop the old one
+        u1 = User(1, g1, 'newusername', 'password')
+        yield self.user_add(u1)
+        r = yield self.user_authenticate('username', 'password')
+        self.assertEqual(r, None)
+        r = yield self.user_authenticate('newusername', 'password')
+        self.assertEqual(1, pickle.loads(r).uid)
+
+        yield self.user_remove(1)
+        r = yield self.user_authenticate('newusername', 'password')
+        self.assertEqual(r, None)
+        self.assertEqual(None, self.pbRoot_f.getUser(1))
+
+        # Removing a group will remove its users
+        yield self.group_remove(2)
+        r = yield self.user_authenticate('username2', 'password')
+        self.assertEqual(r, None)
+        self.assertEqual(None, self.pbRoot_f.getUser(2))
+        self.assertEqual(None, self.pbRoot_f.getGroup(2))
+        self.assertEqual(1, self.pbRoot_f.getGroup(1).gid)
+
+    @defer.inlineCallbacks
+    def test_user_add_uid_and_username_collision(self):
+        "Adding a user having the uid of one user and the username of another replaces both"
+        yield self.connect('127.0.0.1', self.pbPort)
+
+        g1 = Group(1)
+        yield self.group_add(g1)
+
+        yield self.user_add(User(1, g1, 'username1', 'password'))
+        yield self.user_add(User(2, g1, 'username2', 'password'))
+        yield self.user_add(User(1, g1, 'username2', 'newpassword'))
+
+        self.assertEqual([1], [u.uid for u in self.pbRoot_f.users])
+        self.assertEqual(['1'], list(self.pbRoot_f.users_by_uid))
+        self.assertEqual(['username2'], list(self.pbRoot_f.users_by_username))
+        self.assertEqual(None, self.pbRoot_f.getUser(2))
+        r = yield self.user_authenticate('username1', 'password')
+        self.assertEqual(r, None)
+        r = yield self.user_authenticate('username2', 'newpassword')
+        self.assertEqual(1, pickle.loads(r).uid)
+
+
 class PersistenceTestCase(RouterPBProxy, RouterPBTestCase):
     @defer.inlineCallbacks
     def tearDown(self):
@@ -800,6 +860,12 @@ class ConfigurationPersistenceTestCases(PersistenceTestCase):
         c = pickle.loads(c)
         self.assertEqual(1, len(c))
 
+        # Loaded users are indexed
+        r = yield self.user_authenticate('username2', 'password')
+        self.assertEqual(2, pickle.loads(r).uid)
+        self.assertEqual('username', self.pbRoot_f.getUser(1).username)
+        self.assertEqual(1, self.pbRoot_f.getGroup(1).gid)
+
     @defer.inlineCallbacks
     def test_add_all_persist_and_load_default(self):
         yield self.connect('127.0.0.1', self.pbPort)
@@ -125,6 +125,22 @@ class HTTPDeliverSmThrowingTestCases(deliverSmThrowerTestCase):
         self.assertEqual(callArgs[b'from'][0], self.testDeliverSMPdu.params['source_addr'])
         self.assertEqual(callArgs[b'to'][0], self.testDeliverSMPdu.params['destination_addr'])
 
+    @defer.inlineCallbacks
+    def test_throwing_http_connector_persistent_connection(self):
+        self.AckServerResource.render_POST = Mock(wraps=self.AckServerResource.render_POST)
+
+        routedConnector = HttpConnector('dst', 'http://127.0.0.1:%s/send' % self.AckServer.getHost().port, 'POST')
+        self.publishRoutedDeliverSmContent(self.routingKey, self.testDeliverSMPdu, '1', 'src', routedConnector)
+        yield waitFor(1)
+        self.publishRoutedDeliverSmContent(self.routingKey, self.testDeliverSMPdu, '2', 'src', routedConnector)
+        yield waitFor(1)
+
+        # Both messages were thrown through the same connection
+        self.assertEqual(self.AckServerResource.render_POST.call_count, 2)
+        clientPorts = [callArgs[0][0].getClientAddress().port
+                       for callArgs in self.AckServerResource.render_POST.call_args_list]
+        self.assertEqual(clientPorts[0], clientPorts[1])
+
     @defer.inlineCallbacks
     def test_throwing_http_connector_without_ack(self):
         self.NoAckServerResource.render_POST = Mock(wraps=self.NoAckServerResource.render_POST)
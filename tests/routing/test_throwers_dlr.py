@@ -1,4 +1,5 @@
 import datetime
+import json
 
 from unittest.mock import Mock
 from twisted.internet import reactor, defer
@@ -14,6 +15,7 @@ from tests.routing.http_server import TimeoutLeafServer, AckServer, NoAckServer,
 from tests.routing.test_router import SubmitSmTestCaseTools
 from tests.routing.test_router_smpps import SMPPClientTestCases
 from jasmin.routing.throwers import DLRThrower
+from jasmin.tools.circuitbreaker import CircuitOpenError
 from smpp.pdu.pdu_types import MessageState, CommandId
 
 
@@ -156,6 +158,86 @@ class HTTPDLRThrowerTestCase(DLRThrowerTestCases):
 
         self.assertEqual(self.Error404ServerResource.render_POST.call_count, 1)
 
+    @defer.inlineCallbacks
+    def test_throwing_http_connector_circuit_open(self):
+        self.DLRThrower.circuitBreakers.failure_threshold = 1
+        self.DLRThrower.rejectAndRequeueMessage = Mock(wraps=self.DLRThrower.rejectAndRequeueMessage)
+
+        # Nothing is listening on this port anymore
+        deadServer = reactor.listenTCP(0, server.Site(self.AckServerResource))
+        dlr_url = 'http://127.0.0.1:%s/dlr' % deadServer.getHost().port
+        yield deadServer.stopListening()
+
+        self.publishDLRContentForHttpapi('DELIVRD', 'anything1', dlr_url, 1)
+        yield waitFor(0.5)
+        self.assertEqual(self.DLRThrower.circuitBreakers.getState(dlr_url), 'open')
+
+        # Throws to an open circuit are requeued without calling the url
+        self.publishDLRContentForHttpapi('DELIVRD', 'anything2', dlr_url, 1)
+        yield waitFor(0.5)
+        self.assertEqual(self.DLRThrower.rejectAndRequeueMessage.call_count, 2)
+        self.assertEqual(self.DLRThrower.circuitBreakers.getStats()['open_rejected_count'], 1)
+
+    def mockBatchRender(self, resource):
+        """Record the DLR batches posted to resource"""
+        batches = []
+        render_POST = resource.render_POST
+
+        def render(request):
+            batches.append(json.loads(request.content.read()))
+            return render_POST(request)
+
+        resource.render_POST = Mock(side_effect=render)
+        return batches
+
+    @defer.inlineCallbacks
+    def test_throwing_http_connector_batch(self):
+        self.DLRThrower.config.http_batch_size = 2
+        batches = self.mockBatchRender(self.AckServerResource)
+
+        dlr_url = 'http://127.0.0.1:%s/dlr' % self.AckServer.getHost().port
+        self.publishDLRContentForHttpapi('DELIVRD', 'anything1', dlr_url, 1)
+        self.publishDLRContentForHttpapi('UNDELIV', 'anything2', dlr_url, 1)
+
+        yield waitFor(1)
+
+        # Both DLRs were thrown in one request
+        self.assertEqual(len(batches), 1)
+        self.assertEqual([(dlr['id'], dlr['message_status']) for dlr in batches[0]],
+                         [('anything1', 'DELIVRD'), ('anything2', 'UNDELIV')])
+        self.assertEqual(self.DLRThrower.httpBatches, {})
+
+    @defer.inlineCallbacks
+    def test_throwing_http_connector_batch_max_wait(self):
+        self.DLRThrower.config.http_batch_size = 10
+        self.DLRThrower.config.http_batch_max_wait = 200
+        batches = self.mockBatchRender(self.AckServerResource)
+
+        dlr_url = 'http://127.0.0.1:%s/dlr' % self.AckServer.getHost().port
+        self.publishDLRContentForHttpapi('DELIVRD', 'anything', dlr_url, 1)
+
+        yield waitFor(1)
+
+        # Incomplete batch was thrown after http_batch_max_wait
+        self.assertEqual(len(batches), 1)
+        self.assertEqual(len(batches[0]), 1)
+
+    @defer.inlineCallbacks
+    def test_throwing_http_connector_batch_without_ack(self):
+        self.DLRThrower.config.http_batch_size = 2
+        batches = self.mockBatchRender(self.NoAckServerResource)
+
+        dlr_url = 'http://127.0.0.1:%s/dlr' % self.NoAckServer.getHost().port
+        self.publishDLRContentForHttpapi('DELIVRD', 'anything1', dlr_url, 1)
+        self.publishDLRContentForHttpapi('DELIVRD', 'anything2', dlr_url, 1)
+
+        yield waitFor(4)
+
+        # Unacknowledged batches are retried together
+        self.assertTrue(len(batches) > 1)
+        for batch in batches:
+            self.assertEqual(len(batch), 2)
+
     @defer.inlineCallbacks
     def test_throwing_http_connector_dlr_level1(self):
         self.AckServerResource.render_GET = Mock(wraps=self.AckServerResource.render_GET)
@@ -208,6 +290,42 @@ class HTTPDLRThrowerTestCase(DLRThrowerTestCases):
         self.assertEqual(callArgs[b'connector'][0], dlr_connector.encode())
 
 
+class HTTPDLRThrowerRetrialsTestCase(TestCase):
+    """Retrials accounting, no broker is needed"""
+
+    def setUp(self):
+        config = DLRThrowerConfig()
+        config.max_retries = 2
+        self.DLRThrower = DLRThrower(config)
+        self.DLRThrower.rejectAndRequeueMessage = Mock(return_value=defer.succeed(None))
+        self.DLRThrower.rejectMessage = Mock(return_value=defer.succeed(None))
+
+        self.message = Mock(content=DLRContentForHttpapi('DELIVRD', 'anything', 'http://127.0.0.1/dlr', 1))
+
+    def tearDown(self):
+        return self.DLRThrower.stopService()
+
+    @defer.inlineCallbacks
+    def test_circuit_open_does_not_consume_retries(self):
+        for _ in range(10):
+            self.DLRThrower.incThrowingRetrials(self.message)
+            yield self.DLRThrower.retryOrRejectHttpDLR(self.message, CircuitOpenError('Circuit is open'))
+
+        self.assertEqual(self.DLRThrower.rejectMessage.call_count, 0)
+        self.assertEqual(self.DLRThrower.rejectAndRequeueMessage.call_count, 10)
+        for call in self.DLRThrower.rejectAndRequeueMessage.call_args_list:
+            self.assertEqual(call.kwargs, {'retrial': False})
+
+    @defer.inlineCallbacks
+    def test_failures_consume_retries(self):
+        for _ in range(3):
+            self.DLRThrower.incThrowingRetrials(self.message)
+            yield self.DLRThrower.retryOrRejectHttpDLR(self.message, Exception('500'))
+
+        self.assertEqual(self.DLRThrower.rejectAndRequeueMessage.call_count, 2)
+        self.assertEqual(self.DLRThrower.rejectMessage.call_count, 1)
+
+
 class SMPPDLRThrowerTestCases(RouterPBProxy, SMPPClientTestCases, SubmitSmTestCaseTools):
     @defer.inlineCallbacks
     def setUp(self):
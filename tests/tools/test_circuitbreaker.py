@@ -0,0 +1,77 @@
+from unittest import mock
+
+from twisted.trial.unittest import TestCase
+
+from jasmin.tools.circuitbreaker import (CircuitBreakers, CircuitOpenError, EndpointBusyError,
+                                         CLOSED, OPEN, HALF_OPEN)
+
+
+class CircuitBreakersTestCase(TestCase):
+    url = 'http://127.0.0.1/send'
+
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch('jasmin.tools.circuitbreaker.time.monotonic', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def failRequests(self, breakers, count):
+        for _ in range(count):
+            breakers.acquire(self.url)
+            breakers.release(self.url, False)
+
+    def test_open_after_consecutive_failures(self):
+        breakers = CircuitBreakers(failure_threshold=3, reset_timeout=30)
+        self.failRequests(breakers, 2)
+        breakers.acquire(self.url)
+        breakers.release(self.url, True)
+
+        # Failures count is reset by a success
+        self.failRequests(breakers, 2)
+        self.assertEqual(breakers.getState(self.url), CLOSED)
+
+        breakers.acquire(self.url)
+        self.assertTrue(breakers.release(self.url, False))
+        self.assertEqual(breakers.getState(self.url), OPEN)
+        self.assertRaises(CircuitOpenError, breakers.acquire, self.url)
+
+        # Other endpoints are not affected
+        breakers.acquire('http://127.0.0.2/send')
+        self.assertEqual(breakers.getStats()['opened_count'], 1)
+        self.assertEqual(breakers.getStats()['open_rejected_count'], 1)
+
+    def test_half_open(self):
+        breakers = CircuitBreakers(failure_threshold=1, reset_timeout=30)
+        self.failRequests(breakers, 1)
+
+        # A single trial is let through after reset_timeout
+        self.now += 30
+        self.assertEqual(breakers.getState(self.url), HALF_OPEN)
+        breakers.acquire(self.url)
+        self.assertRaises(CircuitOpenError, breakers.acquire, self.url)
+
+        # Failing trial opens the circuit again
+        self.assertTrue(breakers.release(self.url, False))
+        self.assertEqual(breakers.getState(self.url), OPEN)
+
+        # Succeeding trial closes it
+        self.now += 30
+        breakers.acquire(self.url)
+        self.assertFalse(breakers.release(self.url, True))
+        self.assertEqual(breakers.getState(self.url), CLOSED)
+        self.assertEqual(breakers.endpoints, {})
+
+    def test_disabled(self):
+        breakers = CircuitBreakers()
+        self.failRequests(breakers, 100)
+        self.assertEqual(breakers.getState(self.url), CLOSED)
+
+    def test_max_in_flight(self):
+        breakers = CircuitBreakers(max_in_flight=2)
+        breakers.acquire(self.url)
+        breakers.acquire(self.url)
+        self.assertRaises(EndpointBusyError, breakers.acquire, self.url)
+
+        breakers.release(self.url, True)
+        breakers.acquire(self.url)
+        self.assertEqual(breakers.getStats()['busy_rejected_count'], 1)
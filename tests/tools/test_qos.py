@@ -0,0 +1,172 @@
+from unittest import mock
+
+from twisted.trial.unittest import TestCase
+
+from jasmin.tools.qos import TokenBucket, Pacer, PacerCollector, AIMDRate, AIMDRateCollector
+
+
+class MonotonicClockTestCase(TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch('jasmin.tools.qos.time.monotonic', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class TokenBucketTestCase(MonotonicClockTestCase):
+    def test_burst(self):
+        bucket = TokenBucket(1, burst=3)
+
+        self.assertTrue(bucket.consume())
+        self.assertTrue(bucket.consume())
+        self.assertTrue(bucket.consume())
+        self.assertFalse(bucket.consume())
+
+        # Refilled with 1 token per second
+        self.sleep(1)
+        self.assertTrue(bucket.consume())
+        self.assertFalse(bucket.consume())
+
+        # Never holding more than burst tokens
+        self.sleep(60)
+        for i in range(3):
+            self.assertTrue(bucket.consume())
+        self.assertFalse(bucket.consume())
+
+    def test_reserve(self):
+        bucket = TokenBucket(10)
+
+        self.assertEqual(bucket.reserve(max_delay=1), 0)
+        self.assertAlmostEqual(bucket.reserve(max_delay=1), 0.1)
+        self.assertAlmostEqual(bucket.reserve(max_delay=1), 0.2)
+
+        # Nothing is reserved when delay is too long
+        self.assertEqual(bucket.reserve(max_delay=0.25), None)
+        self.assertAlmostEqual(bucket.reserve(max_delay=1), 0.3)
+
+    def test_set_rate(self):
+        bucket = TokenBucket(1, burst=5)
+        bucket.setRate(2, burst=2)
+
+        self.assertTrue(bucket.consume())
+        self.assertTrue(bucket.consume())
+        self.assertFalse(bucket.consume())
+        self.sleep(0.5)
+        self.assertTrue(bucket.consume())
+
+
+class PacerTestCase(MonotonicClockTestCase):
+    def tearDown(self):
+        PacerCollector().pacers.clear()
+
+    def test_fractional_rate(self):
+        pacer = Pacer(0.5)
+
+        self.assertEqual(pacer.getDelay(), 0)
+        self.assertAlmostEqual(pacer.getDelay(), 2)
+        self.assertAlmostEqual(pacer.getDelay(), 4)
+
+        self.sleep(10)
+        self.assertEqual(pacer.getDelay(), 0)
+
+    def test_high_rate(self):
+        pacer = Pacer(1000)
+
+        self.assertEqual(pacer.getDelay(), 0)
+        for i in range(1, 2000):
+            self.assertAlmostEqual(pacer.getDelay(), i / 1000)
+
+    def test_unlimited(self):
+        pacer = Pacer(0)
+
+        for i in range(10):
+            self.assertEqual(pacer.getDelay(), 0)
+
+    def test_shared_budget(self):
+        pacer = PacerCollector().get('cid', 10)
+        self.assertIs(PacerCollector().get('cid', 10), pacer)
+        self.assertIsNot(PacerCollector().get('other', 10), pacer)
+
+        self.assertEqual(PacerCollector().get('cid', 10).getDelay(), 0)
+        self.assertAlmostEqual(PacerCollector().get('cid', 10).getDelay(), 0.1)
+
+        # Rate updates are applied to the shared pacer
+        PacerCollector().get('cid', 20, burst=2)
+        self.assertEqual(pacer.rate, 20)
+        self.assertEqual(pacer.burst, 2)
+
+
+class AIMDRateTestCase(MonotonicClockTestCase):
+    def tearDown(self):
+        AIMDRateCollector().rates.clear()
+
+    def test_multiplicative_decrease(self):
+        rate = AIMDRate(1, 40)
+        self.assertEqual(rate.rate, 40)
+
+        self.assertEqual(rate.throttled(), 20)
+        self.sleep(1)
+        self.assertEqual(rate.throttled(), 10)
+        for i in range(10):
+            self.sleep(1)
+            rate.throttled()
+        self.assertEqual(rate.rate, 1)
+
+    def test_one_decrease_per_burst(self):
+        "A burst of throttled submits cuts the rate once"
+        rate = AIMDRate(1, 40)
+
+        # Submits sent before the cut are ignored
+        sent_at = self.now
+        self.sleep(0.1)
+        for i in range(10):
+            rate.throttled(sent_at)
+        self.assertEqual(rate.rate, 20)
+
+        # A submit sent after the cut is not
+        self.sleep(0.01)
+        self.assertEqual(rate.throttled(self.now), 10)
+
+        # Without submit time, throttles are ignored during one pacing interval
+        self.assertEqual(rate.throttled(), 10)
+        self.sleep(0.05)
+        self.assertEqual(rate.throttled(), 10)
+        self.sleep(0.06)
+        self.assertEqual(rate.throttled(), 5)
+
+    def test_additive_increase(self):
+        rate = AIMDRate(1, 12)
+        rate.throttled()
+        self.assertEqual(rate.rate, 6)
+
+        for i in range(AIMDRate.increase_after - 1):
+            self.assertEqual(rate.succeeded(), 6)
+        self.assertEqual(rate.succeeded(), 7)
+
+        # A throttling response resets the success run
+        for i in range(AIMDRate.increase_after - 1):
+            rate.succeeded()
+        self.sleep(1)
+        self.assertEqual(rate.throttled(), 3.5)
+        self.assertEqual(rate.succeeded(), 3.5)
+
+        for i in range(AIMDRate.increase_after * 20):
+            rate.succeeded()
+        self.assertEqual(rate.rate, 12)
+
+    def test_shared_rate(self):
+        rate = AIMDRateCollector().get('cid', 1, 10)
+        self.assertIs(AIMDRateCollector().get('cid', 1, 10), rate)
+        self.assertIsNot(AIMDRateCollector().get('other', 1, 10), rate)
+
+        rate.throttled()
+        self.assertEqual(AIMDRateCollector().get('cid', 1, 10).rate, 5)
+
+        # Limit updates clamp the current rate
+        AIMDRateCollector().get('cid', 1, 4)
+        self.assertEqual(rate.rate, 4)
+        AIMDRateCollector().get('cid', 6, 10)
+        self.assertEqual(rate.rate, 6)
@@ -0,0 +1,66 @@
+from unittest import mock
+
+from twisted.trial.unittest import TestCase
+
+from jasmin.tools.ttlmap import TTLMap
+
+
+class TTLMapTestCase(TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch('jasmin.tools.ttlmap.time.monotonic', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_mapping(self):
+        m = TTLMap(ttl=60, max_size=10)
+        m['a'] = 1
+        m['a'] += 1
+        m['b'] = 1
+
+        self.assertEqual(m['a'], 2)
+        self.assertIn('b', m)
+        self.assertEqual(m.get('c', 0), 0)
+        self.assertEqual(len(m), 2)
+        self.assertEqual(sorted(m), ['a', 'b'])
+
+        del m['a']
+        self.assertNotIn('a', m)
+        self.assertEqual(m.pop('a', None), None)
+        self.assertEqual(len(m), 1)
+        self.assertRaises(KeyError, m.__delitem__, 'a')
+
+    def test_expiry(self):
+        m = TTLMap(ttl=60, max_size=10, slots=6)
+        m['a'] = 1
+        self.now += 30
+        m['b'] = 1
+
+        # 'a' expires between ttl and ttl + one slot (10s) after being set
+        self.now += 40
+        self.assertNotIn('a', m)
+        self.assertIn('b', m)
+        self.assertEqual(m.getStats(), {'size': 1, 'expired_count': 1, 'evicted_count': 0})
+
+        self.now += 40
+        self.assertEqual(len(m), 0)
+
+    def test_set_renews_ttl(self):
+        m = TTLMap(ttl=60, max_size=10, slots=6)
+        m['a'] = 1
+        self.now += 50
+        m['a'] += 1
+
+        self.now += 50
+        self.assertEqual(m['a'], 2)
+        self.assertEqual(len(m), 1)
+
+    def test_max_size(self):
+        m = TTLMap(ttl=60, max_size=3, slots=6)
+        for key in 'abcde':
+            m[key] = 1
+            self.now += 1
+
+        # Oldest keys are evicted
+        self.assertEqual(sorted(m), ['c', 'd', 'e'])
+        self.assertEqual(m.getStats()['evicted_count'], 2)